@@ -0,0 +1,90 @@
+import statistics
+import time
+from itertools import product
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management.base import BaseCommand
+from redis.exceptions import RedisError
+
+from Models.cache_codecs import COMPRESSORS, SERIALIZERS, Codec, decode
+from Models.caching import redis_client
+from AdminModule.tasks import LIST_CACHES, CustomRequest
+
+
+class Command(BaseCommand):
+    help = (
+        'Encode the cached admin list payloads with every cache codec and report encode/decode time, '
+        'bytes on the wire and Redis memory, to choose CACHE_CODECS with data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--families', nargs='+', default=['admin:semesters', 'admin:faculty', 'admin:students'],
+                            choices=list(LIST_CACHES))
+        parser.add_argument('--codecs', nargs='+',
+                            help='serializer or serializer+compressor, every available combination by default')
+        parser.add_argument('--threshold', type=int, default=0, help='compress payloads from this many bytes')
+        parser.add_argument('--rows', type=int, default=500, help='rows per list payload')
+        parser.add_argument('--repeat', type=int, default=50)
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(is_superuser=True).first()
+        context = {'request': CustomRequest(user, method='GET')}
+        codecs = self.codecs(options['codecs'], options['threshold'])
+        client = redis_client()
+
+        header = f'{"payload":<28}{"codec":<16}{"bytes":>10}{"ratio":>8}{"encode us":>12}{"decode us":>12}{"redis":>10}'
+        self.stdout.write(header)
+        self.stdout.write('-' * len(header))
+        for prefix in options['families']:
+            model, serializer_class = LIST_CACHES[prefix]
+            rows = serializer_class(model.objects.all()[:options['rows']], many=True, context=context).data
+            if not rows:
+                continue
+            payloads = {f'{prefix}:row': rows[0], f'{prefix} ({len(rows)} rows)': rows}
+            for name, payload in payloads.items():
+                baseline = None
+                for codec in codecs:
+                    data = codec.encode(payload)
+                    baseline = baseline or len(data)
+                    encode = self.timed(lambda: codec.encode(payload), options['repeat'])
+                    decoded = self.timed(lambda: decode(data), options['repeat'])
+                    self.stdout.write(
+                        f'{name:<28}{codec.name:<16}{len(data):>10}{len(data) / baseline:>8.2f}'
+                        f'{encode:>12.1f}{decoded:>12.1f}{self.memory(client, data):>10}'
+                    )
+            self.stdout.write('')
+
+    def codecs(self, names, threshold):
+        if not names:
+            names = list(SERIALIZERS) + [f'{serializer}+{compressor}'
+                                         for serializer, compressor in product(SERIALIZERS, COMPRESSORS)]
+        codecs = []
+        for name in names:
+            serializer, _, compressor = name.partition('+')
+            try:
+                codecs.append(Codec(serializer, compressor or None, threshold=threshold))
+            except ImproperlyConfigured as error:
+                self.stderr.write(f'skipping {name}: {error}')
+        return codecs
+
+    def timed(self, function, repeat):
+        # median microseconds per call
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            function()
+            samples.append((time.perf_counter() - started) * 1_000_000)
+        return statistics.median(samples)
+
+    def memory(self, client, data):
+        if client is None:
+            return '-'
+        key = 'benchmark:cache-codec'
+        try:
+            client.set(key, data, ex=60)
+            usage = client.memory_usage(key, samples=0)
+            client.delete(key)
+        except RedisError:
+            return '-'
+        return usage
@@ -0,0 +1,75 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from AdminModule.tasks import CACHE_REBUILD_TASKS, prewarm_caches_task, warm_domain
+
+
+class Command(BaseCommand):
+    help = 'Warm the admin list caches, every domain in its own process under a time budget.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('domains', nargs='*',
+                            help=f'domains to warm, all of them by default: {", ".join(CACHE_REBUILD_TASKS)}')
+        parser.add_argument('--incremental', action='store_true',
+                            help='skip the domains whose tables did not change since their last warm')
+        parser.add_argument('--budget', type=float, default=None,
+                            help='seconds per warmer, CACHE_PREWARM_BUDGET_SECONDS by default')
+        parser.add_argument('--workers', type=int, default=4, help='processes, 1 warms in this process')
+        parser.add_argument('--user', help='username the warmers serialize for, the first superuser by default')
+        parser.add_argument('--celery', action='store_true', help='queue one task per domain instead')
+
+    def handle(self, *args, **options):
+        domains = options['domains'] or list(CACHE_REBUILD_TASKS)
+        unknown = set(domains) - set(CACHE_REBUILD_TASKS)
+        if unknown:
+            raise CommandError(f'Unknown domains: {", ".join(sorted(unknown))}')
+        budget = options['budget'] or getattr(settings, 'CACHE_PREWARM_BUDGET_SECONDS', 300)
+        users = User.objects.filter(username=options['user']) if options['user'] else \
+            User.objects.filter(is_superuser=True)
+        user_id = users.values_list('id', flat=True).first()
+        if user_id is None:
+            raise CommandError('No user to warm the caches for')
+
+        if options['celery']:
+            group_id = prewarm_caches_task(user_id, domains, options['incremental'], budget)
+            self.stdout.write(f'Queued {len(domains)} warmers, group {group_id}')
+            return
+
+        started = time.monotonic()
+        arguments = [(domain, user_id, budget, options['incremental']) for domain in domains]
+        if options['workers'] <= 1:
+            results = (self.outcome(domain, lambda each=each: warm_domain(*each))
+                       for domain, each in zip(domains, arguments))
+            self.report(results, len(domains))
+        else:
+            # children open their own connections, an inherited socket would be shared with this process
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=min(options['workers'], len(domains)),
+                                     mp_context=multiprocessing.get_context('fork')) as pool:
+                futures = {pool.submit(warm_domain, *each): domain for domain, each in zip(domains, arguments)}
+                self.report((self.outcome(futures[future], future.result) for future in as_completed(futures)),
+                            len(domains))
+        self.stdout.write(f'Done in {time.monotonic() - started:.1f}s')
+
+    def outcome(self, domain, result):
+        # one failing warmer must not stop the others
+        try:
+            return result()
+        except Exception as error:
+            return {'domain': domain, 'status': f'failed ({error!r})', 'seconds': 0}
+
+    def report(self, results, total):
+        incomplete = 0
+        for done, result in enumerate(results, start=1):
+            complete = result['status'] in ('warmed', 'unchanged')
+            incomplete += not complete
+            style = self.style.SUCCESS if complete else self.style.WARNING
+            self.stdout.write(style(f'[{done}/{total}] {result["domain"]}: {result["status"]} in {result["seconds"]}s'))
+        if incomplete:
+            self.stdout.write(self.style.WARNING(f'{incomplete} domains were not fully warmed, their lists fill on demand'))
@@ -1,3 +1,5 @@
+from decimal import Decimal
+
 from django.contrib.auth.models import User, Group
 from rest_framework.permissions import IsAuthenticated, IsAuthenticatedOrReadOnly
 import statistics
@@ -5,9 +7,13 @@ from Models.models import *
 from rest_framework.response import Response
 from rest_framework import status
 from django.core.mail import send_mail
+from django.db.models import Model
 from django.urls import reverse
+from django_filters.rest_framework import DjangoFilterBackend
 from DjangoRESTProject_practice import settings
 
+from Models.caching import LIST_CACHE_TIMEOUT, CacheMiss, list_cache_key, fill_list_cache, get_or_fill_list, \
+    row_state, update_row
 from .permissions import *
 
 class PersonSerializerMixin:
@@ -270,3 +276,86 @@ class AdminEnrollmentPermissionMixin:
 class IsSuperUserOrAdminMixin:
     permission_classes = [IsAuthenticated,IsSuperUserOrAdminPermission]
 
+
+
+class CachedRowMixin:
+    """
+    Keeps the cached row of a written instance current. Wrap a write with
+    before = self.get_cache_row_state(pk) and self.cache_row(pk, before).
+    """
+    cache_prefix = None
+    cache_filter_fields = []
+
+    def get_cache_row_state(self, pk):
+        return row_state(self.get_queryset().model, pk, self.cache_filter_fields)
+
+    def cache_row(self, pk, before=None):
+        return update_row(self.cache_prefix, self.get_queryset(), pk, self.get_serializer_class(),
+                          self.get_serializer_context(), self.cache_filter_fields, before)
+
+
+def cache_filter_value(value):
+    # a filter's cleaned value as the database holds it: a related row by its pk, 8.0 as 8
+    if isinstance(value, Model):
+        return value.pk
+    if isinstance(value, Decimal) and value == value.to_integral_value():
+        return int(value)
+    return value
+
+
+class CachedListMixin(CachedRowMixin):
+    """
+    Serves list() from the cache for any combination of cache_filter_fields.
+    Requests with other parameters (search, ordering, ...) go to the database.
+    """
+    cache_timeout = LIST_CACHE_TIMEOUT
+    # task(prefix, filters, user_id) that rebuilds one stale list in the background
+    cache_refresh_task = None
+
+    def get_cache_filters(self):
+        # keyset pages (Models/pagination.py) are range scans already, they read the database
+        if getattr(self.paginator, 'cursor_query_param', None) in self.request.query_params:
+            return None
+        page_param = getattr(self.paginator, 'page_query_param', 'page')
+        filters = {
+            key: value for key, value in self.request.query_params.items() if key != page_param and value != ''
+        }
+        if any(field not in self.cache_filter_fields for field in filters):
+            return None
+        return filters
+
+    def list(self, request, *args, **kwargs):
+        filters = self.get_cache_filters()
+        if filters is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.get_queryset()
+        if filters:
+            filterset = DjangoFilterBackend().get_filterset(request, queryset, self)
+            if filterset is None or not filterset.is_valid():
+                # let the filter backend report the invalid values
+                return super().list(request, *args, **kwargs)
+            # keyed by the cleaned values, as the writes and the warmers key them by database values:
+            # ?class_id=03 and ?class_id=3 are one list
+            filters = {field: cache_filter_value(filterset.form.cleaned_data[field]) for field in filters}
+            queryset = filterset.qs
+
+        def build():
+            return fill_list_cache(self.cache_prefix, filters, queryset, self.get_serializer_class(),
+                                   self.get_serializer_context(), self.cache_timeout, filtered=True)
+
+        def refresh():
+            self.cache_refresh_task.delay(self.cache_prefix, filters, request.user.id)
+
+        data = get_or_fill_list(list_cache_key(self.cache_prefix, filters), build,
+                                refresh if self.cache_refresh_task is not None else None)
+        try:
+            return self._cached_list_response(data)
+        except CacheMiss:
+            return self._cached_list_response(build())
+
+    def _cached_list_response(self, data):
+        page = self.paginate_queryset(data)
+        if page is not None:
+            return self.get_paginated_response(page)
+        return Response(list(data), status=status.HTTP_200_OK)
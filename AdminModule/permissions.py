@@ -1,5 +1,6 @@
 from rest_framework import permissions
-from Models.models import CourseAllocation, Semester
+from Models.models import CourseAllocation
+from Models.reference import reference_data
 
 
 class IsSuperUserOrAdminPermission(permissions.BasePermission):
@@ -68,8 +69,7 @@ class AdminCourseAllocationPermissions(permissions.BasePermission):
             if request.user.is_superuser:
                 return True
             if request.user.groups.filter(name='Admin').exists():
-                queryset = Semester.objects.filter(status='Inactive',session__isnull=False, activation_deadline__isnull=False)
-                if queryset.exists():
+                if reference_data.has_schedulable_semester():
                     return True
                 else:
                     return request.method == 'GET'
@@ -16,6 +16,7 @@ from DjangoRESTProject_practice.celery import app
 from Models.models import *
 from django.contrib.auth.models import User
 from FacultyModule.serializers import LectureSerializer, AssessmentSerializer
+from Models.attendance import at_risk_percentage
 from StudentModule.serializers import ReviewsSerializer
 from .mixins import PersonSerializerMixin, ResultCalculationMixin
 
@@ -661,11 +662,8 @@ class EnrollmentSerializer(serializers.ModelSerializer):
 
     def get_fields(self):
         fields = super().get_fields()
-        queryset = CourseAllocation.objects.filter(status='Ongoing')
-        if queryset.exists():
-            fields['allocation_id'].queryset = queryset
-        else:
-            fields['allocation_id'].queryset = CourseAllocation.objects.none()
+        # left lazy: it is only evaluated when an allocation_id is validated
+        fields['allocation_id'].queryset = CourseAllocation.objects.filter(status='Ongoing')
 
 
         request = self.context.get("request")
@@ -716,11 +714,8 @@ class CourseAllocationSerializer(serializers.ModelSerializer, ResultCalculationM
 
     def get_fields(self):
         fields = super().get_fields()
-        queryset = Semester.objects.filter(status='Inactive',session__isnull=False, activation_deadline__isnull=False)
-        if queryset.exists():
-            fields['semester_id'].queryset = queryset
-        else:
-            fields['semester_id'].queryset = Semester.objects.none()
+        # left lazy: it is only evaluated when a semester_id is validated
+        fields['semester_id'].queryset = Semester.objects.filter(status='Inactive',session__isnull=False, activation_deadline__isnull=False)
 
         return fields
 
@@ -1256,4 +1251,33 @@ class SemesterSerializer(serializers.ModelSerializer):
 
             return instance
 
-        return instance
\ No newline at end of file
+        return instance
+
+
+class AuditRecordSerializer(serializers.Serializer):
+    # a row of Models.audit_archive.audit_records(), hot or archived
+    audit_id = serializers.IntegerField()
+    userid = serializers.CharField(source='userid_id')
+    action_type = serializers.CharField()
+    entity_name = serializers.CharField()
+    entity_pk = serializers.CharField(allow_null=True)
+    changed_fields = serializers.ListField(child=serializers.CharField())
+    time_stamp = serializers.DateTimeField()
+    ip_address = serializers.CharField()
+    user_agent = serializers.CharField()
+    old_value = serializers.JSONField(allow_null=True)
+    new_value = serializers.JSONField(allow_null=True)
+
+
+class AttendanceSummarySerializer(serializers.ModelSerializer):
+    student_id = serializers.CharField(source='enrollment.student_id_id', read_only=True)
+    allocation_id = serializers.IntegerField(source='enrollment.allocation_id_id', read_only=True)
+    at_risk = serializers.SerializerMethodField(read_only=True)
+
+    class Meta:
+        model = AttendanceSummary
+        fields = ['enrollment', 'student_id', 'allocation_id', 'lectures_held', 'lectures_attended',
+                  'percentage', 'at_risk', 'updated_at']
+
+    def get_at_risk(self, obj) -> bool:
+        return obj.lectures_held > 0 and obj.percentage < at_risk_percentage()
@@ -1,10 +1,21 @@
-from itertools import groupby
-from celery import shared_task
+import signal
+import threading
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+
+from celery import group, shared_task
+from django.core.cache import cache
 from django.core.mail import send_mail
+from django.db import connections
 from rest_framework.generics import get_object_or_404
 
 from Models.models import *
-from django.core.cache import cache
+from Models.caching import fill_list_cache, list_cache_key, release_rebuild, store_list, store_partitions, \
+    stream_rows
+from Models.conditional import get_versions
+from Models.db_routing import replica_reads
 from .serializers import FacultySerializer, StudentSerializer, ProgramSerializer, CourseSerializer, SemesterSerializer, \
     CourseAllocationSerializer, EnrollmentSerializer
 
@@ -75,44 +86,76 @@ def semester_closing_task(semester_id):
 
 
 # Data Caching Tasks
+# The keys and the fill path are shared with CachedListMixin, see Models/caching.py
+LIST_CACHES = {
+    'admin:faculty': (Faculty, FacultySerializer),
+    'admin:students': (Student, StudentSerializer),
+    'admin:programs': (Program, ProgramSerializer),
+    'admin:courses': (Course, CourseSerializer),
+    'admin:semesters': (Semester, SemesterSerializer),
+    'admin:allocations': (CourseAllocation, CourseAllocationSerializer),
+    'admin:enrollments': (Enrollment, EnrollmentSerializer),
+}
+
+
 @shared_task
-def cache_faculty_data_task(user_id):
+def refresh_list_cache_task(prefix, filters, user_id):
     user = User.objects.get(id=user_id)
     custom_request = CustomRequest(user, method='GET')
     context = {'request': custom_request}
 
-    queryset = Faculty.objects.all()
-    cache_key = 'admin:faculty_list'
-    cache.delete(cache_key)
-    serializer = FacultySerializer(queryset,context=context, many=True)
-    cache.set(cache_key, serializer.data, timeout=60*10)
+    model, serializer_class = LIST_CACHES[prefix]
+    try:
+        fill_list_cache(prefix, filters, model.objects.all(), serializer_class, context, refresh_rows=True)
+    finally:
+        release_rebuild(list_cache_key(prefix, filters))
+
+    return f'{list_cache_key(prefix, filters)} has been refreshed'
+
+
+@contextmanager
+def traced_memory():
+    # peak bytes allocated inside the block, through tracemalloc when CACHE_WARM_TRACE_MEMORY is on
+    result = {'peak': None}
+    if not getattr(settings, 'CACHE_WARM_TRACE_MEMORY', False):
+        yield result
+        return
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    baseline = tracemalloc.get_traced_memory()[0]
+    try:
+        yield result
+    finally:
+        result['peak'] = tracemalloc.get_traced_memory()[1] - baseline
+        if started:
+            tracemalloc.stop()
+
+
+def _warm(prefix, queryset, serializer_class, context, groupings):
+    """
+    Stream every row into the cache once, then store the id lists of the partitions, one ordered pass
+    per tuple of fields in groupings. Returns a summary with the peak memory of the warm-up.
+    """
+    with traced_memory() as memory:
+        pks = stream_rows(prefix, queryset, serializer_class, context)
+        store_list(list_cache_key(prefix), pks, prefix)
+        partitions = sum(store_partitions(prefix, queryset, fields) for fields in groupings)
+    peak = f'{memory["peak"] / 1024:.0f} KiB' if memory['peak'] is not None else 'not traced'
+    return f'{len(pks)} rows, {partitions} partitions, peak memory {peak}'
 
-    designation_choices = Faculty.DESIGNATION_CHOICES
-    departments = Department.objects.all()
 
-    for each in departments:
-        cache_key = f'admin:faculty:department:{each.department_id}'
-        cache.delete(cache_key)
-        dept_data = queryset.filter(department_id=each.department_id)
-        serializer = FacultySerializer(dept_data, context=context,many=True)
-        cache.set(cache_key, serializer.data, timeout=60*10)
-        for key, value in designation_choices:
-            cache_key = f'admin:faculty:{each.department_id}:{key}'
-            cache.delete(cache_key)
-            data = dept_data.filter(designation=key)
-            serializer = FacultySerializer(data,context=context, many=True)
-            cache.set(cache_key, serializer.data, timeout=60*10)
-
-
-    for key, value in designation_choices:
-        cache_key = f'admin:faculty:designation:{key}'
-        cache.delete(cache_key)
-        designation_data = queryset.filter(designation=key)
-        serializer = FacultySerializer(designation_data,context=context, many=True)
-        cache.set(cache_key, serializer.data, timeout=60*10)
+@shared_task
+def cache_faculty_data_task(user_id):
+    user = User.objects.get(id=user_id)
+    custom_request = CustomRequest(user, method='GET')
+    context = {'request': custom_request}
 
+    groupings = [('department_id',), ('designation',), ('department_id', 'designation')]
+    summary = _warm('admin:faculty', Faculty.objects.all(), FacultySerializer, context, groupings)
 
-    return "Faculty data has been cached successfully"
+    return f"Faculty data has been cached successfully: {summary}"
 
 
 @shared_task
@@ -121,56 +164,11 @@ def cache_student_data_task(user_id):
     custom_request = CustomRequest(user, method='GET')
     context = {'request': custom_request}
 
-    queryset = Student.objects.all()
-    cache_key = 'admin:student_list'
-    cache.delete(cache_key)
-    serializer = StudentSerializer(queryset,context=context, many=True)
-    cache.set(cache_key, serializer.data, timeout=60*10)
-
-    departments = Department.objects.all()
-    programs = Program.objects.all()
-    classes = Class.objects.all()
-    status_choices = Student.STATUS_CHOICES
-
-    for each in departments:
-        cache_key = f'admin:students:department:{each.department_id}'
-        cache.delete(cache_key)
-        department_data = queryset.filter(program_id__department_id=each.department_id)
-        serializer = StudentSerializer(department_data,context=context, many=True)
-        cache.set(cache_key, serializer.data, timeout=60*10)
-        for key, value in status_choices:
-            cache_key = f'admin:students:{each.department_id}:{key}'
-            cache.delete(cache_key)
-            data = department_data.filter(status=key)
-            serializer = StudentSerializer(data,context=context, many=True)
-            cache.set(cache_key, serializer.data, timeout=60*10)
-
-
-    for each in programs:
-        cache_key = f'admin:students:program:{each.program_id}'
-        cache.delete(cache_key)
-        program_data = queryset.filter(program_id=each.program_id)
-        serializer = StudentSerializer(program_data,context=context, many=True)
-        cache.set(cache_key, serializer.data, timeout=60*10)
-
-
-    for each in classes:
-        cache_key = f'admin:students:class:{each.class_id}'
-        cache.delete(cache_key)
-        class_data = queryset.filter(class_id=each.class_id)
-        serializer = StudentSerializer(class_data,context=context, many=True)
-        cache.set(cache_key, serializer.data, timeout=60*10)
-
-
-
-    for key, value in status_choices:
-        cache_key = f'admin:students:status:{key}'
-        cache.delete(cache_key)
-        status_data = queryset.filter(status=key)
-        serializer = StudentSerializer(status_data,context=context, many=True)
-        cache.set(cache_key, serializer.data, timeout=60*10)
-
-    return "Student data has been cached successfully"
+    groupings = [('program_id__department_id',), ('program_id__department_id', 'status'), ('program_id',),
+                 ('class_id',), ('status',)]
+    summary = _warm('admin:students', Student.objects.all(), StudentSerializer, context, groupings)
+
+    return f"Student data has been cached successfully: {summary}"
 
 @shared_task
 def cache_programs_data_task(user_id):
@@ -178,21 +176,9 @@ def cache_programs_data_task(user_id):
     custom_request = CustomRequest(user, method='GET')
     context = {'request': custom_request}
 
-    queryset = Program.objects.all()
-    cache_key = 'admin:programs_list'
-    cache.delete(cache_key)
-    serializer = ProgramSerializer(queryset,context=context, many=True)
-    cache.set(cache_key, serializer.data, timeout=60*10)
+    summary = _warm('admin:programs', Program.objects.all(), ProgramSerializer, context, [('department_id',)])
 
-    departments = Department.objects.all()
-    for each in departments:
-        cache_key = f'admin:programs:department:{each.department_id}'
-        cache.delete(cache_key)
-        dept_data = queryset.filter(department_id=each.department_id)
-        serializer = ProgramSerializer(dept_data,context=context, many=True)
-        cache.set(cache_key, serializer.data, timeout=60*10)
-
-    return 'Program data has been cached successfully'
+    return f'Program data has been cached successfully: {summary}'
 
 
 @shared_task
@@ -201,37 +187,21 @@ def cache_courses_data_task(user_id):
     custom_request = CustomRequest(user, method='GET')
     context = {'request': custom_request}
 
-    queryset = Course.objects.all()
-    cache_key = 'admin:courses_list'
-    cache.delete(cache_key)
-    serializer = CourseSerializer(queryset, many=True, context=context)
-    cache.set(cache_key, serializer.data, timeout=60*10)
+    summary = _warm('admin:courses', Course.objects.all(), CourseSerializer, context, [])
 
-    return "Course data has been cached successfully"
+    return f"Course data has been cached successfully: {summary}"
 
 
 @shared_task
 def cache_semester_data_task(user_id):
     user = User.objects.get(id=user_id)
     custom_request = CustomRequest(user, method='GET')
-    print(custom_request)
     context = {'request': custom_request}
 
-    queryset = Semester.objects.all()
-    cache_key = 'admin:semesters_list'
-    cache.delete(cache_key)
-    serializer = SemesterSerializer(queryset, many=True, context=context)
-    cache.set(cache_key, serializer.data, timeout=60*10)
-
-    classes = Class.objects.all()
-    for each in classes:
-        class_data = queryset.filter(semesterdetails__class_id=each.class_id).distinct()
-        cache_key = f'admin:semesters:class:{each.class_id}'
-        cache.delete(cache_key)
-        serializer = SemesterSerializer(class_data,context=context, many=True)
-        cache.set(cache_key, serializer.data, timeout=60*10)
+    summary = _warm('admin:semesters', Semester.objects.all(), SemesterSerializer, context,
+                    [('semesterdetails__class_id',)])
 
-    return "Semester data has been cached successfully"
+    return f"Semester data has been cached successfully: {summary}"
 
 @shared_task
 def cache_courseAllocation_data_task(user_id):
@@ -239,30 +209,10 @@ def cache_courseAllocation_data_task(user_id):
     custom_request = CustomRequest(user, method='GET')
     context = {'request': custom_request}
 
-    queryset = CourseAllocation.objects.all()
-    semester_based_queryset = queryset.order_by('semester_id')
-    semester_distributed_queryset = {
-        semester_id : list(items) for semester_id, items in groupby(semester_based_queryset, key=lambda x : x.semester_id)
-    }
-    for key, value in semester_distributed_queryset.items():
-        cache_key = f'admin:allocations:semester:{key}'
-        cache.delete(cache_key)
-        serializer = CourseAllocationSerializer(value, context=context, many=True)
-        cache.set(cache_key, serializer.data, timeout=60*10)
-
-    faculty_based_queryset = queryset.order_by('teacher_id')
-    faculty_distributed_queryset = {
-        teacher_id : list(items) for teacher_id, items in groupby(faculty_based_queryset, key=lambda x : x.teacher_id)
-
-    }
-    for key, value in faculty_distributed_queryset.items():
-        cache_key = f'admin:allocations:faculty:{key}'
-        cache.delete(cache_key)
-        serializer = CourseAllocationSerializer(value, context=context, many=True)
-        cache.set(cache_key, serializer.data, timeout=60*10)
-
+    summary = _warm('admin:allocations', CourseAllocation.objects.all(), CourseAllocationSerializer, context,
+                    [('semester_id',), ('teacher_id',)])
 
-    return 'Course Allocation data has been cached successfully'
+    return f'Course Allocation data has been cached successfully: {summary}'
 
 
 @shared_task
@@ -271,33 +221,153 @@ def cache_enrollment_data_task(user_id):
     custom_request = CustomRequest(user, method='GET')
     context = {'request': custom_request}
 
-    queryset = Enrollment.objects.all()
-    student_based_queryset = queryset.order_by('student_id')
-
-    student_distributed_data = {
-        student_id : list(items) for student_id, items in groupby(student_based_queryset, key=lambda x : x.student_id)
+    summary = _warm('admin:enrollments', Enrollment.objects.all(), EnrollmentSerializer, context,
+                    [('student_id',), ('allocation_id__teacher_id',)])
+
+    return f'Enrollment data has been cached successfully: {summary}'
+
+
+# Debounced rebuilds: a burst of writes to one domain queues a single warm-up per window
+CACHE_REBUILD_TASKS = {
+    'faculty': cache_faculty_data_task,
+    'students': cache_student_data_task,
+    'programs': cache_programs_data_task,
+    'courses': cache_courses_data_task,
+    'semesters': cache_semester_data_task,
+    'allocations': cache_courseAllocation_data_task,
+    'enrollments': cache_enrollment_data_task,
+}
+
+
+def _rebuild_key(domain, name):
+    return f'cache:rebuild:{domain}:{name}'
+
+
+def schedule_rebuild(domain, user_id):
+    """
+    Mark a cache domain dirty and schedule its rebuild CACHE_REBUILD_DEBOUNCE_SECONDS from now,
+    unless one is already pending. Returns the task id, or None when the call was coalesced.
+    """
+    window = getattr(settings, 'CACHE_REBUILD_DEBOUNCE_SECONDS', 30)
+    task_id = f'cache-rebuild-{domain}-{uuid.uuid4().hex}'
+    # the pending marker outlives the countdown so a slow queue cannot let a second rebuild in
+    if cache.add(_rebuild_key(domain, 'pending'), task_id, timeout=window * 2 + 60) is False:
+        for name in ['coalesced', 'coalesced_total']:
+            cache.add(_rebuild_key(domain, name), 0, timeout=None)
+            cache.incr(_rebuild_key(domain, name))
+        return None
+
+    rebuild_cache_domain_task.apply_async(args=[domain, user_id], countdown=window, task_id=task_id)
+    return task_id
+
+
+def rebuild_stats():
+    return {
+        domain: {
+            'pending': cache.get(_rebuild_key(domain, 'pending')),
+            'coalesced': cache.get(_rebuild_key(domain, 'coalesced')) or 0,
+            'coalesced_total': cache.get(_rebuild_key(domain, 'coalesced_total')) or 0,
+        }
+        for domain in CACHE_REBUILD_TASKS
     }
 
-    for key, value in student_distributed_data.items():
-        cache_key = f'admin:enrollments:student:{key}'
-        cache.delete(cache_key)
-        serializer = EnrollmentSerializer(value, context=context, many=True)
-        cache.set(cache_key, serializer.data, timeout=60*10)
 
+@shared_task(bind=True)
+def rebuild_cache_domain_task(self, domain, user_id):
+    pending = cache.get(_rebuild_key(domain, 'pending'))
+    if pending is not None and pending != self.request.id:
+        return f'Skipped {domain} rebuild {self.request.id}, {pending} is the pending one'
 
-    faculty_based_queryset = queryset.order_by('allocation_id__teacher_id')
-    faculty_distributed_data = {
+    # writes from here on need a rebuild of their own
+    cache.delete(_rebuild_key(domain, 'pending'))
+    coalesced = cache.get(_rebuild_key(domain, 'coalesced')) or 0
+    cache.delete(_rebuild_key(domain, 'coalesced'))
 
-        teacher_id : list(items) for teacher_id, items in groupby(faculty_based_queryset, key=lambda x : x.allocation_id.teacher_id)
-    }
+    CACHE_REBUILD_TASKS[domain](user_id)
+    return f'{domain} cache has been rebuilt, {coalesced} requests were coalesced'
+
+
+# Prewarm after a deploy or a flush: every warmer runs under a time budget. Incremental runs skip the
+# domains whose tables still carry the version tokens they had at their last warm (Models/conditional.py)
+_PERSON_TABLES = ['Person', 'Address', 'Qualification', 'User']
+_ENROLLMENT_TABLES = ['Enrollment', 'Reviews', 'Result', 'Attendance', 'Lecture', 'Assessment', 'AssessmentChecked']
+WARMER_TABLES = {
+    'faculty': ['Faculty', 'Department', 'CourseAllocation', 'Course', 'Semester', *_PERSON_TABLES],
+    'students': ['Student', 'Program', 'Class', 'Department', 'CourseAllocation', 'Course', 'Transcript',
+                 *_ENROLLMENT_TABLES, *_PERSON_TABLES],
+    'programs': ['Program', 'Department'],
+    'courses': ['Course'],
+    'semesters': ['Semester', 'SemesterDetails', 'Class', 'Program', 'CourseAllocation', 'Course', 'Faculty',
+                  'Student', 'Transcript', *_ENROLLMENT_TABLES, *_PERSON_TABLES],
+    'allocations': ['CourseAllocation', 'Course', 'Semester', 'Faculty', 'Student', *_ENROLLMENT_TABLES,
+                    *_PERSON_TABLES],
+    'enrollments': ['Student', 'CourseAllocation', 'Course', 'Faculty', *_ENROLLMENT_TABLES, *_PERSON_TABLES],
+}
+
+
+class WarmTimeout(BaseException):
+    # not an Exception: the cache and database layers must not swallow it as a backend error
+    pass
+
+
+@contextmanager
+def time_budget(seconds):
+    # SIGALRM only reaches the main thread: elsewhere (thread pools) the warmer runs unbounded
+    if not seconds or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def expire(signum, frame):
+        raise WarmTimeout()
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
 
-    for key, value in faculty_distributed_data.items():
-        cache_key = f'admin:enrollments:faculty:{key}'
-        cache.delete(cache_key)
-        serializer = EnrollmentSerializer(value, context=context, many=True)
-        cache.set(cache_key, serializer.data, timeout=60 *10)
 
-    return 'Enrollment data has been cached successfully'
+def _prewarm_key(domain):
+    return f'cache:prewarm:{domain}'
+
+
+def warm_domain(domain, user_id, budget=None, incremental=False):
+    started = time.monotonic()
+    # read before warming: a write that lands meanwhile leaves the next incremental run something to do
+    versions = get_versions(WARMER_TABLES[domain])
+    if incremental and cache.get(_prewarm_key(domain)) == versions:
+        return {'domain': domain, 'status': 'unchanged', 'seconds': 0}
+
+    try:
+        # a full warm reads from the replicas; rebuilds after a write stay on the primary, which has it
+        with time_budget(budget), replica_reads():
+            CACHE_REBUILD_TASKS[domain](user_id)
+    except WarmTimeout:
+        # the budget may have fired inside a query: never hand that connection to the next warmer
+        connections.close_all()
+        return {'domain': domain, 'status': 'timeout', 'seconds': round(time.monotonic() - started, 2)}
+
+    cache.set(_prewarm_key(domain), versions, timeout=None)
+    return {'domain': domain, 'status': 'warmed', 'seconds': round(time.monotonic() - started, 2)}
+
+
+@shared_task
+def prewarm_domain_task(domain, user_id, budget=None, incremental=False):
+    return warm_domain(domain, user_id, budget, incremental)
+
+
+@shared_task
+def prewarm_caches_task(user_id=None, domains=None, incremental=False, budget=None):
+    """Fan the warmers out over the workers, one task per domain."""
+    if user_id is None:
+        user_id = User.objects.filter(is_superuser=True).values_list('id', flat=True).first()
+    budget = budget or getattr(settings, 'CACHE_PREWARM_BUDGET_SECONDS', 300)
+    result = group(
+        prewarm_domain_task.s(domain, user_id, budget, incremental) for domain in domains or CACHE_REBUILD_TASKS
+    ).apply_async()
+    return result.id
 
 
 # Email Sending tasks
@@ -0,0 +1,326 @@
+import threading
+import time
+
+import pytest
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from rest_framework.test import APIClient
+
+from Models.cache_metrics import key_family, recorder
+from Models.caching import CacheMiss, Coalescer, get_list, get_or_fill_list, list_cache_key, row_key, row_state, \
+    store_list, store_rows, update_row
+from Models.models import CourseAllocation, SemesterDetails
+
+
+@pytest.fixture
+def admin_client(locmem_caches):
+    client = APIClient()
+    assert client.login(username='rhays056@gmail.com', password='admin12345678')
+    yield client
+
+
+def test_list_cache_key_is_canonical():
+    assert list_cache_key('admin:students') == 'admin:students:all'
+    assert list_cache_key('admin:students', {'status': 'Active', 'program_id': 'BSCS'}) == \
+        list_cache_key('admin:students', {'program_id': 'BSCS', 'status': 'Active'})
+    # raw values never reach the key: no collisions through separators, no spaces, bounded length
+    assert list_cache_key('admin:students', {'status': 'Active&program_id=BSCS'}) != \
+        list_cache_key('admin:students', {'status': 'Active', 'program_id': 'BSCS'})
+    key = list_cache_key('admin:students', {'status': 'a:row:1 ' + 'x' * 1000})
+    assert key.startswith('admin:students:f:') and ' ' not in key and len(key) < 80
+
+
+@pytest.mark.django_db
+def test_any_filter_combination_is_cached(admin_client):
+    first = admin_client.get('/api/admin/students/?status=Active&program_id=BSCS')
+    assert first.status_code == 200
+    assert cache.get(list_cache_key('admin:students', {'program_id': 'BSCS', 'status': 'Active'})) is not None
+
+    second = admin_client.get('/api/admin/students/?program_id=BSCS&status=Active')
+    assert second.status_code == 200
+    assert second.data == first.data
+    assert second.data['count'] == 3
+
+
+@pytest.mark.django_db
+def test_list_keys_come_from_the_cleaned_filter_values(admin_client, django_capture_on_commit_callbacks):
+    from Models.models import Student
+
+    student = Student.objects.exclude(class_id=None).first()
+    canonical = list_cache_key('admin:students', {'class_id': student.class_id_id})
+    first = admin_client.get(f'/api/admin/students/?class_id=0{student.class_id_id}')
+    assert first.status_code == 200
+    # the key writes drop, not one of its own
+    assert cache.get(canonical) is not None
+    assert admin_client.get(f'/api/admin/students/?class_id={student.class_id_id}').data == first.data
+
+
+@pytest.mark.django_db
+def test_uncacheable_parameters_go_to_the_database(admin_client):
+    response = admin_client.get('/api/admin/students/?search=zzz-no-such-student')
+    assert response.status_code == 200
+    assert response.data['count'] == 0
+    assert cache.get(list_cache_key('admin:students')) is None
+
+
+def test_cached_list_reads_only_the_rows_of_a_page(locmem_caches):
+    store_rows('test', {index: {'id': index} for index in range(25)})
+    store_list('test:rows', range(25), 'test')
+    cache.delete(row_key('test', 3))
+
+    rows = get_list('test:rows')
+    assert rows.count() == 25
+    assert rows[20:30] == [{'id': index} for index in range(20, 25)]
+    with pytest.raises(CacheMiss):
+        rows[0:10]
+
+
+@pytest.mark.django_db
+def test_updating_a_row_rewrites_it_once_and_drops_only_changed_partitions(admin_client):
+    from AdminModule.serializers import CourseAllocationSerializer
+    from AdminModule.tasks import CustomRequest
+
+    allocation = CourseAllocation.objects.get(allocation_id=4)
+    by_teacher = list_cache_key('admin:allocations', {'teacher_id': allocation.teacher_id_id})
+    by_course = list_cache_key('admin:allocations', {'course_code': allocation.course_code_id})
+    for query in ['', f'?teacher_id={allocation.teacher_id_id}', f'?course_code={allocation.course_code_id}']:
+        assert admin_client.get(f'/api/admin/allocations/{query}').status_code == 200
+
+    fields = ['teacher_id', 'status', 'course_code', 'semester_id']
+    before = row_state(CourseAllocation, 4, fields)
+    CourseAllocation.objects.filter(allocation_id=4).update(course_code='ACC-140')
+    context = {'request': CustomRequest(User.objects.get(username='rhays056@gmail.com'))}
+    update_row('admin:allocations', CourseAllocation.objects.all(), 4, CourseAllocationSerializer, context, fields, before)
+
+    assert cache.get(row_key('admin:allocations', 4))['course_code'] == 'ACC-140'
+    assert cache.get(by_course) is None
+    assert cache.get(by_teacher) is not None and cache.get(list_cache_key('admin:allocations')) is not None
+
+    # the partitions that kept the row read its new version
+    rows = admin_client.get(f'/api/admin/allocations/?teacher_id={allocation.teacher_id_id}').data['results']
+    assert {row['allocation_id']: row['course_code'] for row in rows}[4] == 'ACC-140'
+
+
+def test_stale_list_is_served_while_a_single_refresh_runs(locmem_caches):
+    store_rows('test', {1: {'id': 1}})
+    store_list('test:stale', [1], 'test', timeout=-1)
+    refreshes = []
+
+    def build():
+        raise AssertionError('a stale value must not be rebuilt in the request')
+
+    for attempt in range(3):
+        data = get_or_fill_list('test:stale', build, refresh=lambda: refreshes.append(1))
+        assert data[0:10] == [{'id': 1}]
+    assert len(refreshes) == 1
+
+
+def test_coalescer_runs_concurrent_calls_once():
+    coalescer = Coalescer()
+    calls = []
+
+    def load():
+        calls.append(1)
+        time.sleep(0.2)
+        return 'rows'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(coalescer.run('key', load))) for each in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ['rows'] * 5
+    assert len(calls) == 1
+
+
+@pytest.mark.django_db
+def test_rebuilds_are_debounced_per_domain(admin_client, monkeypatch):
+    from AdminModule import tasks
+
+    scheduled = []
+    monkeypatch.setattr(tasks.rebuild_cache_domain_task, 'apply_async',
+                        lambda args, countdown, task_id: scheduled.append(task_id))
+    user_id = User.objects.get(username='rhays056@gmail.com').id
+
+    task_ids = [tasks.schedule_rebuild('courses', user_id) for each in range(5)]
+    assert task_ids[0] is not None and task_ids[1:] == [None] * 4
+    assert scheduled == task_ids[:1]
+    rebuilds = admin_client.get('/api/admin/cache/metrics/').data['rebuilds']
+    assert rebuilds['courses'] == {'pending': task_ids[0], 'coalesced': 4, 'coalesced_total': 4}
+
+    # a duplicate delivery is skipped, the pending task rebuilds and reports what it coalesced
+    assert 'Skipped' in tasks.rebuild_cache_domain_task.apply(args=['courses', user_id], task_id='stray').result
+    result = tasks.rebuild_cache_domain_task.apply(args=['courses', user_id], task_id=scheduled[0]).result
+    assert '4 requests were coalesced' in result
+    assert get_list(list_cache_key('admin:courses')) is not None
+    assert tasks.schedule_rebuild('courses', user_id) is not None
+
+    # editing a class rewrites its semester details, nested in the cached semesters
+    detail = SemesterDetails.objects.first()
+    scheme = [{'semester_id': detail.semester_id_id, 'semesterdetails_set': [{'course_code': None}]}]
+    response = admin_client.patch(f'/api/admin/classes/{detail.class_id_id}/', {'scheme_of_studies': scheme},
+                                  format='json')
+    assert response.status_code == 200 and tasks.rebuild_stats()['semesters']['pending'] == scheduled[-1]
+
+
+@pytest.mark.django_db
+def test_tagged_keys_are_dropped_when_a_row_they_depend_on_changes(locmem_caches, django_capture_on_commit_callbacks):
+    from Models.models import Enrollment, Student
+
+    client = APIClient()
+    assert client.login(username='bscs23f02@gmail.com', password='mylms123')
+    cache_key = 'student:dashboard:bscs23f02@gmail.com'
+
+    before = client.get('/api/student/dashboard/').data
+    assert cache.get(cache_key) is not None
+
+    student = Student.objects.get(student_id__user__username='bscs23f02@gmail.com')
+    other = Student.objects.exclude(pk=student.pk).first()
+    cache.set('unrelated', 1)
+    with django_capture_on_commit_callbacks(execute=True):
+        enrollment = Enrollment.objects.filter(student_id=student, status='Active').first()
+        enrollment.status = 'Completed'
+        enrollment.save()
+    assert cache.get(cache_key) is None
+    assert cache.get('unrelated') == 1
+
+    after = client.get('/api/student/dashboard/').data
+    assert after['completed_enrollments'] == before['completed_enrollments'] + 1
+
+    # a change to another student's enrollments leaves this dashboard cached
+    with django_capture_on_commit_callbacks(execute=True):
+        Enrollment.objects.filter(student_id=other).first().save()
+    assert cache.get(cache_key) is not None
+
+
+def test_a_key_tagged_during_an_invalidation_stays_tagged(locmem_caches, monkeypatch):
+    from Models import cache_tags
+
+    cache_tags.set_tagged('old', 1, 60, ['Enrollment'])
+    untag = cache_tags._untag
+
+    def racing_untag(tagged):
+        # a reader stores its value after the tag set was read
+        cache_tags.set_tagged('new', 2, 60, ['Enrollment'])
+        untag(tagged)
+
+    monkeypatch.setattr(cache_tags, '_untag', racing_untag)
+    assert cache_tags.invalidate_tags(['Enrollment']) == {'default|old'}
+    assert cache.get('old') is None and cache.get('new') == 2
+
+    monkeypatch.setattr(cache_tags, '_untag', untag)
+    cache_tags.invalidate_tags(['Enrollment'])
+    assert cache.get('new') is None
+
+
+@pytest.mark.django_db
+def test_cache_calls_are_counted_per_key_family(admin_client, settings):
+    settings.CACHES = {
+        'default': {'BACKEND': 'Models.cache_metrics.InstrumentedLocMemCache', 'METRICS_NAME': 'default'},
+        'pages': {'BACKEND': 'Models.cache_metrics.InstrumentedLocMemCache', 'LOCATION': 'pages', 'METRICS_NAME': 'pages'},
+    }
+    recorder.reset()
+    assert admin_client.get('/api/admin/students/?status=Active').status_code == 200
+    assert admin_client.get('/api/admin/students/?status=Active').status_code == 200
+
+    response = admin_client.get('/api/admin/cache/metrics/')
+    assert response.status_code == 200
+    students = response.data['default']['admin:students:*']
+    assert students['misses'] >= 1 and students['hits'] >= 1 and students['writes'] >= 1
+    assert students['calls'] == sum(value for name, value in students.items() if name.startswith('le_'))
+    assert key_family('faculty:NUM-1:allocations') == 'faculty:*:allocations'
+
+    # key inspection walks a Redis key space, there is none here
+    assert admin_client.get('/api/admin/cache/keys/').status_code == 501
+    recorder.reset()
+
+
+@pytest.mark.django_db
+def test_incremental_prewarm_only_rebuilds_domains_whose_tables_changed(locmem_caches, django_capture_on_commit_callbacks):
+    from io import StringIO
+    from django.core.management import call_command
+    from Models.models import Faculty
+
+    def prewarm(*args):
+        out = StringIO()
+        call_command('prewarm_caches', *args, '--workers', '1', stdout=out)
+        return out.getvalue()
+
+    assert 'courses: warmed' in prewarm('courses', 'faculty', '--incremental')
+    assert cache.get(list_cache_key('admin:courses')) is not None
+    output = prewarm('courses', 'faculty', '--incremental')
+    assert 'courses: unchanged' in output and 'faculty: unchanged' in output
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Faculty.objects.first().save()
+    output = prewarm('courses', 'faculty', '--incremental')
+    assert 'courses: unchanged' in output and 'faculty: warmed' in output
+
+
+@pytest.mark.django_db
+def test_warmers_stream_rows_and_store_partitions_as_their_groups_close(locmem_caches, settings, monkeypatch):
+    from AdminModule import tasks
+    from Models import caching
+    from Models.models import Enrollment
+
+    settings.CACHE_WARM_TRACE_MEMORY = True
+    monkeypatch.setattr(caching, 'WARM_CHUNK_SIZE', 3)
+    summary = tasks.cache_enrollment_data_task(User.objects.get(username='rhays056@gmail.com').id)
+    assert 'peak memory' in summary and 'KiB' in summary
+
+    assert list(get_list(list_cache_key('admin:enrollments'))) == \
+        [cache.get(row_key('admin:enrollments', pk)) for pk in Enrollment.objects.values_list('pk', flat=True)]
+    for student_id in Enrollment.objects.values_list('student_id', flat=True).distinct():
+        partition = get_list(list_cache_key('admin:enrollments', {'student_id': student_id}))
+        expected = list(Enrollment.objects.filter(student_id=student_id).values_list('pk', flat=True))
+        assert partition.ids(0, partition.count()) == expected
+
+
+@pytest.mark.django_db
+def test_keyset_pages_walk_the_whole_list_both_ways(admin_client, monkeypatch):
+    from Models.models import Enrollment
+    from Models.pagination import KeysetPagination
+
+    monkeypatch.setattr(KeysetPagination, 'page_size', 2)
+    pages = []
+    url = '/api/admin/enrollments/?cursor='
+    while url:
+        response = admin_client.get(url)
+        assert response.status_code == 200
+        assert 'count' not in response.data
+        pages.append(response.data)
+        url = response.data['next']
+
+    ids = [row['enrollment_id'] for page in pages for row in page['results']]
+    assert ids == list(Enrollment.objects.order_by('-pk').values_list('pk', flat=True))
+    assert pages[0]['previous'] is None
+    back = admin_client.get(pages[-1]['previous'])
+    assert back.data['results'] == pages[-2]['results']
+
+    assert admin_client.get('/api/admin/enrollments/?cursor=not-a-cursor').status_code == 404
+    # without a cursor the page number responses are unchanged
+    assert admin_client.get('/api/admin/enrollments/?page=1').data['count'] == Enrollment.objects.count()
+
+
+@pytest.mark.django_db
+def test_keyset_pages_follow_the_requested_ordering(admin_client, monkeypatch):
+    from Models.models import Enrollment
+    from Models.pagination import KeysetPagination
+
+    monkeypatch.setattr(KeysetPagination, 'page_size', 2)
+    for ordering, expected in [('student_id', ('student_id', 'pk')), ('-enrollment_date', ('-enrollment_date', '-pk'))]:
+        ids, url = [], f'/api/admin/enrollments/?ordering={ordering}&cursor='
+        while url:
+            response = admin_client.get(url)
+            assert response.status_code == 200
+            ids += [row['enrollment_id'] for row in response.data['results']]
+            url = response.data['next']
+        assert ids == list(Enrollment.objects.order_by(*expected).values_list('pk', flat=True))
+
+    # orderings a cursor cannot follow are refused, not replaced
+    for ordering in ['status,-pk', 'no_such_field', 'student_id__student_id__first_name']:
+        assert admin_client.get(f'/api/admin/enrollments/?ordering={ordering}&cursor=').status_code == 400
+    # a cursor only continues its own ordering
+    first = admin_client.get('/api/admin/enrollments/?ordering=student_id&cursor=').data['next']
+    assert admin_client.get(first.replace('ordering=student_id', 'ordering=-student_id')).status_code == 404
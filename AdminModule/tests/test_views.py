@@ -82,3 +82,70 @@ class TestAdminDashboardAuthentication:
         response = client.get(url)
         assert response.status_code == 200
         client.logout()
+
+
+@pytest.mark.django_db
+def test_audit_trail_filters_and_history_of_one_record(locmem_caches, settings, tmp_path):
+    from datetime import timedelta
+    from django.test import RequestFactory
+    from django.utils import timezone
+    from Models.audit_archive import archive_audit_trail
+    from Models.models import AuditTrail
+    from Models.signals import log_audit_trail
+
+    settings.MEDIA_ROOT = str(tmp_path)
+    request = RequestFactory().get('/')
+    request.user = User.objects.get(username='rhays056@gmail.com')
+    for status, entity_pk in [('Active', 'S-1'), ('Inactive', 'S-1'), ('Active', 'S-2'), ('Graduated', 'S-1')]:
+        log_audit_trail(request, 'Student', 'UPDATE', {'status': '?'}, {'status': status}, entity_pk=entity_pk)
+    log_audit_trail(request, 'Student', 'UPDATE', {}, {'program_id': 'BSCS'}, entity_pk='S-1')
+    oldest = AuditTrail.objects.filter(entity_name='Student').order_by('audit_id').first()
+    AuditTrail.objects.filter(pk=oldest.pk).update(time_stamp=timezone.now() - timedelta(days=400))
+    assert archive_audit_trail(hot_days=90) == (1, 1)
+
+    client = APIClient()
+    assert client.login(username='rhays056@gmail.com', password='admin12345678')
+    response = client.get('/api/admin/audit-trail/', {'entity': 'Student', 'entity_pk': 'S-1', 'field': 'status'})
+    assert response.status_code == 200
+    assert [row['new_value'] for row in response.data['results']] == \
+        [{'status': 'Graduated'}, {'status': 'Inactive'}, {'status': 'Active'}]
+    assert response.data['results'][0]['changed_fields'] == ['status']
+    assert client.get('/api/admin/audit-trail/', {'entity': 'Student', 'action': 'DELETE'}).data['results'] == []
+
+    # the list reaches into the archived segment too, in before pages
+    since = (timezone.now() - timedelta(days=500)).isoformat()
+    listed = client.get('/api/admin/audit-trail/', {'entity_pk': 'S-1', 'since': since, 'limit': 3})
+    assert [row['new_value'] for row in listed.data['results']] == \
+        [{'program_id': 'BSCS'}, {'status': 'Graduated'}, {'status': 'Inactive'}]
+    rest = client.get(listed.data['next'])
+    assert [row['new_value'] for row in rest.data['results']] == [{'status': 'Active'}] and rest.data['next'] is None
+    assert client.get('/api/admin/audit-trail/', {'since': 'yesterday'}).status_code == 400
+
+    # the history reaches into the archived segment
+    history = client.get('/api/admin/audit-trail/Student/S-1/', {'limit': 3})
+    assert [row['new_value'] for row in history.data['results']] == \
+        [{'program_id': 'BSCS'}, {'status': 'Graduated'}, {'status': 'Inactive'}]
+    rest = client.get(history.data['next'])
+    assert [(row['new_value'], row['entity_pk']) for row in rest.data['results']] == [({'status': 'Active'}, 'S-1')]
+    assert rest.data['next'] is None
+
+
+@pytest.mark.django_db
+def test_api_writes_are_audited_for_the_jwt_user(locmem_caches):
+    from Models.models import Person
+
+    client = APIClient()
+    token = client.post(reverse('token_obtain_pair'), {
+        'username': 'rhays056@gmail.com', 'password': 'admin12345678'
+    }, format='json').data['access']
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+    response = client.patch('/api/admin/courses/ACC-140/', {'course_name': 'Financial Accounting', 'lab': False},
+                            format='json')
+    assert response.status_code == 200
+
+    history = client.get('/api/admin/audit-trail/Course/ACC-140/')
+    assert history.status_code == 200
+    latest = history.data['results'][0]
+    assert latest['action_type'] == 'UPDATE' and latest['new_value'] == {'course_name': 'Financial Accounting'}
+    assert latest['changed_fields'] == ['course_name']
+    assert latest['userid'] == Person.objects.get(user__username='rhays056@gmail.com').pk
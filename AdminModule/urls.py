@@ -45,4 +45,13 @@ urlpatterns =[
 
     path('bulk/', BulkCreateAPIView.as_view()),
 
+    path('cache/metrics/', CacheMetricsAPIView.as_view(), name='cache-metrics'),
+    path('cache/keys/', CacheKeyInspectorAPIView.as_view(), name='cache-keys'),
+
+    path('audit-trail/', AuditTrailListAPIView.as_view(), name='audit-trail'),
+    path('audit-trail/<str:entity_name>/<str:entity_pk>/', AuditTrailHistoryAPIView.as_view(),
+         name='audit-trail-history'),
+
+    path('attendance/', AttendanceSummaryListAPIView.as_view(), name='attendance-summary'),
+
 ]
\ No newline at end of file
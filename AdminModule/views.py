@@ -1,3 +1,4 @@
+from django.conf import settings as django_settings
 from django.db.models import Count
 from django.db.models.functions import ExtractYear
 from django.http import HttpResponse
@@ -6,11 +7,17 @@ from rest_framework.filters import SearchFilter, OrderingFilter
 import django_filters
 from rest_framework import generics
 from rest_framework.exceptions import PermissionDenied
+from rest_framework.utils.urls import replace_query_param
 
 
-from .tasks import cache_faculty_data_task, cache_student_data_task, cache_programs_data_task, cache_courses_data_task, \
-    cache_semester_data_task, cache_courseAllocation_data_task, cache_enrollment_data_task, \
-    send_result_calculation_confirmation_mail
+from Models.cache_metrics import inspect_keys, recorder
+from Models.cache_tags import set_tagged, tag
+from Models.counters import counts
+from Models.attendance import at_risk, at_risk_percentage
+from Models.audit_archive import audit_records
+from Models.pagination import KeysetPagination
+from Models.reference import reference_data
+from .tasks import rebuild_stats, schedule_rebuild, send_result_calculation_confirmation_mail, refresh_list_cache_task
 from .serializers import *
 from .mixins import *
 
@@ -122,6 +129,9 @@ class AdminDashboardAPIView(
     AdminPermissionMixin,
     APIView
 ):
+    # tables read by get(), for the ETag (Models/conditional.py)
+    etag_models = ['Admin', 'Person', 'Student', 'Faculty', 'Program', 'Course', 'Class', 'CourseAllocation',
+                   'Enrollment', 'Department']
 
     def get(self, request, *args, **kwargs):
         cache_key = f'admin:dashboard:{request.user.username}'
@@ -138,44 +148,39 @@ class AdminDashboardAPIView(
             'image': request.build_absolute_uri(admin.employee_id.image.url) if admin.employee_id.image else None,
         }
 
-        students_total = Student.objects.count()
-        faculty_total = Faculty.objects.count()
-        programs_total = Program.objects.count()
-        courses_total = Course.objects.count()
-        classes_total = Class.objects.count()
-        allocation_total = CourseAllocation.objects.count()
-        enrollment_total = Enrollment.objects.count()
-
-        students_status_count = list((
-            Student.objects.values('status')
-            .annotate(count=Count('student_id'))
-        ))
-
-        allocations_status_count = list((
-            CourseAllocation.objects.values('status')
-            .annotate(count=Count('allocation_id'))
-        ))
-
-        enrollments_status_count = list((
-            Enrollment.objects.values('status')
-            .annotate(count=Count('enrollment_id'))
-        ))
-
-        classes_student_count = list((
-            Class.objects.values('class_id')
-            .annotate(count=Count('student'))
-        ))
-
-        departments_data = list((
-            Department.objects
-            .annotate(
-                student_count=Count('program__student', distinct=True),
-                faculty_count=Count('faculty', distinct=True),
-                program_count=Count('program', distinct=True),
-                enrollment_count=Count('program__student__enrollment', distinct=True),
-            )
-            .values('department_id', 'student_count', 'faculty_count', 'program_count')
-        ))
+        # maintained counters (Models/counters.py) instead of a COUNT per figure
+        counted = counts('students', 'faculty', 'programs', 'courses', 'classes', 'allocations', 'enrollments',
+                         'students.status', 'allocations.status', 'enrollments.status', 'class.students',
+                         'department.students', 'department.faculty', 'department.programs')
+        students_total = counted['students'].get('', 0)
+        faculty_total = counted['faculty'].get('', 0)
+        programs_total = counted['programs'].get('', 0)
+        courses_total = counted['courses'].get('', 0)
+        classes_total = counted['classes'].get('', 0)
+        allocation_total = counted['allocations'].get('', 0)
+        enrollment_total = counted['enrollments'].get('', 0)
+
+        students_status_count = [{'status': key, 'count': value}
+                                 for key, value in counted['students.status'].items() if value]
+        allocations_status_count = [{'status': key, 'count': value}
+                                    for key, value in counted['allocations.status'].items() if value]
+        enrollments_status_count = [{'status': key, 'count': value}
+                                    for key, value in counted['enrollments.status'].items() if value]
+
+        classes_student_count = [
+            {'class_id': class_id, 'count': counted['class.students'].get(str(class_id), 0)}
+            for class_id in Class.objects.values_list('class_id', flat=True)
+        ]
+
+        departments_data = [
+            {
+                'department_id': department_id,
+                'student_count': counted['department.students'].get(department_id, 0),
+                'faculty_count': counted['department.faculty'].get(department_id, 0),
+                'program_count': counted['department.programs'].get(department_id, 0),
+            }
+            for department_id in Department.objects.values_list('department_id', flat=True)
+        ]
 
         enrollment_yearly = list((
             Enrollment.objects.annotate(year=ExtractYear('enrollment_date'))
@@ -208,7 +213,9 @@ class AdminDashboardAPIView(
             'enrollment_yearly': enrollment_yearly,
             'yearly_admission': yearly_admission,
         }
-        cache.set(cache_key,data, timeout=60*5)
+        tags = [tag(Admin, admin.pk), tag(Person, admin.pk)]
+        tags += [tag(model) for model in (Student, Faculty, Program, Course, Class, CourseAllocation, Enrollment, Department)]
+        set_tagged(cache_key, data, 60*5, tags)
 
         return Response(data)
 
@@ -260,6 +267,7 @@ class AdminProfileAPIView(
 class FacultyListCreateAPIView(
     IsSuperUserOrAdminMixin,
     PersonSerializerMixin,
+    CachedListMixin,
     generics.ListCreateAPIView
 ):
     queryset = Faculty.objects.all()
@@ -268,71 +276,13 @@ class FacultyListCreateAPIView(
     filterset_fields = ['department_id', 'designation']
     search_fields = ['employee_id__first_name', 'employee_id__last_name', 'employee_id__institutional_email']
 
-    def list(self, request, *args, **kwargs):
-
-        cache_key = f'admin:faculty_list'
-        cached_data = cache.get(cache_key)
-        # if cached data is not available
-        if cached_data is None:
-            cache_faculty_data_task.delay(request.user.id)
-            return super().list(request, *args, **kwargs)
-
-        else:
-            query_params = request.query_params
-
-            filter_params = {
-                key : value for key, value in query_params.items() if key!='page'
-            }
-            if not query_params or not filter_params:
-                page = self.paginate_queryset(cached_data)
-                if page is not None:
-                    return self.get_paginated_response(page)
-                return Response(cached_data, status=status.HTTP_200_OK)
-
-            # if there are search and ordering filters fall back to DjangoFilterBackend
-            if 'search' in query_params or 'ordering' in filter_params:
-                return super().list(request, *args, **kwargs)
-
-            if 'department_id' in filter_params and 'designation' in filter_params and len(filter_params)==2:
-                cache_key = f'admin:faculty:{filter_params.get("department_id")}:{filter_params.get("designation")}'
-                data = cache.get(cache_key)
-                if data is None:
-                    return super().list(request, *args, **kwargs)
-                page = self.paginate_queryset(data)
-                if page is None:
-                    return self.get_paginated_response(page)
-                return Response(data, status=status.HTTP_200_OK)
-
-            # if applied filter is of department
-            if 'department_id' in filter_params and len(filter_params)==1:
-                value = query_params.get('department_id')
-                cache_key = f'admin:faculty:department:{value}'
-                data = cache.get(cache_key)
-                if data is None:
-                    return super().list(request, *args, **kwargs)
-                page = self.paginate_queryset(data)
-                if page is not None:
-                    return self.get_paginated_response(page)
-                return Response(data, status=status.HTTP_200_OK)
-
-            # if applied filter is of designation
-            if 'designation' in filter_params and len(filter_params)==1:
-                value = query_params.get('designation')
-                cache_key = f'admin:faculty:designation:{value}'
-                data = cache.get(cache_key)
-                if data is None:
-                    return super().list(request, *args, **kwargs)
-                page = self.paginate_queryset(data)
-                if page is not None:
-                    return self.get_paginated_response(page)
-                return Response(data, status=status.HTTP_200_OK)
-
-
-        return super().list(request, *args, **kwargs)
+    cache_prefix = 'admin:faculty'
+    cache_filter_fields = ['department_id', 'designation']
+    cache_refresh_task = refresh_list_cache_task
 
     def perform_create(self, serializer):
-        serializer.save()
-        cache_faculty_data_task.delay(self.request.user.id)
+        instance = serializer.save()
+        self.cache_row(instance.pk)
 
 
 
@@ -343,6 +293,7 @@ class FacultyListCreateAPIView(
 class FacultyRetrieveUpdateAPIView(
     IsSuperUserOrAdminMixin,
     PersonSerializerMixin,
+    CachedRowMixin,
     generics.RetrieveUpdateAPIView
 ):
     queryset = Faculty.objects.all()
@@ -351,10 +302,14 @@ class FacultyRetrieveUpdateAPIView(
     change_type = 'faculty_delete'
     target_field_name = 'target_faculty'
 
+    cache_prefix = 'admin:faculty'
+    cache_filter_fields = ['department_id', 'designation']
+
 
     def perform_update(self, serializer):
+        before = self.get_cache_row_state(serializer.instance.pk)
         serializer.save()
-        cache_faculty_data_task.delay(self.request.user.id)
+        self.cache_row(serializer.instance.pk, before)
 
     def destroy(self, request, *args, **kwargs):
        return self.destroy_mixin()
@@ -365,6 +320,7 @@ class FacultyRetrieveUpdateAPIView(
 class StudentListCreateAPIView(
     IsSuperUserOrAdminMixin,
     PersonSerializerMixin,
+    CachedListMixin,
     generics.ListCreateAPIView
 ):
     queryset = Student.objects.all()
@@ -373,96 +329,13 @@ class StudentListCreateAPIView(
     filterset_fields = ['program_id', 'class_id', 'program_id__department_id','status']
     search_fields = ['student_id__first_name', 'student_id__last_name', 'student_id__institutional_email']
 
-    def list(self, request, *args, **kwargs):
-        cache_key = 'admin:student_list'
-        cached_data = cache.get(cache_key)
-        if cached_data is None:
-            #print('Cache Miss')
-            cache_student_data_task.delay(request.user.id)
-            return super().list(request, *args, **kwargs)
-
-        else:
-            query_params = request.query_params
-            #print(query_params)
-            filter_params = {
-                key : value for key,value in query_params.items() if key!='page' and value !=''
-            }
-            #print(filter_params)
-            if not query_params or not  filter_params:
-                print('Cache Hit')
-                page = self.paginate_queryset(cached_data)
-                if page is not None:
-                    return self.get_paginated_response(page)
-                return Response(cached_data, status=status.HTTP_200_OK)
-
-            if 'search' in query_params or 'ordering' in filter_params or len(filter_params)>2:
-                print('Cache Miss')
-                return super().list(request, *args, **kwargs)
-
-            if len(filter_params)==2:
-                if 'program_id__department_id' in filter_params and 'status' in filter_params:
-                    cache_key = f'admin:students{query_params.get("program_id__department_id")}:{query_params.get("status")}'
-                    data = cache.get(cache_key)
-                    if data is None:
-                        return super().list(request, *args, **kwargs)
-                    print('Cache Hit')
-                    page = self.paginate_queryset(data)
-                    if page is not None:
-                        return self.get_paginated_response(page)
-                    return Response(data, status=status.HTTP_200_OK)
-                else:
-                    return super().list(request, *args, **kwargs)
-
-            if 'program_id' in filter_params and len(filter_params)==1:
-                cache_key = f'admin:students:program:{query_params.get("program_id")}'
-                data = cache.get(cache_key)
-                if data is None:
-                    return super().list(request, *args, **kwargs)
-                print('Cache Hit')
-                page = self.paginate_queryset(data)
-                if page is not None:
-                    return self.get_paginated_response(page)
-                return Response(data, status=status.HTTP_200_OK)
-
-            if 'program_id__department_id' in filter_params and len(filter_params)==1:
-                cache_key = f'admin:students:department:{query_params.get("program_id__department_id")}'
-                data = cache.get(cache_key)
-                if data is None:
-                    return super().list(request, *args, **kwargs)
-                print('Cache Hit')
-                page = self.paginate_queryset(data)
-                if page is not None:
-                    return self.get_paginated_response(page)
-                return Response(data, status=status.HTTP_200_OK)
-
-            if 'class_id' in filter_params and len(filter_params)==1:
-                cache_key = f'admin:students:class:{query_params.get("class_id")}'
-                data = cache.get(cache_key)
-                if data is None:
-                    return super().list(request, *args, **kwargs)
-                print('Cache Hit')
-                page = self.paginate_queryset(data)
-                if page is not None:
-                    return self.get_paginated_response(page)
-                return Response(data, status=status.HTTP_200_OK)
-
-            if 'status' in filter_params and len(filter_params)==1:
-                cache_key = f'admin:student_list:status:{query_params.get("status")}'
-                data = cache.get(cache_key)
-                if data is None:
-                    return super().list(request, *args, **kwargs)
-                print('Cache Hit')
-                page = self.paginate_queryset(data)
-                if page is not None:
-                    return self.get_paginated_response(page)
-                return Response(data, status=status.HTTP_200_OK)
-
-        return super().list(request, *args, **kwargs)
-
+    cache_prefix = 'admin:students'
+    cache_filter_fields = ['program_id', 'class_id', 'program_id__department_id', 'status']
+    cache_refresh_task = refresh_list_cache_task
 
     def perform_create(self, serializer):
-        serializer.save()
-        cache_student_data_task.delay(self.request.user.id)
+        instance = serializer.save()
+        self.cache_row(instance.pk)
 
 
 
@@ -471,6 +344,7 @@ class StudentListCreateAPIView(
 class StudentRetrieveUpdateAPIView(
     IsSuperUserOrAdminMixin,
     PersonSerializerMixin,
+    CachedRowMixin,
     generics.RetrieveUpdateAPIView
 ):
     queryset = Student.objects.all()
@@ -479,9 +353,13 @@ class StudentRetrieveUpdateAPIView(
     change_type = 'student_delete'
     target_field_name = 'target_student'
 
+    cache_prefix = 'admin:students'
+    cache_filter_fields = ['program_id', 'class_id', 'program_id__department_id', 'status']
+
     def perform_update(self, serializer):
+        before = self.get_cache_row_state(serializer.instance.pk)
         serializer.save()
-        cache_student_data_task.delay(self.request.user.id)
+        self.cache_row(serializer.instance.pk, before)
 
     def destroy(self, request, *args, **kwargs):
         return self.destroy_mixin()
@@ -504,6 +382,7 @@ class DepartmentRetrieveUpdateAPIView(
 
 class ProgramListCreateAPIView(
     IsSuperUserOrAdminMixin,
+    CachedListMixin,
     generics.ListCreateAPIView
 ):
     queryset = Program.objects.all()
@@ -512,56 +391,37 @@ class ProgramListCreateAPIView(
     filterset_fields = ['department_id', 'total_semesters']
     search_fields = ['program_id', 'program_name']
 
-    def list(self, request, *args, **kwargs):
-        cache_key = f'admin:program_list'
-        cached_data = cache.get(cache_key)
-        if cached_data is None:
-            cache_programs_data_task.delay(request.user.id)
-            return super().list(request, *args, **kwargs)
-        else:
-            query_params = request.query_params
-            filter_params = {
-                key : value for key,value in query_params.items() if key!='page'
-            }
-            if not query_params or not filter_params:
-                page = self.paginate_queryset(cached_data)
-                if page is not None:
-                    return self.get_paginated_response(page)
-                return Response(cached_data, status=status.HTTP_200_OK)
-
-            if 'search' in query_params or 'ordering' in filter_params:
-                return super().list(request, *args, **kwargs)
-
-            if len(filter_params) == 1 and 'department_id' in filter_params:
-                cache_key = f'admin:programs:department:{query_params.get("department_id")}'
-                data = cache.get(cache_key)
-                page = self.paginate_queryset(data)
-                if page is not None:
-                    return self.get_paginated_response(page)
-                return Response(data, status=status.HTTP_200_OK)
-
-            return super().list(request, *args, **kwargs)
+    cache_prefix = 'admin:programs'
+    cache_filter_fields = ['department_id', 'total_semesters']
+    cache_refresh_task = refresh_list_cache_task
 
     def perform_create(self, serializer):
-        serializer.save()
-        cache_programs_data_task.delay(self.request.user.id)
+        instance = serializer.save()
+        self.cache_row(instance.pk)
 
 
 class ProgramRetrieveUpdateDestroyAPIView(
     IsSuperUserOrAdminMixin,
+    CachedRowMixin,
     generics.RetrieveUpdateDestroyAPIView
 ):
     queryset = Program.objects.all()
     serializer_class = ProgramSerializer
     lookup_field = 'program_id'
 
+    cache_prefix = 'admin:programs'
+    cache_filter_fields = ['department_id', 'total_semesters']
+
     def perform_update(self, serializer):
+        before = self.get_cache_row_state(serializer.instance.pk)
         serializer.save()
-        cache_programs_data_task.delay(self.request.user.id)
+        self.cache_row(serializer.instance.pk, before)
 
     def perform_destroy(self, instance):
+        pk = instance.pk
+        before = self.get_cache_row_state(pk)
         instance.delete()
-        cache_programs_data_task.delay(self.request.user.id)
+        self.cache_row(pk, before)
 
 
 class CourseFilter(django_filters.FilterSet):
@@ -573,13 +433,13 @@ class CourseFilter(django_filters.FilterSet):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-        course_codes = Course.objects.values_list('course_code', flat=True)
-        prefixes = sorted(set([each.split('-')[0] for each in course_codes]))
+        prefixes = reference_data.course_prefixes()
         self.filters['prefix'].extra['choices'] = [(p,p) for p in prefixes]
 
 
 class CourseListCreateAPIView(
     IsSuperUserOrAdminMixin,
+    CachedListMixin,
     generics.ListCreateAPIView
 ):
     queryset = Course.objects.all()
@@ -588,107 +448,72 @@ class CourseListCreateAPIView(
     filterset_class = CourseFilter
     search_fields = ['course_code', 'course_name', 'pre_requisite__course_code']
 
-    def list(self, request, *args, **kwargs):
-        cache_key = 'admin:courses_list'
-        cached_data = cache.get(cache_key)
-        if cached_data is None:
-            print('Cache Miss:1')
-            cache_courses_data_task.delay(request.user.id)
-            return super().list(request, *args, **kwargs)
-
-        else:
-            filter_params = {
-                key : value for key, value in request.query_params.items() if key!= 'page'
-            }
-            if filter_params:
-                print('Cache Miss:2')
-                return super().list(request, *args, **kwargs)
-
-            page = self.paginate_queryset(cached_data)
-            print('Cache Hit')
-            if page is not None:
-                return self.get_paginated_response(page)
-            return Response(cached_data, status=status.HTTP_200_OK)
+    cache_prefix = 'admin:courses'
+    cache_filter_fields = []
+    cache_refresh_task = refresh_list_cache_task
 
     def perform_create(self, serializer):
-        serializer.save()
-        cache_courses_data_task.delay(self.request.user.id)
+        instance = serializer.save()
+        self.cache_row(instance.pk)
 
 
 
 class CourseRetrieveUpdateDestroyAPIView(
     IsSuperUserOrAdminMixin,
+    CachedRowMixin,
     generics.RetrieveUpdateDestroyAPIView
 ):
     queryset = Course.objects.all()
     serializer_class = CourseSerializer
     lookup_field = 'course_code'
 
+    cache_prefix = 'admin:courses'
+    cache_filter_fields = []
+
     def perform_update(self, serializer):
+        before = self.get_cache_row_state(serializer.instance.pk)
         serializer.save()
-        cache_courses_data_task.delay(self.request.user.id)
+        self.cache_row(serializer.instance.pk, before)
 
     def perform_destroy(self, instance):
+        pk = instance.pk
+        before = self.get_cache_row_state(pk)
         instance.delete()
-        cache_courses_data_task.delay(self.request.user.id)
+        self.cache_row(pk, before)
 
 
 
 class SemesterListAPIView(
     IsSuperUserOrAdminMixin,
+    CachedListMixin,
     generics.ListAPIView
 ):
     queryset = Semester.objects.all()
     serializer_class = SemesterSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['semesterdetails__class_id']
-    
-    def list(self, request, *args, **kwargs):
-        cache_key = 'admin:semesters_list'
-        cached_data = cache.get(cache_key)
-        if cached_data is None:
-            cache_semester_data_task.delay(self.request.user.id)
-            return  super().list(request, *args, **kwargs)
-        
-        query_params = request.query_params
-        filter_params = {
-            key : value for key, value in query_params.items() if key!='page' and value != ''
-        }
-        
-        if not query_params or not filter_params:
-            print('Cache Hit')
-            page = self.paginate_queryset(cached_data)
-            if page is not None:
-                return self.get_paginated_response(page)
-            return Response(cached_data, status=status.HTTP_200_OK)
-        
-        if 'ordering' in filter_params or 'search' in filter_params:
-            return super().list(request, *args, **kwargs)
-
-        if 'semesterdetails__class_id' in filter_params:
-            cache_key= f'admin:semesters:class:{filter_params.get('semesterdetails__class_id')}'
-            data = cache.get(cache_key)
-            if data is None:
-                return super().list(request, *args, **kwargs)
-            print('Cache Hit')
-            page = self.paginate_queryset(data)
-            if page is None:
-                return self.get_paginated_response(page)
-            return Response(data, status=status.HTTP_200_OK)
-        
-        return super().list(request, *args, **kwargs)
+
+    cache_prefix = 'admin:semesters'
+    cache_filter_fields = ['semesterdetails__class_id']
+    cache_refresh_task = refresh_list_cache_task
+
 
 class SemesterRetrieveUpdateAPIView(
     IsSuperUserOrAdminMixin,
+    CachedRowMixin,
     generics.RetrieveUpdateAPIView
 ):
     queryset = Semester.objects.all()
     serializer_class = SemesterSerializer
     lookup_field = 'semester_id'
 
+    cache_prefix = 'admin:semesters'
+    cache_filter_fields = ['semesterdetails__class_id']
+
     def perform_update(self, serializer):
+        before = self.get_cache_row_state(serializer.instance.pk)
         serializer.save()
-        cache_semester_data_task.delay(self.request.user.id)
+        self.cache_row(serializer.instance.pk, before)
 
 
 class ClassListCreateAPIView(
@@ -703,7 +528,7 @@ class ClassListCreateAPIView(
 
     def perform_create(self, serializer):
         serializer.save()
-        cache_semester_data_task.delay(self.request.user.id)
+        schedule_rebuild('semesters', self.request.user.id)
 
 
     
@@ -719,9 +544,15 @@ class ClassRetrieveUpdateAPIView(
     filter_backends = [OrderingFilter]
     ordering_fields = ['semesterdetails__semester_id__semester_no']
 
+    def perform_update(self, serializer):
+        # the class's semester details are nested in the cached semesters
+        serializer.save()
+        schedule_rebuild('semesters', self.request.user.id)
+
 
 class CourseAllocationListCreateAPIView (
     AdminCourseAllocationPermissionMixin,
+    CachedListMixin,
     generics.ListCreateAPIView
 ):
     queryset = CourseAllocation.objects.all()
@@ -732,61 +563,50 @@ class CourseAllocationListCreateAPIView (
                      'teacher_id__employee_id__last_name','enrollment__student_id__student_id__first_name',
                      'course_code__course_code', ]
 
-    def list(self, request, *args, **kwargs):
-        query_params = request.query_params
-        filter_params = {
-            key : value for key,value in query_params.items() if key!='page' and value!=''
-        }
-        if not query_params or not filter_params:
-            return super().list(request, *args, **kwargs)
-
-        if 'ordering' in filter_params or 'search' in filter_params:
-            return super().list(request, *args, **kwargs)
-
-        if len(filter_params)==1 and ('semester_id' in filter_params or 'teacher_id' in filter_params):
-            cache_key = f'admin:allocations:semester:{filter_params.get("semester_id")}' if 'semester_id' in filter_params else f'admin:allocations:faculty:{filter_params.get("teacher_id")}'
-            data = cache.get(cache_key)
-            if data is None:
-                cache_courseAllocation_data_task.delay(self.request.user.id)
-                return super().list(request, *args, **kwargs)
-            page = self.paginate_queryset(data)
-            if page is None:
-                return self.get_paginated_response(page)
-            return Response(data, status=status.HTTP_200_OK)
-
-        return super().list(request, *args, **kwargs)
+    cache_prefix = 'admin:allocations'
+    cache_filter_fields = ['teacher_id', 'status', 'course_code', 'semester_id']
+    cache_refresh_task = refresh_list_cache_task
 
     def perform_create(self, serializer):
-        serializer.save()
-        cache_courseAllocation_data_task.delay(self.request.user.id)
+        instance = serializer.save()
+        self.cache_row(instance.pk)
 
 
 
 class CourseAllocationRetrieveUpdateDestroyAPIView(
     AdminCourseAllocationPermissionMixin,
+    CachedRowMixin,
     generics.RetrieveUpdateDestroyAPIView
 ):
     queryset = CourseAllocation.objects.all()
     serializer_class = CourseAllocationSerializer
     lookup_field = 'allocation_id'
 
+    cache_prefix = 'admin:allocations'
+    cache_filter_fields = ['teacher_id', 'status', 'course_code', 'semester_id']
+
     def perform_update(self, serializer):
+        before = self.get_cache_row_state(serializer.instance.pk)
         serializer.save()
-        cache_courseAllocation_data_task.delay(self.request.user.id)
+        self.cache_row(serializer.instance.pk, before)
 
     def perform_destroy(self, instance):
+        pk = instance.pk
+        before = self.get_cache_row_state(pk)
         instance.delete()
-        cache_courseAllocation_data_task.delay(self.request.user.id)
+        self.cache_row(pk, before)
 
 
 
 class EnrollmentListCreateAPIView(
     AdminEnrollmentPermissionMixin,
+    CachedListMixin,
     generics.ListCreateAPIView
 ):
 
     serializer_class = EnrollmentSerializer
     queryset = Enrollment.objects.all()
+    pagination_class = KeysetPagination
 
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     filterset_fields = ['student_id','allocation_id__teacher_id',
@@ -795,55 +615,42 @@ class EnrollmentListCreateAPIView(
     search_fields = ['student_id__student_id__person_id', 'student_id__student_id__first_name',
                      'student_id__student_id__last_name']
 
-    def list(self, request, *args, **kwargs):
-        query_params = request.query_params
-        filter_params = {
-            key: value for key, value in query_params.items() if key != 'page' and value != ''
-        }
-        if not query_params or not filter_params:
-            return super().list(request, *args, **kwargs)
-
-        if 'ordering' in filter_params or 'search' in filter_params:
-            return super().list(request, *args, **kwargs)
-
-        if len(filter_params) == 1 and ('student_id' in filter_params or 'allocation_id__teacher_id' in filter_params):
-            cache_key = f'admin:enrollments:student:{filter_params.get("student_id")}' if 'student_id' in filter_params else f'admin:enrollments:faculty:{filter_params.get("allocation_id__teacher_id")}'
-            data = cache.get(cache_key)
-            if data is None:
-                cache_enrollment_data_task.delay(self.request.user.id)
-                return super().list(request, *args, **kwargs)
-            page = self.paginate_queryset(data)
-            if page is None:
-                return self.get_paginated_response(page)
-            return Response(data, status=status.HTTP_200_OK)
-
-        return super().list(request, *args, **kwargs)
+    cache_prefix = 'admin:enrollments'
+    cache_filter_fields = ['student_id', 'allocation_id__teacher_id', 'status', 'allocation_id__semester_id']
+    cache_refresh_task = refresh_list_cache_task
 
     def perform_create(self, serializer):
-        serializer.save()
-        cache_enrollment_data_task.delay(self.request.user.id)
+        instance = serializer.save()
+        self.cache_row(instance.pk)
 
 
 
 class EnrollmentRetrieveUpdateDestroyAPIView(
     AdminEnrollmentPermissionMixin,
+    CachedRowMixin,
     generics.RetrieveUpdateDestroyAPIView
 ):
     queryset = Enrollment.objects.all()
     serializer_class = EnrollmentSerializer
     lookup_field = 'enrollment_id'
 
+    cache_prefix = 'admin:enrollments'
+    cache_filter_fields = ['student_id', 'allocation_id__teacher_id', 'status', 'allocation_id__semester_id']
+
     def perform_update(self, serializer):
+        before = self.get_cache_row_state(serializer.instance.pk)
         serializer.save()
-        cache_enrollment_data_task.delay(self.request.user.id)
+        self.cache_row(serializer.instance.pk, before)
 
     def perform_destroy(self, instance):
         result = Result.objects.get(enrollment_id=instance.enrollment_id)
         if result.course_gpa:
             raise PermissionDenied('This enrollment cannot be deleted')
         else:
+            pk = instance.pk
+            before = self.get_cache_row_state(pk)
             instance.delete()
-            cache_enrollment_data_task.delay(self.request.user.id)
+            self.cache_row(pk, before)
 
 
 
@@ -853,6 +660,7 @@ class TranscriptListCreateAPIView(
 ):
     queryset = Transcript.objects.all()
     serializer_class = TranscriptSerializer
+    pagination_class = KeysetPagination
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     filterset_fields = ['semester_id', 'student_id']
     search_fields = ['student_id__student_id__person_id', 'student_id__student_id__first_name',
@@ -883,6 +691,7 @@ class ChangeRequestListAPIView(
 ):
     queryset = ChangeRequest.objects.all()
     serializer_class = ChangeRequestSerializer
+    pagination_class = KeysetPagination
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     filterset_fields = ['status', 'change_type', 'target_faculty','target_student']
 
@@ -997,3 +806,124 @@ class BulkCreateAPIView(
 
 
 
+
+class CacheMetricsAPIView(
+    IsSuperUserOrAdminMixin,
+    APIView
+):
+    # hits, misses, errors, bytes and latency per cache and key family, since the last reset,
+    # and the pending and coalesced domain rebuilds
+    def get(self, request, *args, **kwargs):
+        return Response({**recorder.snapshot(), 'rebuilds': rebuild_stats()}, status=status.HTTP_200_OK)
+
+    def delete(self, request, *args, **kwargs):
+        recorder.reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class CacheKeyInspectorAPIView(
+    IsSuperUserOrAdminMixin,
+    APIView
+):
+    # key counts, memory and TTL distribution per key family, ?cache=pages&max_keys=50000
+    def get(self, request, *args, **kwargs):
+        alias = request.query_params.get('cache', 'default')
+        if alias not in django_settings.CACHES:
+            return Response({'cache': f'Unknown cache {alias}'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            max_keys = min(int(request.query_params.get('max_keys', 10000)), 100000)
+        except ValueError:
+            return Response({'max_keys': 'Must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        data = inspect_keys(alias, max_keys=max_keys)
+        if data is None:
+            return Response({'detail': 'Key inspection needs a Redis cache'}, status=status.HTTP_501_NOT_IMPLEMENTED)
+        if 'error' in data:
+            return Response(data, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+        return Response(data, status=status.HTTP_200_OK)
+
+
+
+class AuditTrailFilter(django_filters.FilterSet):
+    entity = django_filters.CharFilter(field_name='entity_name')
+    entity_pk = django_filters.CharFilter(field_name='touched__entity_pk')
+    action = django_filters.CharFilter(field_name='action_type')
+    user = django_filters.CharFilter(field_name='userid')
+    field = django_filters.CharFilter(field_name='changed_fields__field_name')
+    since = django_filters.IsoDateTimeFilter(field_name='time_stamp', lookup_expr='gte')
+    until = django_filters.IsoDateTimeFilter(field_name='time_stamp', lookup_expr='lt')
+
+    class Meta:
+        model = AuditTrail
+        fields = []
+
+
+class AuditRecordsMixin:
+    # pages of Models.audit_archive.audit_records(), newest first; ?before=<audit_id>&limit=100
+    def audit_page(self, request, **filters):
+        try:
+            before = int(request.query_params['before']) if 'before' in request.query_params else None
+            limit = min(int(request.query_params.get('limit', 100)), 1000)
+        except ValueError:
+            return Response({'detail': 'before and limit must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+
+        records = audit_records(limit=limit + 1, before_id=before, **filters)
+        next_link = None
+        if len(records) > limit:
+            records = records[:limit]
+            next_link = replace_query_param(request.build_absolute_uri(), 'before', records[-1]['audit_id'])
+        return Response({'next': next_link, 'results': AuditRecordSerializer(records, many=True).data},
+                        status=status.HTTP_200_OK)
+
+
+class AuditTrailListAPIView(
+    IsSuperUserOrAdminMixin,
+    AuditRecordsMixin,
+    APIView
+):
+    # the audit trail, archived rows included, filtered by AuditTrailFilter's parameters
+    def get(self, request, *args, **kwargs):
+        filterset = AuditTrailFilter(request.query_params, queryset=AuditTrail.objects.none())
+        if not filterset.is_valid():
+            return Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+        cleaned = filterset.form.cleaned_data
+        return self.audit_page(request, entity_name=cleaned['entity'] or None, entity_pk=cleaned['entity_pk'] or None,
+                               action_type=cleaned['action'] or None, userid_id=cleaned['user'] or None,
+                               field=cleaned['field'] or None, since=cleaned['since'], until=cleaned['until'])
+
+
+class AuditTrailHistoryAPIView(
+    IsSuperUserOrAdminMixin,
+    AuditRecordsMixin,
+    APIView
+):
+    # every change of one record, archived ones included
+    def get(self, request, entity_name, entity_pk, *args, **kwargs):
+        return self.audit_page(request, entity_name=entity_name, entity_pk=entity_pk)
+
+
+class AttendanceSummaryFilter(django_filters.FilterSet):
+    at_risk = django_filters.BooleanFilter(method='filter_at_risk')
+    allocation = django_filters.NumberFilter(field_name='enrollment__allocation_id')
+    student = django_filters.CharFilter(field_name='enrollment__student_id')
+
+    class Meta:
+        model = AttendanceSummary
+        fields = []
+
+    def filter_at_risk(self, queryset, name, value):
+        if value:
+            return at_risk(queryset)
+        return queryset.exclude(percentage__lt=at_risk_percentage(), lectures_held__gt=0)
+
+
+class AttendanceSummaryListAPIView(
+    IsSuperUserOrAdminMixin,
+    generics.ListAPIView
+):
+    # attendance figures of every enrollment, lowest first; ?at_risk=true for the ones below the threshold
+    queryset = AttendanceSummary.objects.select_related('enrollment').order_by('percentage', 'enrollment')
+    serializer_class = AttendanceSummarySerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_class = AttendanceSummaryFilter
+
@@ -0,0 +1,256 @@
+import json
+import os
+import resource
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+
+
+# Shared by the compiler containers: every build copies this file next to its api.py
+
+
+def _env_int(name, default=None):
+    value = os.environ.get(name)
+    if value in (None, ''):
+        return default
+    return int(value)
+
+
+class Limits:
+    """rlimits applied to a child process before it execs its command."""
+
+    def __init__(self, cpu_seconds=None, memory_mb=None, file_size_mb=None, open_files=None, processes=None,
+                 heap_mb=None):
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.file_size_mb = file_size_mb
+        self.open_files = open_files
+        self.processes = processes
+        # not an rlimit: passed to runtimes that cap their own heap (java -Xmx), reported with the others
+        self.heap_mb = heap_mb
+
+    @classmethod
+    def from_env(cls, prefix, **defaults):
+        # e.g. RUN_CPU_SECONDS, RUN_MEMORY_MB, COMPILE_MEMORY_MB ...
+        return cls(
+            cpu_seconds=_env_int(f'{prefix}_CPU_SECONDS', defaults.get('cpu_seconds')),
+            memory_mb=_env_int(f'{prefix}_MEMORY_MB', defaults.get('memory_mb')),
+            file_size_mb=_env_int(f'{prefix}_FILE_SIZE_MB', defaults.get('file_size_mb')),
+            open_files=_env_int(f'{prefix}_OPEN_FILES', defaults.get('open_files')),
+            processes=_env_int(f'{prefix}_PROCESSES', defaults.get('processes')),
+            heap_mb=_env_int(f'{prefix}_HEAP_MB', defaults.get('heap_mb')),
+        )
+
+    def as_dict(self):
+        return {
+            'cpu_seconds': self.cpu_seconds,
+            'memory_mb': self.memory_mb,
+            'file_size_mb': self.file_size_mb,
+            'open_files': self.open_files,
+            'processes': self.processes,
+            'heap_mb': self.heap_mb,
+        }
+
+    def apply(self):
+        if self.cpu_seconds:
+            resource.setrlimit(resource.RLIMIT_CPU, (self.cpu_seconds, self.cpu_seconds + 1))
+        if self.memory_mb:
+            size = self.memory_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (size, size))
+        if self.file_size_mb:
+            size = self.file_size_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_FSIZE, (size, size))
+        if self.open_files:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (self.open_files, self.open_files))
+        if self.processes:
+            resource.setrlimit(resource.RLIMIT_NPROC, (self.processes, self.processes))
+
+
+def usage_report(compile_limits=None, run_limits=None):
+    """
+    The 'usage' of a compiler service response, the same schema in every service:
+    {'compile': usage or None, 'run': usage or None, 'limits': {'compile': limits or None, 'run': limits or None}}
+    where a phase the language does not have, or that did not get to run, is None.
+    """
+    return {
+        'compile': None,
+        'run': None,
+        'limits': {
+            'compile': compile_limits.as_dict() if compile_limits else None,
+            'run': run_limits.as_dict() if run_limits else None,
+        },
+    }
+
+
+class RunResult:
+    def __init__(self, stdout, stderr, usage):
+        self.stdout = stdout
+        self.stderr = stderr
+        self.usage = usage
+
+    @property
+    def returncode(self):
+        return self.usage['exit_code']
+
+    @property
+    def timed_out(self):
+        return self.usage['timed_out']
+
+
+def run_process(cmd, stdin=None, timeout=10, limits=None):
+    """
+    Run cmd to completion and return its output together with its wait4() accounting.
+
+    The command is not spawned from this (large) server process directly: on exec Linux
+    folds the old address space's RSS high-water mark into ru_maxrss, so every child would
+    report at least our own RSS. A small supervisor (this file run as a script) forks the
+    command, applies the rlimits, enforces the timeout and reports the rusage over a pipe.
+    """
+    limits = limits or Limits()
+    spec = json.dumps({'cmd': list(cmd), 'timeout': timeout, 'limits': limits.as_dict()})
+    report_read, report_write = os.pipe()
+
+    with tempfile.TemporaryFile() as out, tempfile.TemporaryFile() as err:
+        try:
+            supervisor = subprocess.Popen(
+                [sys.executable, '-S', os.path.abspath(__file__), spec, str(report_write)],
+                stdin=stdin, stdout=out, stderr=err, pass_fds=(report_write,),
+            )
+        finally:
+            os.close(report_write)
+
+        with os.fdopen(report_read) as report:
+            usage = report.read()
+        supervisor.wait()
+
+        out.seek(0)
+        err.seek(0)
+        stdout = out.read().decode(errors='replace')
+        stderr = err.read().decode(errors='replace')
+
+    if not usage:
+        # the supervisor itself failed, e.g. the command could not be executed
+        usage = json.dumps({
+            'user_cpu_seconds': 0.0, 'system_cpu_seconds': 0.0, 'max_rss_kb': 0, 'wall_seconds': 0.0,
+            'exit_code': supervisor.returncode, 'timed_out': False,
+        })
+    return RunResult(stdout, stderr, json.loads(usage))
+
+
+def _supervise(spec, report_fd):
+    import time
+
+    os.set_inheritable(report_fd, False)
+    limits = Limits(**spec['limits'])
+
+    started = time.monotonic()
+    pid = os.fork()
+    if pid == 0:
+        try:
+            # own process group so a timeout also takes down anything the command spawned (sh -> gcc -> cc1)
+            os.setpgid(0, 0)
+            limits.apply()
+            os.execvp(spec['cmd'][0], spec['cmd'])
+        except BaseException as error:
+            os.write(2, f'{error}\n'.encode())
+        os._exit(127)
+
+    timed_out = []
+
+    def _kill(signum, frame):
+        timed_out.append(True)
+        try:
+            os.killpg(pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    signal.signal(signal.SIGALRM, _kill)
+    signal.setitimer(signal.ITIMER_REAL, spec['timeout'])
+    _, status, rusage = os.wait4(pid, 0)
+    signal.setitimer(signal.ITIMER_REAL, 0)
+    wall = time.monotonic() - started
+
+    usage = {
+        'user_cpu_seconds': round(rusage.ru_utime, 6),
+        'system_cpu_seconds': round(rusage.ru_stime, 6),
+        'max_rss_kb': rusage.ru_maxrss,
+        'wall_seconds': round(wall, 6),
+        'exit_code': os.waitstatus_to_exitcode(status),
+        'timed_out': bool(timed_out),
+    }
+    with os.fdopen(report_fd, 'w') as report:
+        report.write(json.dumps(usage))
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.total = 0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.total += value
+        self.count += 1
+
+    def as_dict(self):
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(self.buckets + ['+Inf'], self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+        return {'buckets': buckets, 'count': self.count, 'sum': round(self.total, 6)}
+
+
+LATENCY_BUCKETS = [0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+MEMORY_BUCKETS_KB = [8 * 1024, 16 * 1024, 32 * 1024, 64 * 1024, 128 * 1024, 256 * 1024, 512 * 1024, 1024 * 1024]
+
+
+class RunMetrics:
+    """Per-language, per-phase (compile/run) latency and memory histograms."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+        self._timeouts = {}
+
+    def observe(self, language, phase, usage):
+        key = (language, phase)
+        with self._lock:
+            if key not in self._series:
+                self._series[key] = {
+                    'wall_seconds': Histogram(LATENCY_BUCKETS),
+                    'cpu_seconds': Histogram(LATENCY_BUCKETS),
+                    'max_rss_kb': Histogram(MEMORY_BUCKETS_KB),
+                }
+            series = self._series[key]
+            series['wall_seconds'].observe(usage['wall_seconds'])
+            series['cpu_seconds'].observe(usage['user_cpu_seconds'] + usage['system_cpu_seconds'])
+            series['max_rss_kb'].observe(usage['max_rss_kb'])
+            if usage['timed_out']:
+                self._timeouts[key] = self._timeouts.get(key, 0) + 1
+
+    def snapshot(self):
+        data = {}
+        with self._lock:
+            for (language, phase), series in self._series.items():
+                data.setdefault(language, {})[phase] = {
+                    name: histogram.as_dict() for name, histogram in series.items()
+                }
+                data[language][phase]['timeouts'] = self._timeouts.get((language, phase), 0)
+        return data
+
+
+metrics = RunMetrics()
+
+
+if __name__ == '__main__':
+    _supervise(json.loads(sys.argv[1]), int(sys.argv[2]))
@@ -0,0 +1,95 @@
+"""Representative submissions for the compiler load tests."""
+
+
+class Case:
+    def __init__(self, name, language, files, main, input_text=None, expected=None, expect_timeout=False, timeout=15):
+        self.name = name
+        self.language = language
+        self.files = files
+        self.main = main
+        self.input_text = input_text
+        self.expected = expected
+        self.expect_timeout = expect_timeout
+        self.timeout = timeout
+
+    def check(self, result):
+        if self.expect_timeout:
+            return 'timed out' in result.get('stderr', '')
+        return result.get('stdout', '').strip() == self.expected.strip()
+
+
+IO_LINES = 20000
+IO_INPUT = '\n'.join(str(number) for number in range(IO_LINES)) + '\n'
+IO_SUM = str(sum(range(IO_LINES)))
+
+
+CASES = [
+    # CPU-bound
+    Case('py_cpu', 'python', {'main.py': 'print(sum(i * i for i in range(2_000_000)))\n'}, 'main.py',
+         expected='2666664666667000000'),
+    Case('c_cpu', 'c', {'main.c': '''#include <stdio.h>
+#include <string.h>
+static char composite[2000001];
+int main(void) {
+    int count = 0;
+    for (int i = 2; i <= 2000000; i++) {
+        if (composite[i]) continue;
+        count++;
+        for (long j = (long)i * i; j <= 2000000; j += i) composite[j] = 1;
+    }
+    printf("%d\\n", count);
+    return 0;
+}
+'''}, 'main.c', expected='148933'),
+    Case('java_cpu', 'java', {'Main.java': '''public class Main {
+    public static void main(String[] args) {
+        long total = 0;
+        for (long i = 0; i < 50_000_000L; i++) total += i % 7;
+        System.out.println(total);
+    }
+}
+'''}, 'Main.java', expected='149999997'),
+
+    # I/O-heavy: read every line from stdin, echo it back and sum it
+    Case('py_io', 'python', {'main.py': '''import sys
+total = 0
+for line in sys.stdin:
+    total += int(line)
+    sys.stdout.write(line)
+print(total)
+'''}, 'main.py', input_text=IO_INPUT, expected=IO_INPUT + IO_SUM),
+    Case('c_io', 'c', {'main.c': '''#include <stdio.h>
+int main(void) {
+    long value, total = 0;
+    while (scanf("%ld", &value) == 1) {
+        printf("%ld\\n", value);
+        total += value;
+    }
+    printf("%ld\\n", total);
+    return 0;
+}
+'''}, 'main.c', input_text=IO_INPUT, expected=IO_INPUT + IO_SUM),
+
+    # compile-heavy: the whole standard library plus template instantiation, trivial run
+    Case('cpp_compile', 'cpp', {'main.cpp': '''#include <bits/stdc++.h>
+using namespace std;
+template <int N> struct Fib { static constexpr long value = Fib<N - 1>::value + Fib<N - 2>::value; };
+template <> struct Fib<1> { static constexpr long value = 1; };
+template <> struct Fib<0> { static constexpr long value = 0; };
+int main() {
+    map<string, vector<tuple<int, double, string>>> table;
+    table["x"].emplace_back(1, 2.0, "three");
+    regex pattern("[a-z]+");
+    cout << Fib<60>::value << " " << regex_match("abc", pattern) << " " << table.size() << endl;
+    return 0;
+}
+'''}, 'main.cpp', expected='1548008755920 1 1'),
+
+    # runaway programs, killed by the compiler service
+    Case('py_timeout', 'python', {'main.py': 'while True:\n    pass\n'}, 'main.py', expect_timeout=True, timeout=2),
+    Case('c_timeout', 'c', {'main.c': 'int main(void) { for (;;); }\n'}, 'main.c', expect_timeout=True, timeout=2),
+    Case('java_timeout', 'java', {'Main.java': '''public class Main {
+    public static void main(String[] args) { while (true) {} }
+}
+'''}, 'Main.java', expect_timeout=True, timeout=2),
+]
@@ -0,0 +1,237 @@
+"""
+Load test for the compiler services' /run endpoints.
+
+    python -m Compilers.benchmarks.loadtest                         # call the apps in-process
+    python -m Compilers.benchmarks.loadtest --serve                 # start local uvicorn instances
+    python -m Compilers.benchmarks.loadtest --url python=http://localhost:8101 --url c=...
+
+Every concurrency level sends --requests submissions, round-robin over the selected corpus cases,
+and reports throughput, p50/p95/p99 latency and failure rate. Languages whose toolchain is not
+installed locally are skipped in-process and with --serve.
+"""
+import argparse
+import importlib.util
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from .corpus import CASES
+
+
+COMPILERS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVICES = {
+    # language -> (app folder, toolchain that must be installed locally)
+    'python': ('python_compiler', 'python3'),
+    'c': ('c_compiler', 'gcc'),
+    'cpp': ('c_compiler', 'g++'),
+    'java': ('java_compiler', 'javac'),
+}
+
+
+def payload(case, folder, input_file):
+    main = os.path.join(folder, case.main)
+    if case.language in ('c', 'cpp'):
+        return {'folder_path': folder, 'language': case.language, 'input_file_path': input_file, 'timeout': case.timeout}
+    return {'file_path': main, 'input_file_path': input_file, 'timeout': case.timeout}
+
+
+class InProcessTransport:
+    """Calls the FastAPI handlers directly, no HTTP in between."""
+
+    def __init__(self):
+        self._modules = {}
+        self._lock = threading.Lock()
+        if COMPILERS_DIR not in sys.path:
+            # the apps import accounting as a top-level module, like in their containers
+            sys.path.insert(0, COMPILERS_DIR)
+
+    def _module(self, language):
+        folder = SERVICES[language][0]
+        with self._lock:
+            if folder not in self._modules:
+                spec = importlib.util.spec_from_file_location(f'{folder}_api', os.path.join(COMPILERS_DIR, folder, 'api.py'))
+                module = importlib.util.module_from_spec(spec)
+                spec.loader.exec_module(module)
+                self._modules[folder] = module
+        return self._modules[folder]
+
+    def run(self, language, data):
+        module = self._module(language)
+        return module.run_code(module.CodeExecutionRequest(**data))
+
+
+class HttpTransport:
+    def __init__(self, urls):
+        self.urls = urls
+        self.session = requests.Session()
+
+    def run(self, language, data):
+        response = self.session.post(f"{self.urls[language].rstrip('/')}/run", json=data, timeout=data['timeout'] + 30)
+        response.raise_for_status()
+        return response.json()
+
+
+def serve(languages, first_port=8101):
+    """Start one local uvicorn per compiler app, returns ({language: url}, processes)."""
+    urls, processes, ports = {}, [], {}
+    env = dict(os.environ, PYTHONPATH=COMPILERS_DIR)
+    for language in languages:
+        folder = SERVICES[language][0]
+        if folder not in ports:
+            ports[folder] = first_port + len(ports)
+            processes.append(subprocess.Popen(
+                [sys.executable, '-m', 'uvicorn', 'api:app', '--port', str(ports[folder]),
+                 '--app-dir', os.path.join(COMPILERS_DIR, folder), '--log-level', 'warning'],
+                env=env,
+            ))
+        urls[language] = f'http://127.0.0.1:{ports[folder]}'
+
+    for url in set(urls.values()):
+        for attempt in range(50):
+            try:
+                requests.get(f'{url}/metrics', timeout=1)
+                break
+            except requests.exceptions.ConnectionError:
+                time.sleep(0.2)
+    return urls, processes
+
+
+def percentile(values, fraction):
+    # nearest-rank
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+def submit(transport, case, workdir):
+    folder = tempfile.mkdtemp(dir=workdir)
+    try:
+        for name, content in case.files.items():
+            with open(os.path.join(folder, name), 'w') as f:
+                f.write(content)
+        input_file = None
+        if case.input_text is not None:
+            input_file = os.path.join(folder, 'input.txt')
+            with open(input_file, 'w') as f:
+                f.write(case.input_text)
+
+        started = time.perf_counter()
+        error = None
+        try:
+            result = transport.run(case.language, payload(case, folder, input_file))
+            if not case.check(result):
+                error = f"unexpected output: {result.get('stderr') or result.get('stdout', '')[:200]}"
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+        return case.name, time.perf_counter() - started, error
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+
+def summarize(samples, elapsed):
+    latencies = [latency for name, latency, error in samples]
+    errors = [error for name, latency, error in samples if error]
+    return {
+        'requests': len(samples),
+        'throughput': round(len(samples) / elapsed, 3) if elapsed else None,
+        'p50': round(percentile(latencies, 0.50), 4),
+        'p95': round(percentile(latencies, 0.95), 4),
+        'p99': round(percentile(latencies, 0.99), 4),
+        'failure_rate': round(len(errors) / len(samples), 4),
+        'first_error': errors[0] if errors else None,
+    }
+
+
+def run_level(transport, cases, concurrency, total, workdir):
+    selected = [cases[index % len(cases)] for index in range(total)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        samples = list(executor.map(lambda case: submit(transport, case, workdir), selected))
+    elapsed = time.perf_counter() - started
+
+    report = {'concurrency': concurrency, **summarize(samples, elapsed), 'cases': {}}
+    for case in cases:
+        case_samples = [sample for sample in samples if sample[0] == case.name]
+        if case_samples:
+            report['cases'][case.name] = summarize(case_samples, elapsed)
+    return report
+
+
+def print_report(reports, by_case):
+    header = f"{'concurrency':>11} {'requests':>8} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'failed':>7}"
+    print(header)
+    for report in reports:
+        print(f"{report['concurrency']:>11} {report['requests']:>8} {report['throughput']:>8} {report['p50']:>8} "
+              f"{report['p95']:>8} {report['p99']:>8} {report['failure_rate']:>7.1%}")
+        if by_case:
+            for name, row in report['cases'].items():
+                print(f"{name:>20} {row['requests']:>8} {'':>8} {row['p50']:>8} {row['p95']:>8} {row['p99']:>8} "
+                      f"{row['failure_rate']:>7.1%}")
+                if row['first_error']:
+                    print(f"{'':>20} {row['first_error']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', default='1,2,4,8', help='comma separated concurrency ladder')
+    parser.add_argument('--requests', type=int, default=20, help='submissions per concurrency level')
+    parser.add_argument('--case', action='append', help='only run these corpus cases (repeatable)')
+    parser.add_argument('--no-timeouts', action='store_true', help='skip the timeout cases')
+    parser.add_argument('--url', action='append', default=[], help='language=base url of a running service (repeatable)')
+    parser.add_argument('--serve', action='store_true', help='start local uvicorn instances of the apps')
+    parser.add_argument('--workdir', help='where submissions are written, must be visible to the services')
+    parser.add_argument('--by-case', action='store_true', help='also print a row per corpus case')
+    parser.add_argument('--json', help='write the full report to this file')
+    args = parser.parse_args(argv)
+
+    urls = dict(each.split('=', 1) for each in args.url)
+    cases = [case for case in CASES if not args.case or case.name in args.case]
+    if args.no_timeouts:
+        cases = [case for case in cases if not case.expect_timeout]
+    if urls:
+        cases = [case for case in cases if case.language in urls]
+    else:
+        missing = {language for language, (folder, tool) in SERVICES.items() if not shutil.which(tool)}
+        for language in sorted(missing & {case.language for case in cases}):
+            print(f'skipping {language}: {SERVICES[language][1]} is not installed', file=sys.stderr)
+        cases = [case for case in cases if case.language not in missing]
+    if not cases:
+        parser.error('no corpus cases to run')
+
+    processes = []
+    if args.serve:
+        urls, processes = serve(sorted({case.language for case in cases}))
+    transport = HttpTransport(urls) if urls else InProcessTransport()
+
+    workdir = tempfile.mkdtemp(dir=args.workdir)
+    try:
+        reports = [
+            run_level(transport, cases, int(level), args.requests, workdir)
+            for level in args.concurrency.split(',')
+        ]
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+        for process in processes:
+            process.terminate()
+            process.wait()
+
+    print_report(reports, args.by_case)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(reports, f, indent=2)
+    return reports
+
+
+if __name__ == '__main__':
+    main()
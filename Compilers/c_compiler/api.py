@@ -1,15 +1,16 @@
 import os
-import subprocess
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-from typing import Literal
+from typing import Literal, Optional
+
+from accounting import Limits, metrics, run_process, usage_report
 
 app = FastAPI(title="C/C++ Compiler API")
 
 class CodeExecutionRequest(BaseModel):
     folder_path: str
     language: Literal["c", "cpp"]
-    input_file_path: str = None
+    input_file_path: Optional[str] = None
     timeout: int = 10
 
 @app.post("/run")
@@ -31,43 +32,40 @@ def run_code(request: CodeExecutionRequest):
     compile_cmd = ["sh", "-c", f"g++ {folder_path}/*{file_ext} -o {exec_file}"] if language == "cpp" \
                   else ["sh", "-c", f"gcc {folder_path}/*{file_ext} -o {exec_file}"]
 
-    try:
-        compilation = subprocess.run(
-            compile_cmd,
-            capture_output=True,
-            text=True,
-            timeout=request.timeout
-        )
-        if compilation.returncode != 0:
-            return {
-                "stdout": compilation.stdout,
-                "stderr": compilation.stderr
-            }
-    except subprocess.TimeoutExpired:
-        return {"stdout": "", "stderr": "Compilation timed out"}
+    compile_limits = Limits.from_env("COMPILE", cpu_seconds=request.timeout, memory_mb=1024, file_size_mb=64)
+    run_limits = Limits.from_env("RUN", cpu_seconds=request.timeout, memory_mb=256, file_size_mb=16)
+    usage = usage_report(compile_limits, run_limits)
+
+    compilation = run_process(compile_cmd, timeout=request.timeout, limits=compile_limits)
+    metrics.observe(language, "compile", compilation.usage)
+    usage["compile"] = compilation.usage
+    if compilation.timed_out:
+        return {"stdout": "", "stderr": "Compilation timed out", "usage": usage}
+    if compilation.returncode != 0:
+        return {
+            "stdout": compilation.stdout,
+            "stderr": compilation.stderr,
+            "usage": usage
+        }
 
     # Run the executable
     run_cmd = [exec_file]
-    try:
-        if request.input_file_path:
-            if not os.path.exists(request.input_file_path):
-                raise HTTPException(status_code=400, detail="Input file does not exist")
-            with open(request.input_file_path, "r") as f:
-                run_result = subprocess.run(
-                    run_cmd,
-                    capture_output=True,
-                    text=True,
-                    stdin=f,
-                    timeout=request.timeout
-                )
-        else:
-            run_result = subprocess.run(
-                run_cmd,
-                capture_output=True,
-                text=True,
-                timeout=request.timeout
-            )
-    except subprocess.TimeoutExpired:
-        return {"stdout": "", "stderr": "Execution timed out"}
+    if request.input_file_path:
+        if not os.path.exists(request.input_file_path):
+            raise HTTPException(status_code=400, detail="Input file does not exist")
+        with open(request.input_file_path, "r") as f:
+            run_result = run_process(run_cmd, stdin=f, timeout=request.timeout, limits=run_limits)
+    else:
+        run_result = run_process(run_cmd, timeout=request.timeout, limits=run_limits)
+
+    metrics.observe(language, "run", run_result.usage)
+    usage["run"] = run_result.usage
+    if run_result.timed_out:
+        return {"stdout": "", "stderr": "Execution timed out", "usage": usage}
+
+    return {"stdout": run_result.stdout, "stderr": run_result.stderr, "usage": usage}
+
 
-    return {"stdout": run_result.stdout, "stderr": run_result.stderr}
+@app.get("/metrics")
+def run_metrics():
+    return metrics.snapshot()
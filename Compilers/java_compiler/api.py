@@ -1,13 +1,17 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-import subprocess
+from typing import Optional
 import os
 
+from accounting import Limits, metrics, run_process, usage_report
+
 app = FastAPI(title="Java Compiler API")
 
+LANGUAGE = "java"
+
 class CodeExecutionRequest(BaseModel):
     file_path: str           # main Java file inside /code
-    input_file_path: str = None
+    input_file_path: Optional[str] = None
     timeout: int = 10
 
 @app.post("/run")
@@ -20,29 +24,42 @@ def run_code(request: CodeExecutionRequest):
     if not file_path.endswith(".java"):
         raise HTTPException(status_code=400, detail="Unsupported file type")
 
+    # the JVM reserves far more address space than it uses, so memory is capped with -Xmx instead of RLIMIT_AS
+    compile_limits = Limits.from_env("COMPILE", cpu_seconds=request.timeout, file_size_mb=64)
+    run_limits = Limits.from_env("RUN", cpu_seconds=request.timeout, file_size_mb=16, heap_mb=256)
+    usage = usage_report(compile_limits, run_limits)
+
     # Compile Java code
     compile_cmd = ["javac", file_path]
-    try:
-        compile_result = subprocess.run(compile_cmd, capture_output=True, text=True, timeout=request.timeout)
-        if compile_result.returncode != 0:
-            return {"stdout": compile_result.stdout, "stderr": compile_result.stderr}
-    except subprocess.TimeoutExpired:
-        return {"stdout": "", "stderr": "Compilation timed out"}
+    compile_result = run_process(compile_cmd, timeout=request.timeout, limits=compile_limits)
+    metrics.observe(LANGUAGE, "compile", compile_result.usage)
+    usage["compile"] = compile_result.usage
+    if compile_result.timed_out:
+        return {"stdout": "", "stderr": "Compilation timed out", "usage": usage}
+    if compile_result.returncode != 0:
+        return {"stdout": compile_result.stdout, "stderr": compile_result.stderr, "usage": usage}
 
     # Determine class name (strip path and .java)
     class_name = os.path.splitext(os.path.basename(file_path))[0]
 
     # Run Java program
-    run_cmd = ["java", "-cp", os.path.dirname(file_path), class_name]
-    try:
-        if request.input_file_path:
-            if not os.path.exists(request.input_file_path):
-                raise HTTPException(status_code=400, detail="Input file does not exist")
-            with open(request.input_file_path, "r") as f:
-                run_result = subprocess.run(run_cmd, capture_output=True, text=True, stdin=f, timeout=request.timeout)
-        else:
-            run_result = subprocess.run(run_cmd, capture_output=True, text=True, timeout=request.timeout)
-    except subprocess.TimeoutExpired:
-        return {"stdout": "", "stderr": "Execution timed out"}
-
-    return {"stdout": run_result.stdout, "stderr": run_result.stderr}
+    run_cmd = ["java", f"-Xmx{run_limits.heap_mb}m", "-cp", os.path.dirname(file_path), class_name]
+    if request.input_file_path:
+        if not os.path.exists(request.input_file_path):
+            raise HTTPException(status_code=400, detail="Input file does not exist")
+        with open(request.input_file_path, "r") as f:
+            run_result = run_process(run_cmd, stdin=f, timeout=request.timeout, limits=run_limits)
+    else:
+        run_result = run_process(run_cmd, timeout=request.timeout, limits=run_limits)
+
+    metrics.observe(LANGUAGE, "run", run_result.usage)
+    usage["run"] = run_result.usage
+    if run_result.timed_out:
+        return {"stdout": "", "stderr": "Execution timed out", "usage": usage}
+
+    return {"stdout": run_result.stdout, "stderr": run_result.stderr, "usage": usage}
+
+
+@app.get("/metrics")
+def run_metrics():
+    return metrics.snapshot()
@@ -1,13 +1,17 @@
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-import subprocess
+from typing import Optional
 import os
 
+from accounting import Limits, metrics, run_process, usage_report
+
 app = FastAPI(title="Python Compiler API")
 
+LANGUAGE = "python"
+
 class CodeExecutionRequest(BaseModel):
     file_path: str           # full path inside container: /code/<uuid>/main.py
-    input_file_path: str = None
+    input_file_path: Optional[str] = None
     timeout: int = 10
 
 @app.post("/run")
@@ -18,21 +22,30 @@ def run_code(request: CodeExecutionRequest):
         raise HTTPException(status_code=400, detail="File does not exist")
 
     cmd = ["python3", file_path]
+    limits = Limits.from_env("RUN", cpu_seconds=request.timeout, memory_mb=256, file_size_mb=16)
+
+    if request.input_file_path:
+        if not os.path.exists(request.input_file_path):
+            raise HTTPException(status_code=400, detail="Input file does not exist")
+        with open(request.input_file_path, "r") as f:
+            result = run_process(cmd, stdin=f, timeout=request.timeout, limits=limits)
+    else:
+        result = run_process(cmd, timeout=request.timeout, limits=limits)
 
-    try:
-        if request.input_file_path:
-            if not os.path.exists(request.input_file_path):
-                raise HTTPException(status_code=400, detail="Input file does not exist")
-            with open(request.input_file_path, "r") as f:
-                result = subprocess.run(cmd, capture_output=True, text=True,
-                                        stdin=f, timeout=request.timeout)
-        else:
-            result = subprocess.run(cmd, capture_output=True, text=True,
-                                    timeout=request.timeout)
-    except subprocess.TimeoutExpired:
-        return {"stdout": "", "stderr": "Execution timed out"}
+    metrics.observe(LANGUAGE, "run", result.usage)
+    usage = usage_report(run_limits=limits)
+    usage["run"] = result.usage
+
+    if result.timed_out:
+        return {"stdout": "", "stderr": "Execution timed out", "usage": usage}
 
     return {
         "stdout": result.stdout,
-        "stderr": result.stderr
+        "stderr": result.stderr,
+        "usage": usage
     }
+
+
+@app.get("/metrics")
+def run_metrics():
+    return metrics.snapshot()
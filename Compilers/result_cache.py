@@ -0,0 +1,128 @@
+import hashlib
+import re
+import time
+import zipfile
+
+from django.conf import settings
+from django.core.cache import cache
+from redis.exceptions import RedisError
+
+from Models.caching import redis_client
+
+
+DEFAULTS = {
+    'ENABLED': False,
+    'TIMEOUT': 60 * 60,
+    'MAX_ENTRIES': 1000,
+    'MAX_SOURCE_BYTES': 1024 * 1024,
+    # sources matching any of these are never cached: their output depends on the clock or on randomness
+    'EXCLUDE_PATTERNS': [
+        r'lms:\s*no-cache',
+        r'\bimport\s+(random|time|datetime|secrets|uuid)\b',
+        r'\bfrom\s+(random|time|datetime|secrets|uuid)\b',
+        r'\bos\.urandom\b',
+        r'\b(s?rand|time|clock|gettimeofday|clock_gettime)\s*\(',
+        r'<(random|chrono|ctime)>',
+        r'\b(Math\.random|System\.currentTimeMillis|System\.nanoTime|ThreadLocalRandom|SecureRandom)\b',
+        r'\bnew\s+Random\s*\(',
+        r'\b(LocalDate|LocalDateTime|Instant)\.now\b',
+    ],
+}
+
+KEY_PREFIX = 'compiler:result'
+LRU_INDEX = 'compiler:results:lru'
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'COMPILER_RESULT_CACHE', {}))
+    return config
+
+
+def is_enabled():
+    return get_config()['ENABLED']
+
+
+def read_sources(uploaded_files):
+    """
+    Return [(name, bytes)] for the uploaded files, expanding zip archives into their members.
+    Returns None when the sources are too large to be worth caching, or an archive cannot be read
+    (the upload is then rejected as usual).
+    """
+    limit = get_config()['MAX_SOURCE_BYTES']
+    sources = []
+    total = 0
+    for file_obj in uploaded_files:
+        file_obj.seek(0)
+        if file_obj.name.endswith('.zip'):
+            try:
+                with zipfile.ZipFile(file_obj) as archive:
+                    for member in archive.infolist():
+                        if member.is_dir():
+                            continue
+                        total += member.file_size
+                        if total > limit:
+                            file_obj.seek(0)
+                            return None
+                        sources.append((member.filename, archive.read(member)))
+            except zipfile.BadZipFile:
+                file_obj.seek(0)
+                return None
+        else:
+            total += file_obj.size
+            if total > limit:
+                file_obj.seek(0)
+                return None
+            sources.append((file_obj.name, file_obj.read()))
+        file_obj.seek(0)
+    return sources
+
+
+def is_deterministic(sources):
+    patterns = [re.compile(each) for each in get_config()['EXCLUDE_PATTERNS']]
+    for name, content in sources:
+        text = content.decode(errors='ignore')
+        if any(pattern.search(text) for pattern in patterns):
+            return False
+    return True
+
+
+def make_key(language, sources, input_lines):
+    digest = hashlib.sha256()
+    digest.update(f'{language}\0'.encode())
+    for name, content in sorted(sources):
+        digest.update(f'{name}\0{len(content)}\0'.encode())
+        digest.update(content)
+    digest.update('\n'.join(input_lines or []).encode())
+    return f'{KEY_PREFIX}:{digest.hexdigest()}'
+
+
+def get_result(key):
+    data = cache.get(key)
+    if data is not None:
+        _touch(key)
+    return data
+
+
+def store_result(key, data):
+    config = get_config()
+    cache.set(key, data, timeout=config['TIMEOUT'])
+    _touch(key, max_entries=config['MAX_ENTRIES'])
+
+
+def _touch(key, max_entries=None):
+    # LRU bookkeeping: a sorted set of entry keys scored by last use, trimmed to MAX_ENTRIES on insert
+    client = redis_client()
+    if client is None:
+        return
+    index = cache.make_key(LRU_INDEX)
+    try:
+        client.zadd(index, {key: time.time()})
+        if max_entries is None:
+            return
+        overflow = client.zcard(index) - max_entries
+        if overflow > 0:
+            evicted = client.zpopmin(index, overflow)
+            cache.delete_many([member.decode() for member, score in evicted])
+    except RedisError:
+        pass
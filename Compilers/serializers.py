@@ -1,9 +1,15 @@
-import shutil, os, subprocess, zipfile
+import os, zipfile
 import requests
 from rest_framework import serializers
 from rest_framework.response import Response
 from django.core.files.uploadedfile import InMemoryUploadedFile
-import uuid
+
+from . import result_cache
+from .throttling import admission
+from .workspace import Workspace, WorkspaceError
+
+
+TIMEOUT_MESSAGES = ['Execution timed out', 'Compilation timed out']
 
 
 class CompilerSerializer(serializers.Serializer):
@@ -47,104 +53,91 @@ class CompilerSerializer(serializers.Serializer):
         return super().to_internal_value(normalized)
 
     def create(self, validated_data):
-        request_folder = f"/code/{uuid.uuid4().hex}"
-        os.makedirs(request_folder, exist_ok=True)
-
         uploaded_file = validated_data.pop('file')
-        input_file = None
-        # parsing input file
-        print(validated_data['input_list'])
-        if 'input_list' in validated_data and validated_data['input_list'] is not None:
+        parsed_inputs = None
+        if validated_data.get('input_list') is not None:
             file_inputs = validated_data.pop('input_list')
 
             parsed_inputs = file_inputs.split('\n')
             parsed_inputs = [lines.strip() for lines in parsed_inputs]
 
-            with open(os.path.join(request_folder, 'input.txt'), 'w') as inputFile:
-                for each in parsed_inputs:
-                    inputFile.write(each + '\n')
-
-            # input file path
-            input_file = inputFile.name
-
-        try:
-            # 1. Handle single file (.py or .zip)
-            if len(uploaded_file) == 1:
-                file_obj = uploaded_file[0]
-                extension = file_obj.name.split('.')[-1]
-
-                if extension == 'py' or extension == 'c' or extension == 'cpp':
-                    if extension == 'cpp' or extension == 'c':
-                        return self._handle_single_file(request_folder,file_obj, input_file, extension)
-                    if extension == 'py':
-                        return self._handle_single_file(request_folder,file_obj, input_file, extension)
-
-                elif extension == 'zip':
-                    return self._handle_zip(file_obj, input_file, request_folder)
+        cache_key = self._result_cache_key(uploaded_file, parsed_inputs)
+        if cache_key:
+            cached = result_cache.get_result(cache_key)
+            if cached is not None:
+                return Response({**cached, 'cached': True})
+
+        user = self.context['request'].user
+        # a slot only for a run that happens, cached results are served without one
+        with admission.slot(user.pk):
+            try:
+                with Workspace(user.pk) as workspace:
+                    input_file = None
+                    # parsing input file
+                    if parsed_inputs is not None:
+                        input_file = workspace.write_text('input.txt', ''.join(each + '\n' for each in parsed_inputs))
+
+                    response = self._execute(uploaded_file, input_file, workspace)
+            except WorkspaceError as e:
+                return Response({'error': str(e)}, status=e.status_code)
+
+        # only genuine compiler responses are stored, never errors or timeouts
+        if cache_key and 'usage' in response.data and response.data.get('stderr') not in TIMEOUT_MESSAGES:
+            result_cache.store_result(cache_key, response.data)
+        return response
+
+    def _result_cache_key(self, uploaded_files, parsed_inputs):
+        if not result_cache.is_enabled() or not uploaded_files:
+            return None
+        sources = result_cache.read_sources(uploaded_files)
+        if not sources or not result_cache.is_deterministic(sources):
+            return None
+
+        names = [os.path.basename(name) for name, content in sources]
+        if len(names) == 1:
+            language = names[0].split('.')[-1]
+        else:
+            language = next((name.split('.')[-1] for name in names if name.split('.')[0] == 'main'), None)
+        if language not in ['py', 'c', 'cpp']:
+            return None
+        return result_cache.make_key(language, sources, parsed_inputs)
 
-                else:
-                    return Response({'error': 'Invalid file extension. Supported extensions: .c_compiler, .cpp, .py, .zip'})
+    def _execute(self, uploaded_file, input_file, workspace):
+        # 1. Handle single file (.py or .zip)
+        if len(uploaded_file) == 1:
+            file_obj = uploaded_file[0]
+            extension = file_obj.name.split('.')[-1]
 
-            # 2. Handle multiple files
-            elif len(uploaded_file) > 1:
+            if extension in ['py', 'c', 'cpp']:
+                return self._handle_single_file(workspace, file_obj, input_file, extension)
 
-                return self._handle_multiple_files(uploaded_file, input_file, request_folder)
+            elif extension == 'zip':
+                return self._handle_zip(workspace, file_obj, input_file)
 
             else:
-                return Response({'error': 'No file provided'})
-
-        except subprocess.CalledProcessError as e:
-            return Response({"stdout": "", "stderr": str(e)})
-
-
-    def _handle_single_file(self,request_folder, file_obj, input_file,extension):
-        file_path = os.path.join(request_folder, file_obj.name)
-        with open(file_path, 'wb') as f:
-            for chunk in file_obj.chunks():
-                f.write(chunk)
-
-        response = None
-        try:
-
-            if extension == 'py':
-                url = 'http://python-compiler:8000/run'
-                data = {
-                    'file_path': file_path,
-                    'input_file_path': input_file,
-                    'timeout': 15
-                }
-                response = requests.post(url, data=data)
-
-            elif extension == 'cpp' or extension == 'c':
-                url = 'http://c-compiler:8000/run'
-                data = {
-                    'folder_path': request_folder,
-                    'language': 'c' if extension == 'c' else 'cpp',
-                    'input_file_path': input_file,
-                    'timeout': 15
-                }
-                response = requests.post(url, json=data)
+                return Response({'error': 'Invalid file extension. Supported extensions: .c, .cpp, .py, .zip'})
 
-        except requests.exceptions.RequestException as e:
-            return Response({"stdout": "", "stderr": str(e)})
+        # 2. Handle multiple files
+        elif len(uploaded_file) > 1:
+            return self._handle_multiple_files(workspace, uploaded_file, input_file)
 
-        finally:
-            shutil.rmtree(request_folder, ignore_errors=True)
-
-        return Response(response.json())
+        else:
+            return Response({'error': 'No file provided'})
 
+    def _handle_single_file(self, workspace, file_obj, input_file, extension):
+        file_path = workspace.write_upload(file_obj)
+        return self._run(extension, workspace.path, file_path, input_file)
 
-    def _handle_zip(self, file_obj, input_file, request_folder):
+    def _handle_zip(self, workspace, file_obj, input_file):
         file_extension = None
 
-        file_path = os.path.join(request_folder, file_obj.name)
-        with open(file_path, 'wb') as f:
-            for chunk in file_obj.chunks():
-                f.write(chunk)
+        try:
+            zipObj = zipfile.ZipFile(file_obj)
+        except zipfile.BadZipFile:
+            return Response({'error': 'Invalid zip file'})
 
-            # unzipping the zip file
-        with zipfile.ZipFile(file_path, 'r') as zipObj:
-            # checking for main.py / main.cpp / main.c_compiler
+        with zipObj:
+            # checking for main.py / main.cpp / main.c
             for each in zipObj.namelist():
                 filename = os.path.basename(each)
                 name = filename.split('.')[0]
@@ -154,54 +147,17 @@ class CompilerSerializer(serializers.Serializer):
                         return Response({'error': 'Languages not supported'})
                     break
 
-            if file_extension is None:
-                return Response({'error': 'Please provide a main file with proper extension'})
-
-            zipObj.extractall(path=request_folder)
-            extracted_folder = request_folder
-            items = os.listdir(request_folder)
-            # if there’s only one directory inside tmpdir (besides the .zip file), go into it
-            dirs_only = [d for d in items if os.path.isdir(os.path.join(request_folder, d))]
-            if len(dirs_only) == 1:
-                extracted_folder = os.path.join(request_folder, dirs_only[0])
-
-        try:
-
-            if file_extension == 'py':
-                url = 'http://python-compiler:8000/run'
-                data = {
-                    'file_path': f'{extracted_folder}/main.py',
-                    'input_file_path': input_file,
-                    'timeout': 15
-                }
-                response = requests.post(url, data=data)
-
-            elif file_extension == 'cpp' or file_extension == 'c':
-                url = 'http://c-compiler:8000/run'
-                print(extracted_folder)
-                data = {
-                    'folder_path': extracted_folder,
-                    'language' : 'c' if file_extension == 'c' else 'cpp',
-                    'input_file_path': input_file,
-                    'timeout': 15
-                }
-                response = requests.post(url, json=data)
-
-        except requests.exceptions.RequestException as e:
-            return Response({"stdout": "", "stderr": str(e)})
-
-        finally:
-            shutil.rmtree(extracted_folder, ignore_errors=True)
-
+        if file_extension is None:
+            return Response({'error': 'Please provide a main file with proper extension'})
 
-        return Response(response.json())
+        extracted_folder = workspace.extract_zip(file_obj)
+        return self._run(file_extension, extracted_folder, f'{extracted_folder}/main.{file_extension}', input_file)
 
-    def _handle_multiple_files(self, uploaded_files, input_file, request_folder):
+    def _handle_multiple_files(self, workspace, uploaded_files, input_file):
         file_extension = None
 
         for each in uploaded_files:
-            file_path = os.path.join(each.name)
-            file_name = os.path.basename(file_path)
+            file_name = os.path.basename(each.name)
             name = file_name.split('.')[0]
             if name == 'main':
                 file_extension = file_name.split('.')[-1]
@@ -212,34 +168,33 @@ class CompilerSerializer(serializers.Serializer):
         if file_extension is None:
             return Response({'error': 'Please provide a main file with proper extension'})
 
-
         for each in uploaded_files:
-            file_path = os.path.join(request_folder, each.name)
-            with open(file_path, 'wb') as f:
-                for chunk in each.chunks():
-                    f.write(chunk)
+            workspace.write_upload(each)
+
+        return self._run(file_extension, workspace.path, f'{workspace.path}/main.{file_extension}', input_file)
 
+    def _run(self, extension, folder, main_file, input_file):
         try:
-            if file_extension == 'py':
+            if extension == 'py':
                 url = 'http://python-compiler:8000/run'
                 data = {
-                    'file_path': f'{request_folder}/main.py',
+                    'file_path': main_file,
                     'input_file_path': input_file,
                     'timeout': 15
                 }
                 response = requests.post(url, data=data)
 
-            elif file_extension == 'cpp' or file_extension == 'c':
+            else:
                 url = 'http://c-compiler:8000/run'
                 data = {
-                    'folder_path': request_folder,
-                    'language': 'c' if file_extension == 'c' else 'cpp',
+                    'folder_path': folder,
+                    'language': 'c' if extension == 'c' else 'cpp',
                     'input_file_path': input_file,
                     'timeout': 15
                 }
                 response = requests.post(url, json=data)
 
-        finally:
-            shutil.rmtree(request_folder, ignore_errors=True)
+        except requests.exceptions.RequestException as e:
+            return Response({"stdout": "", "stderr": str(e)})
 
-        return Response(response.json())
\ No newline at end of file
+        return Response(response.json())
@@ -0,0 +1,8 @@
+from celery import shared_task
+
+from .workspace import collect_garbage
+
+
+@shared_task
+def cleanup_workspaces_task():
+    return collect_garbage()
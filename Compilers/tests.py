@@ -1,3 +1,202 @@
-from django.test import TestCase
+import io
+import os
+import sys
+import zipfile
+from contextlib import contextmanager
 
-# Create your tests here.
+import pytest
+import redis
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from rest_framework.exceptions import Throttled
+from rest_framework.test import APIClient
+
+from Compilers import result_cache, throttling
+from Compilers.workspace import Workspace, WorkspaceError, collect_garbage
+from Compilers.accounting import Histogram, Limits, run_process, usage_report
+
+
+def test_run_process_reports_usage():
+    result = run_process([sys.executable, '-c', 'print(input()[::-1])'], stdin=open('/dev/null'), timeout=5)
+    assert result.returncode == 1  # EOFError on empty stdin
+    assert 'EOFError' in result.stderr
+    for field in ['user_cpu_seconds', 'system_cpu_seconds', 'max_rss_kb', 'wall_seconds']:
+        assert result.usage[field] >= 0
+    assert result.usage['timed_out'] is False
+
+
+def test_run_process_timeout_kills_command():
+    result = run_process([sys.executable, '-c', 'while True: pass'], timeout=1)
+    assert result.timed_out
+    assert result.usage['wall_seconds'] < 5
+
+
+def test_run_process_applies_memory_limit():
+    limits = Limits(memory_mb=64)
+    result = run_process([sys.executable, '-c', 'x = bytearray(256 * 1024 * 1024)'], timeout=5, limits=limits)
+    assert result.returncode != 0
+    assert 'MemoryError' in result.stderr
+
+
+def test_usage_report_has_one_schema_for_every_service():
+    interpreted = usage_report(run_limits=Limits(memory_mb=256))
+    compiled = usage_report(Limits(memory_mb=1024), Limits(memory_mb=256))
+    jvm = usage_report(Limits(file_size_mb=64), Limits(heap_mb=256))
+    assert interpreted['limits']['compile'] is None
+    assert jvm['limits']['run']['heap_mb'] == 256 and jvm['limits']['run']['memory_mb'] is None
+    for report in (interpreted, compiled, jvm):
+        assert set(report) == {'compile', 'run', 'limits'} and set(report['limits']) == {'compile', 'run'}
+        assert set(report['limits']['run']) == set(compiled['limits']['run'])
+    # heap_mb is reported, not applied as an rlimit
+    assert run_process([sys.executable, '-c', 'print(1)'], timeout=5, limits=Limits(heap_mb=1)).stdout == '1\n'
+
+
+def test_histogram_is_cumulative():
+    histogram = Histogram([1, 5])
+    for value in [0.5, 2, 10]:
+        histogram.observe(value)
+    data = histogram.as_dict()
+    assert data['buckets'] == {'1': 1, '5': 2, '+Inf': 3}
+    assert data['count'] == 3
+
+
+def test_result_cache_key_depends_on_sources_and_input():
+    sources = result_cache.read_sources([SimpleUploadedFile('main.py', b'print(input())')])
+    key = result_cache.make_key('py', sources, ['1'])
+    assert key == result_cache.make_key('py', sources, ['1'])
+    assert key != result_cache.make_key('py', sources, ['2'])
+    assert key != result_cache.make_key('py', [('main.py', b'print(input() * 2)')], ['1'])
+
+
+def test_result_cache_excludes_time_and_randomness():
+    assert result_cache.is_deterministic([('main.py', b'print(sum(range(10)))')])
+    assert not result_cache.is_deterministic([('main.py', b'import random\nprint(random.random())')])
+    assert not result_cache.is_deterministic([('main.c', b'int main() { srand(time(NULL)); }')])
+    assert not result_cache.is_deterministic([('main.py', b'# lms: no-cache\nprint(1)')])
+
+
+def _zip(members):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as archive:
+        for name, content in members.items():
+            archive.writestr(name, content)
+    return SimpleUploadedFile('code.zip', buffer.getvalue())
+
+
+@pytest.fixture
+def workspace_root(settings, tmp_path):
+    settings.COMPILER_WORKSPACE = {'ROOT': str(tmp_path), 'MAX_TOTAL_BYTES': 1024, 'MAX_FILES': 3}
+    return tmp_path
+
+
+def test_workspace_is_removed_on_error(workspace_root):
+    with pytest.raises(ValueError):
+        with Workspace(1) as workspace:
+            workspace.write_upload(SimpleUploadedFile('main.py', b'print(1)'))
+            raise ValueError
+    assert not os.path.exists(workspace.path)
+
+
+def test_workspace_extracts_zip_into_single_folder(workspace_root):
+    with Workspace(1) as workspace:
+        folder = workspace.extract_zip(_zip({'project/main.py': 'print(1)', 'project/util.py': ''}))
+        assert sorted(os.listdir(folder)) == ['main.py', 'util.py']
+
+
+@pytest.mark.parametrize('members', [
+    {'../escape.py': 'print(1)'},
+    {'main.py': 'x' * 2048},
+    {f'{index}.py': '' for index in range(5)},
+])
+def test_workspace_rejects_unsafe_zip(workspace_root, members):
+    with Workspace(1) as workspace:
+        with pytest.raises(WorkspaceError):
+            workspace.extract_zip(_zip(members))
+    assert not (workspace_root.parent / 'escape.py').exists()
+
+
+def test_collect_garbage_removes_stale_workspaces(workspace_root):
+    (workspace_root / '1' / 'leaked').mkdir(parents=True)
+    assert collect_garbage(max_age=-1) == 1
+    assert not (workspace_root / '1').exists()
+
+
+def test_loadtest_percentile_is_nearest_rank():
+    from Compilers.benchmarks.loadtest import percentile
+    values = list(range(1, 101))
+    assert percentile(values, 0.50) == 50
+    assert percentile(values, 0.99) == 99
+    assert percentile([3.0], 0.95) == 3.0
+
+
+@pytest.fixture
+def admission_redis(settings, monkeypatch):
+    # the Lua scripts need a real Redis server, a scratch database of it
+    client = redis.Redis.from_url(os.getenv('TEST_REDIS_URL', 'redis://localhost:6379/15'))
+    try:
+        client.ping()
+    except redis.RedisError:
+        pytest.skip('no Redis server for the admission tests')
+    client.flushdb()
+    monkeypatch.setattr(throttling, 'redis_client', lambda: client)
+    yield client
+    client.flushdb()
+
+
+@pytest.mark.django_db
+def test_token_bucket_rejects_with_retry_after_once_exhausted(settings, admission_redis):
+    settings.COMPILER_ADMISSION = {'BURST': 2, 'REFILL_PER_SECOND': 0.1}
+    client = APIClient()
+    client.force_authenticate(User.objects.get(username='bscs23f02@gmail.com'))
+    # an empty file: a 400 from the view, after the bucket gave a token
+    assert [client.post('/api/student/compilers/', {'file': ''}).status_code for _ in range(2)] == [400, 400]
+    response = client.post('/api/student/compilers/', {'file': ''})
+    assert response.status_code == 429
+    assert 1 <= int(response['Retry-After']) <= 10
+
+
+def test_admission_rejects_at_once_and_reclaims_a_dead_workers_lease(settings, admission_redis):
+    settings.COMPILER_ADMISSION = {'CAPACITY': 1, 'LEASE_SECONDS': 60, 'AVERAGE_RUN_SECONDS': 3}
+    # a worker that died holding its slot never releases it
+    lease = throttling.admission.acquire(1)
+    assert lease
+    with pytest.raises(Throttled) as rejected:
+        throttling.admission.acquire(2)
+    assert rejected.value.wait == 3
+
+    # its lease runs out
+    admission_redis.zadd(throttling.cache.make_key(throttling.ACTIVE_KEY), {lease: 0})
+    assert throttling.admission.acquire(2)
+    assert throttling.admission.snapshot()['stats'] == {'admitted': 2, 'rejected': 1}
+
+
+@pytest.mark.django_db
+def test_cached_results_are_served_without_an_admission_slot(locmem_caches, settings, monkeypatch):
+    settings.COMPILER_RESULT_CACHE = {'ENABLED': True}
+    source = SimpleUploadedFile('main.py', b'print(1)')
+    key = result_cache.make_key('py', result_cache.read_sources([source]), None)
+    result_cache.store_result(key, {'stdout': '1\n', 'stderr': '', 'usage': {}})
+
+    @contextmanager
+    def full(user_id):
+        raise Throttled(wait=3)
+        yield
+    monkeypatch.setattr(throttling.admission, 'slot', full)
+    client = APIClient()
+    client.force_authenticate(User.objects.get(username='bscs23f02@gmail.com'))
+    response = client.post('/api/student/compilers/', {'file': SimpleUploadedFile('main.py', b'print(1)')},
+                           format='multipart')
+    assert response.status_code == 200
+    assert response.data['cached'] is True and response.data['stdout'] == '1\n'
+
+
+@pytest.mark.django_db
+def test_corrupt_zip_is_rejected_not_cached(locmem_caches, settings):
+    settings.COMPILER_RESULT_CACHE = {'ENABLED': True}
+    assert result_cache.read_sources([SimpleUploadedFile('code.zip', b'not a zip')]) is None
+
+    client = APIClient()
+    client.force_authenticate(User.objects.get(username='bscs23f02@gmail.com'))
+    response = client.post('/api/student/compilers/', {'file': SimpleUploadedFile('code.zip', b'not a zip')},
+                           format='multipart')
+    assert response.data == {'error': 'Invalid zip file'}
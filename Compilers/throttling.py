@@ -0,0 +1,198 @@
+import math
+import time
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from redis.exceptions import RedisError
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle
+
+from Models.caching import redis_client
+
+
+DEFAULTS = {
+    # token bucket, per user
+    'BURST': 5,
+    'REFILL_PER_SECOND': 0.2,
+    # admission control, shared by every gateway process
+    'CAPACITY': 8,
+    'LEASE_SECONDS': 60,
+    'AVERAGE_RUN_SECONDS': 3,
+}
+
+BUCKET_PREFIX = 'compiler:bucket'
+ACTIVE_KEY = 'compiler:admission:active'
+STATS_KEY = 'compiler:admission:stats'
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'COMPILER_ADMISSION', {}))
+    return config
+
+
+# KEYS[1] bucket hash; ARGV burst, refill per second, now
+TOKEN_BUCKET = """
+local burst = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 1)
+return {allowed, tostring(wait)}
+"""
+
+# KEYS[1] sorted set of '<user>:<token>' leases scored by expiry; ARGV now, lease expiry, capacity, user, token
+# Fair share: a user may hold at most capacity // (users holding or asking for a slot) of them.
+# Returns {admitted, leases held}.
+ACQUIRE_SLOT = """
+local now = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+local members = redis.call('ZRANGE', KEYS[1], 0, -1)
+local users = {}
+local distinct = 0
+local mine = 0
+for _, member in ipairs(members) do
+    local user = string.match(member, '^([^:]+):')
+    if not users[user] then
+        users[user] = true
+        distinct = distinct + 1
+    end
+    if user == ARGV[4] then
+        mine = mine + 1
+    end
+end
+if not users[ARGV[4]] then
+    distinct = distinct + 1
+end
+local share = math.max(1, math.floor(capacity / distinct))
+if #members >= capacity or mine >= share then
+    return {0, #members}
+end
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[4] .. ':' .. ARGV[5])
+return {1, #members + 1}
+"""
+
+
+class CompilerRateThrottle(BaseThrottle):
+    """Per-user token bucket on submissions. Lets everything through when Redis is unavailable."""
+
+    def __init__(self):
+        self._wait = None
+
+    def allow_request(self, request, view):
+        if request.method != 'POST' or not request.user.is_authenticated:
+            return True
+        client = redis_client()
+        if client is None:
+            return True
+
+        config = get_config()
+        try:
+            allowed, wait = client.eval(
+                TOKEN_BUCKET, 1, cache.make_key(f'{BUCKET_PREFIX}:{request.user.pk}'),
+                config['BURST'], config['REFILL_PER_SECOND'], time.time(),
+            )
+            if not allowed:
+                client.hincrby(cache.make_key(STATS_KEY), 'throttled', 1)
+        except RedisError:
+            return True
+
+        self._wait = float(wait)
+        return bool(allowed)
+
+    def wait(self):
+        return self._wait
+
+
+class AdmissionController:
+    """
+    Global cap on concurrent compiler runs, shared through Redis.
+
+    A request without a free slot (or over its fair share) is turned away at once with 429 and an
+    estimated Retry-After, it never holds a gateway worker while waiting. Slots are leases, so a
+    crashed worker cannot hold one for longer than LEASE_SECONDS.
+    """
+
+    @property
+    def config(self):
+        return get_config()
+
+    def retry_after(self, active):
+        # the time for the runs holding the slots to finish, at least a second
+        return max(1, math.ceil(active / max(1, self.config['CAPACITY']) * self.config['AVERAGE_RUN_SECONDS']))
+
+    def acquire(self, user_id):
+        """Returns the lease to release, or None when Redis is unavailable and the request is let through."""
+        client = redis_client()
+        if client is None:
+            return None
+
+        token = uuid.uuid4().hex
+        stats_key = cache.make_key(STATS_KEY)
+        config = self.config
+        try:
+            now = time.time()
+            admitted, active = client.eval(
+                ACQUIRE_SLOT, 1, cache.make_key(ACTIVE_KEY),
+                now, now + config['LEASE_SECONDS'], config['CAPACITY'], user_id, token,
+            )
+            client.hincrby(stats_key, 'admitted' if admitted else 'rejected', 1)
+        except RedisError:
+            return None
+        if not admitted:
+            raise Throttled(wait=self.retry_after(active))
+        return f'{user_id}:{token}'
+
+    def release(self, lease):
+        client = redis_client()
+        try:
+            client.zrem(cache.make_key(ACTIVE_KEY), lease)
+        except RedisError:
+            pass
+
+    @contextmanager
+    def slot(self, user_id):
+        lease = self.acquire(user_id)
+        try:
+            yield
+        finally:
+            if lease:
+                self.release(lease)
+
+    def snapshot(self, user_id=None):
+        data = {'capacity': self.config['CAPACITY'], 'active': 0, 'users': 0, 'stats': {}}
+        client = redis_client()
+        if client is None:
+            return data
+
+        try:
+            members = client.zrangebyscore(cache.make_key(ACTIVE_KEY), time.time(), '+inf')
+            stats = client.hgetall(cache.make_key(STATS_KEY))
+        except RedisError:
+            return data
+
+        holders = [member.decode().split(':')[0] for member in members]
+        data['active'] = len(holders)
+        data['users'] = len(set(holders))
+        data['stats'] = {name.decode(): int(value) for name, value in stats.items()}
+        if user_id is not None:
+            data['yours'] = holders.count(str(user_id))
+        return data
+
+
+admission = AdmissionController()
@@ -0,0 +1,163 @@
+import os
+import shutil
+import stat
+import time
+import uuid
+import zipfile
+
+from django.conf import settings
+
+
+DEFAULTS = {
+    # mounted as tmpfs in docker-compose, shared with the compiler containers
+    'ROOT': '/code',
+    'MAX_TOTAL_BYTES': 10 * 1024 * 1024,
+    'MAX_FILE_BYTES': 5 * 1024 * 1024,
+    'MAX_FILES': 200,
+    'USER_QUOTA_BYTES': 25 * 1024 * 1024,
+    'USER_MAX_WORKSPACES': 3,
+    'STALE_AFTER': 10 * 60,
+}
+
+CHUNK_SIZE = 64 * 1024
+
+
+def get_config():
+    config = dict(DEFAULTS)
+    config.update(getattr(settings, 'COMPILER_WORKSPACE', {}))
+    return config
+
+
+class WorkspaceError(Exception):
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def _directory_size(path):
+    total = 0
+    for folder, dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(folder, name)).st_size
+            except FileNotFoundError:
+                pass
+    return total
+
+
+class Workspace:
+    """
+    Per-request directory under ROOT/<user>/ that is always removed on exit.
+
+    Every byte written goes through the same budget, which is the smaller of MAX_TOTAL_BYTES and
+    whatever is left of the user's quota after their other live workspaces.
+    """
+
+    def __init__(self, user_id):
+        self.config = get_config()
+        self.user_folder = os.path.join(self.config['ROOT'], str(user_id))
+        self.path = os.path.join(self.user_folder, uuid.uuid4().hex)
+        self.budget = self.config['MAX_TOTAL_BYTES']
+        self.used = 0
+        self.files = 0
+
+    def __enter__(self):
+        os.makedirs(self.user_folder, exist_ok=True)
+        others = [os.path.join(self.user_folder, each) for each in os.listdir(self.user_folder)]
+        if len(others) >= self.config['USER_MAX_WORKSPACES']:
+            raise WorkspaceError('Too many submissions running, please wait for them to finish', status_code=429)
+
+        remaining = self.config['USER_QUOTA_BYTES'] - sum(_directory_size(each) for each in others)
+        self.budget = min(self.budget, remaining)
+        if self.budget <= 0:
+            raise WorkspaceError('Workspace quota exceeded, please wait for running submissions to finish', status_code=429)
+
+        os.makedirs(self.path)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        shutil.rmtree(self.path, ignore_errors=True)
+        return False
+
+    def _target(self, name):
+        # rejects absolute paths and '..' segments, zip members included
+        target = os.path.realpath(os.path.join(self.path, name))
+        if os.path.commonpath([target, os.path.realpath(self.path)]) != os.path.realpath(self.path):
+            raise WorkspaceError(f'Invalid file name: {name}')
+        return target
+
+    def _copy(self, chunks, target):
+        if self.files >= self.config['MAX_FILES']:
+            raise WorkspaceError(f"Too many files, at most {self.config['MAX_FILES']} are allowed", status_code=413)
+        self.files += 1
+
+        written = 0
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target, 'wb') as f:
+            for chunk in chunks:
+                written += len(chunk)
+                self.used += len(chunk)
+                if written > self.config['MAX_FILE_BYTES'] or self.used > self.budget:
+                    raise WorkspaceError('Submission is too large', status_code=413)
+                f.write(chunk)
+        return target
+
+    def write_upload(self, file_obj):
+        return self._copy(file_obj.chunks(CHUNK_SIZE), self._target(os.path.basename(file_obj.name)))
+
+    def write_text(self, name, text):
+        return self._copy([text.encode()], self._target(name))
+
+    def extract_zip(self, file_obj):
+        """Stream the archive's members into the workspace and return the folder holding the sources."""
+        file_obj.seek(0)
+        try:
+            archive = zipfile.ZipFile(file_obj)
+        except zipfile.BadZipFile:
+            raise WorkspaceError('Invalid zip file')
+
+        with archive:
+            for member in archive.infolist():
+                if member.is_dir():
+                    continue
+                if stat.S_ISLNK(member.external_attr >> 16):
+                    raise WorkspaceError(f'Symbolic links are not allowed: {member.filename}')
+                target = self._target(member.filename)
+                # the sizes in the archive headers are not trusted, bytes are counted while copying
+                with archive.open(member) as source:
+                    self._copy(iter(lambda: source.read(CHUNK_SIZE), b''), target)
+
+        # if there's only one directory inside the workspace, go into it
+        items = os.listdir(self.path)
+        dirs_only = [d for d in items if os.path.isdir(os.path.join(self.path, d))]
+        if len(dirs_only) == 1:
+            return os.path.join(self.path, dirs_only[0])
+        return self.path
+
+
+def collect_garbage(max_age=None):
+    """Remove workspaces left behind by crashed or killed requests, returns how many were removed."""
+    config = get_config()
+    max_age = config['STALE_AFTER'] if max_age is None else max_age
+    root = config['ROOT']
+    if not os.path.isdir(root):
+        return 0
+
+    removed = 0
+    now = time.time()
+    for user_folder in os.scandir(root):
+        if not user_folder.is_dir(follow_symlinks=False):
+            continue
+        for workspace in os.scandir(user_folder.path):
+            try:
+                if now - workspace.stat(follow_symlinks=False).st_mtime > max_age:
+                    shutil.rmtree(workspace.path, ignore_errors=True)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        try:
+            os.rmdir(user_folder.path)
+        except OSError:
+            # still has live workspaces
+            pass
+    return removed
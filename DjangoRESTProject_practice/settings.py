@@ -51,17 +51,21 @@ INSTALLED_APPS = [
     'AdminModule',
     'FacultyModule',
     'StudentModule',
+    'Compilers',
 
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'Models.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'Models.middleware.AuditTrailMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'Models.middleware.ConditionalGetMiddleware',
 
 ]
 
@@ -97,7 +101,25 @@ DATABASES = {
         'PASSWORD': 'admin123',
         'HOST': 'database',
         'PORT': '3306',
-    }
+    },
+    # 'replica': {
+    #     'ENGINE': 'django.db.backends.mysql',
+    #     'NAME': 'LMS',
+    #     'USER': 'readUser',
+    #     'PASSWORD': '...',
+    #     'HOST': 'database-replica',
+    #     'PORT': '3306',
+    #     'TEST': {'MIRROR': 'default'},
+    # },
+}
+
+# safe requests and the cache prewarm read from these aliases, see Models/db_routing.py
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ['Models.db_routing.ReplicaRouter']
+REPLICA_ROUTING = {
+    'MAX_LAG_SECONDS': 5,
+    'LAG_CHECK_SECONDS': 5,
+    'PIN_SECONDS': 10,
 }
 
 
@@ -167,15 +189,16 @@ REDIS_URL = os.environ.get('REDIS_URL', 'redis://redis-server:6379/0')
 
 CACHES = {
     'default': {
-        'BACKEND': 'django_redis.cache.RedisCache',
+        'BACKEND': 'Models.cache_metrics.InstrumentedRedisCache',
         'LOCATION': REDIS_URL,
         'TIMEOUT': 300,
         'KEY_PREFIX': 'LMS',
+        'METRICS_NAME': 'default',
         'OPTIONS': {
-            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            'CLIENT_CLASS': 'Models.cache_metrics.InstrumentedClient',
+            # only reads values written before CACHE_CODECS, new values carry their own codec
             'SERIALIZER': 'django_redis.serializers.json.JSONSerializer',
 
-            #"COMPRESSOR": "django_redis.compressors.zlib.ZlibCompressor",
             "CONNECTION_POOL_KWARGS": {"max_connections": 100, "retry_on_timeout": True},
             "SOCKET_CONNECT_TIMEOUT": 2,    # Connection timeout
             "SOCKET_TIMEOUT": 2,            # Read/write timeout
@@ -184,17 +207,59 @@ CACHES = {
     },
 
     'pages': {
-        'BACKEND': 'django_redis.cache.RedisCache',
+        'BACKEND': 'Models.cache_metrics.InstrumentedRedisCache',
         'LOCATION': os.getenv('REDIS_URL_PAGES', REDIS_URL),
         'TIMEOUT': 60,
         'KEY_PREFIX': 'lms:pages',
+        'METRICS_NAME': 'pages',
         'OPTIONS': {
-            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            'CLIENT_CLASS': 'Models.cache_metrics.InstrumentedClient',
             'SERIALIZER': 'django_redis.serializers.json.JSONSerializer',  # Keep it consistent
         },
     },
 }
 
+# codec per key family, first match of CACHE_KEY_FAMILIES wins, see Models/cache_codecs.py.
+# Chosen with `manage.py cache_codec_benchmark`: on the admin list payloads JSON + zlib is 2-9x smaller
+# than plain JSON. msgpack, zstd and lz4 need their packages installed. Values are only read back with
+# the codecs named here, other headers are misses.
+CACHE_CODECS = {
+    'DEFAULT': {'SERIALIZER': 'json', 'COMPRESSOR': 'zlib', 'THRESHOLD': 1024},
+}
+
+# key families the cache metrics are grouped by, first match wins, see Models/cache_metrics.py for the defaults
+# CACHE_KEY_FAMILIES = ['admin:students:*', 'faculty:*:allocations', ...]
+
+# writes to an admin domain schedule at most one cache rebuild per window
+CACHE_REBUILD_DEBOUNCE_SECONDS = 30
+
+# time budget of each warmer run by manage.py prewarm_caches / prewarm_caches_task
+CACHE_PREWARM_BUDGET_SECONDS = 300
+# report the peak memory of every cache warm-up task; for diagnostics only, tracemalloc slows the
+# task down while it runs
+CACHE_WARM_TRACE_MEMORY = False
+
+# opt-in memoization of compiler output, see Compilers/result_cache.py for the defaults
+COMPILER_RESULT_CACHE = {
+    'ENABLED': os.getenv('COMPILER_RESULT_CACHE_ENABLED', 'false').lower() == 'true',
+    'TIMEOUT': 60 * 60,
+    'MAX_ENTRIES': 1000,
+}
+
+# per-request compiler workspaces, see Compilers/workspace.py for the defaults
+COMPILER_WORKSPACE = {
+    'ROOT': '/code',
+    'USER_QUOTA_BYTES': 25 * 1024 * 1024,
+    'USER_MAX_WORKSPACES': 3,
+}
+
+# per-user token bucket and global admission control, see Compilers/throttling.py for the defaults
+COMPILER_ADMISSION = {
+    'BURST': 5,
+    'REFILL_PER_SECOND': 0.2,
+    'CAPACITY': int(os.getenv('COMPILER_CAPACITY', 8)),
+}
+
 
 CELERY_BROKER_URL = 'redis://redis-server:6379/0'
 CELERY_RESULT_BACKEND = 'redis://redis-server:6379/1'
@@ -212,6 +277,25 @@ CELERY_TASK_DEFAULT_QUEUE = 'default'
 CELERY_TASK_ALWAYS_EAGER = False
 CELERY_WORKER_POOL = 'solo'
 
+CELERY_BEAT_SCHEDULE = {
+    'cleanup-compiler-workspaces': {
+        'task': 'Compilers.tasks.cleanup_workspaces_task',
+        'schedule': 5 * 60,
+    },
+    'archive-audit-trail': {
+        'task': 'Models.tasks.archive_audit_trail_task',
+        'schedule': 24 * 60 * 60,
+    },
+    'reconcile-counters': {
+        'task': 'Models.tasks.reconcile_counters_task',
+        'schedule': 60 * 60,
+    },
+    'rebuild-attendance-summaries': {
+        'task': 'Models.tasks.rebuild_attendance_summaries_task',
+        'schedule': 24 * 60 * 60,
+    },
+}
+
 
 ALGOLIA = {
     'APPLICATION_ID': '7MAPGJN7HA',
@@ -222,6 +306,16 @@ ALGOLIA = {
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# audit trail rows older than HOT_DAYS move to gzip segments under MEDIA_ROOT/ROOT (Models.audit_archive)
+AUDIT_ARCHIVE = {
+    'HOT_DAYS': 90,
+    'BATCH_SIZE': 5000,
+    'ROOT': 'audit',
+}
+
+# enrollments whose attendance percentage is below this are at risk (Models.attendance)
+ATTENDANCE_AT_RISK_PERCENTAGE = 75
+
 
 
 EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
@@ -10,7 +10,15 @@ DATABASES = {
         'TEST': {
             'NAME': os.path.join(BASE_DIR, "test_db.sqlite3"),  # <---- Key Fix
         },
-    }
+    },
+    # a second connection to the same file stands in for a read replica, DATABASE_REPLICAS = ['replica'] routes to it
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, "test_db.sqlite3"),
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    },
 }
 
 # Optional: Disable migrations for faster tests
@@ -1,6 +1,7 @@
 from datetime import timedelta
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import transaction
+from django.db.models import Max
 from django.shortcuts import get_list_or_404
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema_field, inline_serializer
@@ -409,9 +410,10 @@ class LectureSerializer(serializers.ModelSerializer):
 
     @transaction.atomic
     def create(self, validated_data):
-        validated_data['allocation_id'] = CourseAllocation.objects.get(allocation_id=self.context.get('allocation_id'))
-        lecture_count = Lecture.objects.filter(allocation_id=validated_data['allocation_id']).count()
-        lecture_no = lecture_count +1
+        # the allocation row stays locked until commit, concurrent lectures of an allocation get consecutive numbers
+        validated_data['allocation_id'] = CourseAllocation.objects.select_for_update().get(allocation_id=self.context.get('allocation_id'))
+        last_lecture = Lecture.objects.filter(allocation_id=validated_data['allocation_id']).aggregate(last=Max('lecture_no'))['last']
+        lecture_no = (last_lecture or 0) +1
         lecture_id = f'{validated_data['allocation_id']}-{lecture_no}'
         validated_data['lecture_id'] = lecture_id
         validated_data['lecture_no'] = lecture_no
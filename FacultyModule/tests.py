@@ -1,3 +1,29 @@
+import pytest
+from django.contrib.auth.models import User
 from django.test import TestCase
+from rest_framework.test import APIClient
 
 # Create your tests here.
+
+
+@pytest.mark.django_db
+def test_lectures_are_numbered_after_the_last_one(locmem_caches):
+    from Models.models import CourseAllocation, Lecture
+
+    client = APIClient()
+    client.force_authenticate(User.objects.get(username='mankbp2238@gmail.com'))
+    for lecture_no in (2, 3):
+        response = client.post('/api/faculty/allocations/4/lectures/', {
+            'starting_time': '2025-09-10T09:00:00Z', 'venue': 'A-1', 'duration': 60, 'topic': 'Loops',
+        }, format='json')
+        assert response.status_code == 201
+        assert response.data['lecture_no'] == lecture_no
+    assert Lecture.objects.filter(allocation_id=4).count() == 3
+
+    # a completed allocation without enrollments averages to 0
+    allocation = CourseAllocation.objects.get(pk=5)
+    allocation.pk, allocation.status = None, 'Completed'
+    allocation.save()
+    response = client.get('/api/faculty/dashboard/')
+    assert response.status_code == 200
+    assert response.data['allocation_average_success'] == {allocation.pk: 0}
@@ -17,6 +17,7 @@ urlpatterns = [
 
     path('allocations/<int:allocation_id>/lectures/' ,LectureListCreateAPIView.as_view()),
     path('allocations/<int:allocation_id>/lectures/<str:lecture_id>/', LectureRetrieveUpdateDestroyAPIView.as_view(), name='lecture-detail'),
+    path('allocations/<int:allocation_id>/attendance/', AllocationAttendanceListAPIView.as_view(), name='allocation-attendance'),
 
     path('requests/', FacultyRequestsListView.as_view(), name='change-request'),
     path('requests/<int:pk>/', FacultyRequestsUpdateView.as_view(), name='change-request-update'),
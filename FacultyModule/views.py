@@ -11,7 +11,10 @@ from drf_spectacular.utils import extend_schema, OpenApiResponse, OpenApiExample
 
 from AdminModule.tasks import send_result_calculation_mail
 from DjangoRESTProject_practice import settings
-from AdminModule.serializers import FacultySerializer
+from AdminModule.serializers import AttendanceSummarySerializer, FacultySerializer
+from Models.attendance import at_risk
+from Models.cache_tags import set_tagged, tag, tags_for
+from Models.pagination import KeysetPagination
 from FacultyModule.serializers import *
 from .mixins import *
 
@@ -67,6 +70,9 @@ class FacultyDashboardView(
     FacultyPermissionMixin,
     APIView
 ):
+    # tables read by get(), for the ETag (Models/conditional.py)
+    etag_models = ['Faculty', 'Person', 'CourseAllocation', 'Enrollment', 'Result']
+
     def get(self,request):
         cache_key = f'faculty:dashboard:{request.user.username}'
         data = cache.get(cache_key)
@@ -85,9 +91,10 @@ class FacultyDashboardView(
         active_allocations = faculty.courseallocation_set.filter(status='Ongoing').count()
         completed_allocations = faculty.courseallocation_set.filter(status='Completed').count()
         allocation_average_success = {}
-        for each in faculty.courseallocation_set.filter(status='Completed'):
-            average = sum([e.result.obtained_marks for e in each.enrollment_set.all() if e.result.obtained_marks])/ each.enrollment_set.all().count()
-            allocation_average_success[each.allocation_id] = average
+        for each in faculty.courseallocation_set.filter(status='Completed').prefetch_related('enrollment_set__result'):
+            enrollments = each.enrollment_set.all()
+            marks = sum([e.result.obtained_marks for e in enrollments if e.result.obtained_marks])
+            allocation_average_success[each.allocation_id] = marks / len(enrollments) if enrollments else 0
 
         data = {
             'faculty': faculty_data,
@@ -96,7 +103,11 @@ class FacultyDashboardView(
             'completed_allocations': completed_allocations,
             'allocation_average_success': allocation_average_success,
         }
-        cache.set(cache_key, data, timeout=60*5)
+        completed_enrollments = Enrollment.objects.filter(allocation_id__in=allocation_average_success).values_list('enrollment_id', flat=True)
+        tags = [tag(Faculty, faculty.pk), tag(Person, faculty.pk), tag(CourseAllocation, teacher_id=faculty.pk)]
+        tags += tags_for(Enrollment, 'allocation_id', allocation_average_success)
+        tags += tags_for(Result, 'enrollment_id', completed_enrollments)
+        set_tagged(cache_key, data, 60*5, tags)
         return Response(data, status=status.HTTP_200_OK)
 
 
@@ -154,6 +165,19 @@ class FacultyCourseAllocationView(
                 return queryset
         return CourseAllocation.objects.none()
 
+    def get_cache_tags(self, allocations):
+        # the nested enrollments, lectures, assessments and results of every listed allocation
+        ids = [each.allocation_id for each in allocations]
+        teacher = Faculty.objects.filter(employee_id__user=self.request.user).values_list('pk', flat=True).first()
+        enrollments = Enrollment.objects.filter(allocation_id__in=ids).values_list('enrollment_id', flat=True)
+        assessments = Assessment.objects.filter(allocation_id__in=ids).values_list('assessment_id', flat=True)
+        tags = [tag(CourseAllocation, teacher_id=teacher)] + [tag(CourseAllocation, each) for each in ids]
+        for model in (Enrollment, Lecture, Assessment):
+            tags += tags_for(model, 'allocation_id', ids)
+        tags += tags_for(Result, 'enrollment_id', enrollments)
+        tags += tags_for(AssessmentChecked, 'assessment_id', assessments)
+        return tags
+
     def list(self, request, *args, **kwargs):
         cache_key = f'faculty:{request.user.username}:allocations'
         data = cache.get(cache_key)
@@ -162,11 +186,11 @@ class FacultyCourseAllocationView(
             page = self.paginate_queryset(queryset)
             if page is not None:
                 serializer = self.get_serializer(page, many=True, context={'request': request})
-                cache.set(cache_key, serializer.data, timeout=60*5)
+                set_tagged(cache_key, serializer.data, 60*5, self.get_cache_tags(page))
                 return self.get_paginated_response(serializer.data)
 
             serializer = self.get_serializer(queryset, many=True, context={'request': request})
-            cache.set(cache_key, serializer.data, timeout=60*5)
+            set_tagged(cache_key, serializer.data, 60*5, self.get_cache_tags(queryset))
             return Response(serializer.data, status=status.HTTP_200_OK)
 
         else:
@@ -231,14 +255,16 @@ class AssessmentListCreateAPIView(
         if data is None:
             queryset = self.filter_queryset(self.get_queryset())
 
+            assessments = queryset.values_list('assessment_id', flat=True)
+            tags = tags_for(Assessment, 'allocation_id', [allocation_id]) + tags_for(AssessmentChecked, 'assessment_id', assessments)
             page = self.paginate_queryset(queryset)
             if page is not None:
                 serializer = self.get_serializer(page, many=True)
-                cache.set(cache_key, serializer.data, timeout=60*5)
+                set_tagged(cache_key, serializer.data, 60*5, tags)
                 return self.get_paginated_response(serializer.data)
 
             serializer = self.get_serializer(queryset, many=True)
-            cache.set(cache_key, serializer.data, timeout=60*5)
+            set_tagged(cache_key, serializer.data, 60*5, tags)
             return Response(serializer.data, status=status.HTTP_200_OK)
 
         else:
@@ -261,14 +287,6 @@ class AssessmentListCreateAPIView(
 
             return Response(data=data, status=status.HTTP_200_OK)
 
-    def perform_create(self, serializer):
-        allocation_id = self.kwargs.get('allocation_id')
-        cache_key = f'faculty:{self.request.user.username}:{allocation_id}:assessments'
-        instance = serializer.save()
-        data = cache.get(cache_key) or []
-        new_data = self.get_serializer(instance).data
-        data.append(new_data)
-        cache.set(cache_key, data, timeout=60*5)
 
 
 
@@ -311,6 +329,23 @@ class LectureListCreateAPIView(
 
 
 
+class AllocationAttendanceListAPIView(
+    FacultyLecturePermissionMixin,
+    generics.ListAPIView
+):
+    # attendance figures of the allocation's students, lowest first; ?at_risk=true for the ones at risk
+    serializer_class = AttendanceSummarySerializer
+    def get_queryset(self):
+        queryset = AttendanceSummary.objects.filter(
+            enrollment__allocation_id=self.kwargs.get('allocation_id'),
+            enrollment__allocation_id__teacher_id__employee_id__user=self.request.user,
+        ).select_related('enrollment').order_by('percentage', 'enrollment')
+        if self.request.query_params.get('at_risk') in ('true', 'True', '1'):
+            queryset = at_risk(queryset)
+        return queryset
+
+
+
 class LectureRetrieveUpdateDestroyAPIView(
     FacultyLecturePermissionMixin,
     generics.RetrieveUpdateDestroyAPIView
@@ -370,6 +405,7 @@ class FacultyRequestsListView(
     generics.ListAPIView
 ):
     serializer_class = FacultyRequestsSerializer
+    pagination_class = KeysetPagination
     def get_queryset(self):
         queryset = ChangeRequest.objects.filter(requested_by=self.request.user)
         if queryset.exists():
@@ -1,6 +1,18 @@
 from django.contrib import admin
 
 from .models import *
+
+
+class AuditTrailAdmin(admin.ModelAdmin):
+    # the changelist of a large audit trail: filtered through the indexes, never counted in full
+    list_display = ['audit_id', 'time_stamp', 'action_type', 'entity_name', 'userid']
+    list_filter = ['entity_name', 'action_type']
+    ordering = ['-time_stamp']
+    show_full_result_count = False
+    list_select_related = ['userid']
+    raw_id_fields = ['userid']
+
+
 admin.site.register(Department)
 admin.site.register(Program)
 admin.site.register(Class)
@@ -13,7 +25,7 @@ admin.site.register(Faculty)
 admin.site.register(Student)
 admin.site.register(Address)
 admin.site.register(Qualification)
-admin.site.register(AuditTrail)
+admin.site.register(AuditTrail, AuditTrailAdmin)
 admin.site.register(CourseAllocation)
 admin.site.register(Enrollment)
 admin.site.register(Result)
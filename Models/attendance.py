@@ -0,0 +1,100 @@
+"""
+Attendance summaries.
+
+AttendanceSummary holds the lectures held and attended and the attendance percentage of every
+enrollment. The Attendance signals in Models/signals.py move it by the difference between the old
+and the new row, in the transaction of the write, so reading an enrollment's attendance figures is a
+primary key lookup. rebuild_attendance_summaries() recounts them from the Attendance table, after
+bulk writes or to repair drift.
+"""
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.db.models import Case, Count, F, FloatField, Q, Value, When
+from django.db.models.functions import Round
+from django.utils import timezone
+
+
+def at_risk_percentage():
+    # enrollments below this attendance are at risk
+    return getattr(settings, 'ATTENDANCE_AT_RISK_PERCENTAGE', 75)
+
+
+def at_risk(queryset):
+    # summaries of enrollments with lectures held and too few attended, a range of the percentage index
+    return queryset.filter(percentage__lt=at_risk_percentage(), lectures_held__gt=0)
+
+
+def percentage_expression():
+    return Case(
+        When(lectures_held=0, then=Value(0)),
+        default=Round(F('lectures_attended') * 100.0 / F('lectures_held')),
+        output_field=FloatField(),
+    )
+
+
+def enrollment_of(values):
+    from .models import Enrollment
+
+    return Enrollment.objects.filter(
+        student_id=values['student_id'], allocation_id__lecture__lecture_id=values['lecture_id'],
+    ).values_list('pk', flat=True).first()
+
+
+def move_summary(enrollment_id, held, attended):
+    from .models import AttendanceSummary
+
+    queryset = AttendanceSummary.objects.filter(enrollment_id=enrollment_id)
+    changes = {'lectures_held': F('lectures_held') + held, 'lectures_attended': F('lectures_attended') + attended,
+               'updated_at': timezone.now()}
+    if not queryset.update(**changes):
+        AttendanceSummary.objects.get_or_create(enrollment_id=enrollment_id)
+        queryset.update(**changes)
+    # a second statement: MySQL would read the incremented columns in the same one, others the old ones
+    queryset.update(percentage=percentage_expression())
+
+
+def attendance_change(old_values, new_values):
+    """Moves the summaries of an Attendance row written from old_values to new_values ({} for none)."""
+    old = enrollment_of(old_values) if old_values else None
+    new = enrollment_of(new_values) if new_values else None
+    if old is not None and old == new:
+        attended = int(bool(new_values['is_present'])) - int(bool(old_values['is_present']))
+        if attended:
+            move_summary(new, 0, attended)
+        return
+    if old is not None:
+        move_summary(old, -1, -int(bool(old_values['is_present'])))
+    if new is not None:
+        move_summary(new, 1, int(bool(new_values['is_present'])))
+
+
+def rebuild_attendance_summaries(registry=django_apps):
+    """Recounts every summary from the Attendance table, returns how many changed."""
+    Enrollment = registry.get_model('Models', 'Enrollment')
+    AttendanceSummary = registry.get_model('Models', 'AttendanceSummary')
+    Attendance = registry.get_model('Models', 'Attendance')
+
+    actual = {}
+    rows = (Attendance.objects.order_by()
+            .values_list('student_id', 'lecture_id__allocation_id')
+            .annotate(held=Count('pk'), attended=Count('pk', filter=Q(is_present=True))))
+    enrollments = dict(((student, allocation), pk) for pk, student, allocation in
+                       Enrollment.objects.values_list('pk', 'student_id', 'allocation_id'))
+    for student, allocation, held, attended in rows:
+        if (student, allocation) in enrollments:
+            actual[enrollments[(student, allocation)]] = (held, attended)
+
+    stored = {pk: (held, attended) for pk, held, attended in
+              AttendanceSummary.objects.values_list('enrollment_id', 'lectures_held', 'lectures_attended')}
+    changed = 0
+    for enrollment_id in actual.keys() | stored.keys():
+        held, attended = actual.get(enrollment_id, (0, 0))
+        if stored.get(enrollment_id) == (held, attended):
+            continue
+        AttendanceSummary.objects.update_or_create(enrollment_id=enrollment_id, defaults={
+            'lectures_held': held, 'lectures_attended': attended,
+            # half up, as Round() in the database
+            'percentage': int(attended * 100 / held + 0.5) if held else 0, 'updated_at': timezone.now(),
+        })
+        changed += 1
+    return changed
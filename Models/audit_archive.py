@@ -0,0 +1,275 @@
+"""
+Audit trail archival.
+
+The auditTrail table keeps a hot window of AUDIT_ARCHIVE['HOT_DAYS'] days. archive_audit_trail() moves
+older rows, oldest first and BATCH_SIZE at a time, into append-only segments under media storage:
+
+    audit/2025/03/segment-0000001200-0000001730.jsonl.gz     one row per line, gzip
+    audit/2025/03/segment-0000001200-0000001730.index.json   sidecar index of the segment
+    audit/manifest.json                                      the sidecars of every complete segment
+
+A complete segment is never rewritten. Its sidecar (id and time range, row counts per entity, action and
+user) is written after it, then added to the manifest, and rows are deleted from the table after all
+three, so a segment without a sidecar is an interrupted write: the readers ignore it and archiving its
+batch again replaces it. A batch archived again after a crash before the delete finds its sidecar,
+registers it if the manifest missed it, and only deletes. Readers load the manifest alone, once per
+process until its modification time changes; without one they fall back to listing the sidecars. Archived rows carry their entity_pk and changed_fields
+(the auditTrailEntity and auditTrailField rows), the sidecar lists the records and fields they touch.
+audit_records() reads both tiers as one list, newest first, opening only the segments whose sidecar
+can match the filters.
+"""
+import gzip
+import json
+import posixpath
+from datetime import timedelta, timezone as dt_timezone
+from itertools import groupby
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .conditional import bump_versions
+from .models import AuditTrail, AuditTrailEntity, AuditTrailField
+
+
+DEFAULTS = {'HOT_DAYS': 90, 'BATCH_SIZE': 5000, 'ROOT': 'audit'}
+FIELDS = ('audit_id', 'userid_id', 'action_type', 'entity_name', 'time_stamp',
+          'ip_address', 'user_agent', 'old_value', 'new_value')
+
+# (storage location, manifest name) -> (modification time, sidecars)
+_manifests = {}
+
+
+def archive_settings():
+    return {**DEFAULTS, **getattr(settings, 'AUDIT_ARCHIVE', {})}
+
+
+def with_keys(rows):
+    """Adds the entity_pk and changed_fields of the audit rows from the query index tables."""
+    ids = [row['audit_id'] for row in rows]
+    entity_pks = dict(AuditTrailEntity.objects.filter(audit_id__in=ids).values_list('audit_id', 'entity_pk'))
+    fields = {}
+    for audit_id, field_name in AuditTrailField.objects.filter(audit_id__in=ids).values_list('audit_id', 'field_name'):
+        fields.setdefault(audit_id, []).append(field_name)
+    for row in rows:
+        row['entity_pk'] = entity_pks.get(row['audit_id'])
+        row['changed_fields'] = sorted(fields.get(row['audit_id'], []))
+    return rows
+
+
+def record_key(entity_name, entity_pk):
+    return f'{entity_name}:{entity_pk}'
+
+
+def month(row):
+    return row['time_stamp'].astimezone(dt_timezone.utc).strftime('%Y/%m')
+
+
+def segment_name(rows):
+    return posixpath.join(archive_settings()['ROOT'], month(rows[0]),
+                          f'segment-{rows[0]["audit_id"]:010d}-{rows[-1]["audit_id"]:010d}')
+
+
+def sidecar(rows):
+    def counts(field):
+        found = {}
+        for row in rows:
+            found[str(row[field])] = found.get(str(row[field]), 0) + 1
+        return found
+
+    times = [row['time_stamp'] for row in rows]
+    changed = {}
+    for row in rows:
+        for name in row['changed_fields']:
+            changed[name] = changed.get(name, 0) + 1
+    return {
+        'rows': len(rows), 'first_id': rows[0]['audit_id'], 'last_id': rows[-1]['audit_id'],
+        'since': min(times).isoformat(), 'until': max(times).isoformat(),
+        'entities': counts('entity_name'), 'actions': counts('action_type'), 'users': counts('userid_id'),
+        'fields': changed,
+        'records': sorted({record_key(row['entity_name'], row['entity_pk']) for row in rows if row['entity_pk']}),
+    }
+
+
+def manifest_name():
+    return posixpath.join(archive_settings()['ROOT'], 'manifest.json')
+
+
+def _scan():
+    root = archive_settings()['ROOT']
+    found = []
+    if not default_storage.exists(root):
+        return found
+    for year in default_storage.listdir(root)[0]:
+        for month_of_year in default_storage.listdir(posixpath.join(root, year))[0]:
+            directory = posixpath.join(root, year, month_of_year)
+            for file_name in default_storage.listdir(directory)[1]:
+                if not file_name.endswith('.index.json'):
+                    continue
+                with default_storage.open(posixpath.join(directory, file_name)) as file:
+                    index = json.load(file)
+                index['name'] = posixpath.join(directory, file_name[:-len('.index.json')])
+                found.append(index)
+    return found
+
+
+def read_manifest():
+    name = manifest_name()
+    if not default_storage.exists(name):
+        # archives written before the manifest, or one lost between its delete and save
+        return _scan()
+    try:
+        modified = default_storage.get_modified_time(name)
+    except NotImplementedError:
+        modified = None
+    key = (getattr(default_storage, 'location', None), name)
+    cached = _manifests.get(key)
+    if cached is not None and modified is not None and cached[0] == modified:
+        return cached[1]
+    with default_storage.open(name) as file:
+        found = json.load(file)
+    _manifests[key] = (modified, found)
+    return found
+
+
+def register_segment(name, index):
+    found = [each for each in read_manifest() if each['name'] != name] + [{**index, 'name': name}]
+    manifest = manifest_name()
+    # save() does not overwrite
+    if default_storage.exists(manifest):
+        default_storage.delete(manifest)
+    default_storage.save(manifest, ContentFile(json.dumps(found).encode()))
+
+
+def write_segment(rows):
+    name = segment_name(rows)
+    if default_storage.exists(f'{name}.index.json'):
+        if name not in {each['name'] for each in read_manifest()}:
+            with default_storage.open(f'{name}.index.json') as file:
+                register_segment(name, json.load(file))
+        return None
+    if default_storage.exists(f'{name}.jsonl.gz'):
+        # left by a write interrupted before its sidecar: save() would not overwrite it, it would rename ours
+        default_storage.delete(f'{name}.jsonl.gz')
+    lines = b''.join(json.dumps(row, cls=DjangoJSONEncoder).encode() + b'\n' for row in rows)
+    # a fixed mtime keeps the bytes of a segment a function of its rows
+    default_storage.save(f'{name}.jsonl.gz', ContentFile(gzip.compress(lines, mtime=0)))
+    index = sidecar(rows)
+    default_storage.save(f'{name}.index.json', ContentFile(json.dumps(index).encode()))
+    register_segment(name, index)
+    return name
+
+
+def archive_audit_trail(hot_days=None, batch_size=None, limit=None):
+    """Move the rows older than the hot window into segments, returns (rows, segments written)."""
+    options = archive_settings()
+    cutoff = timezone.now() - timedelta(days=options['HOT_DAYS'] if hot_days is None else hot_days)
+    batch_size = batch_size or options['BATCH_SIZE']
+    archived = written = 0
+    while limit is None or archived < limit:
+        rows = with_keys(list(AuditTrail.objects.filter(time_stamp__lt=cutoff).order_by('audit_id')
+                              .values(*FIELDS)[:batch_size]))
+        if not rows:
+            break
+        # one segment per month, a batch can straddle two
+        for _, rows_of_month in groupby(rows, key=month):
+            written += write_segment(list(rows_of_month)) is not None
+        ids = [row['audit_id'] for row in rows]
+        with transaction.atomic():
+            # no signals: the rows are not changing, they are moving to the cold tier
+            for model in (AuditTrailField, AuditTrailEntity):
+                model.objects.filter(audit_id__in=ids)._raw_delete(model.objects.db)
+            AuditTrail.objects.filter(pk__in=ids)._raw_delete(AuditTrail.objects.db)
+            transaction.on_commit(lambda: bump_versions(['AuditTrail']))
+        archived += len(rows)
+    return archived, written
+
+
+def segments():
+    """Sidecars of the complete segments, newest first, each with its 'name'."""
+    return sorted(read_manifest(), key=lambda index: index['last_id'], reverse=True)
+
+
+def read_segment(name):
+    with default_storage.open(f'{name}.jsonl.gz') as file:
+        for line in gzip.decompress(file.read()).splitlines():
+            row = json.loads(line)
+            row['time_stamp'] = parse_datetime(row['time_stamp'])
+            yield row
+
+
+def may_match(index, filters):
+    if filters.get('entity_name') and filters['entity_name'] not in index['entities']:
+        return False
+    if filters.get('action_type') and filters['action_type'] not in index['actions']:
+        return False
+    if filters.get('userid_id') is not None and str(filters['userid_id']) not in index['users']:
+        return False
+    if filters.get('entity_pk') is not None:
+        records = index.get('records', ())
+        if filters.get('entity_name'):
+            if record_key(filters['entity_name'], filters['entity_pk']) not in records:
+                return False
+        elif not any(each.split(':', 1)[1] == str(filters['entity_pk']) for each in records):
+            return False
+    if filters.get('field') and filters['field'] not in index.get('fields', {}):
+        return False
+    if filters.get('since') and parse_datetime(index['until']) < filters['since']:
+        return False
+    if filters.get('until') and parse_datetime(index['since']) >= filters['until']:
+        return False
+    return True
+
+
+def matches(row, filters):
+    return all((
+        not filters.get('entity_name') or row['entity_name'] == filters['entity_name'],
+        not filters.get('action_type') or row['action_type'] == filters['action_type'],
+        filters.get('userid_id') is None or str(row['userid_id']) == str(filters['userid_id']),
+        filters.get('entity_pk') is None or row.get('entity_pk') == str(filters['entity_pk']),
+        not filters.get('field') or filters['field'] in row.get('changed_fields', ()),
+        not filters.get('since') or row['time_stamp'] >= filters['since'],
+        not filters.get('until') or row['time_stamp'] < filters['until'],
+    ))
+
+
+def audit_records(limit=100, before_id=None, **filters):
+    """
+    Audit rows of both tiers, newest (highest audit_id) first, as dicts of FIELDS, entity_pk and
+    changed_fields. Filters: entity_name, entity_pk, action_type, userid_id, field,
+    since and until (aware datetimes, until excluded); before_id continues after the last audit_id of
+    a previous call.
+    """
+    queryset = AuditTrail.objects.order_by('-audit_id')
+    for field in ('entity_name', 'action_type', 'userid_id'):
+        if filters.get(field) is not None:
+            queryset = queryset.filter(**{field: filters[field]})
+    if filters.get('entity_pk') is not None:
+        queryset = queryset.filter(touched__entity_pk=str(filters['entity_pk']))
+        if filters.get('entity_name'):
+            queryset = queryset.filter(touched__entity_name=filters['entity_name'])
+    if filters.get('field'):
+        queryset = queryset.filter(changed_fields__field_name=filters['field'])
+    if filters.get('since'):
+        queryset = queryset.filter(time_stamp__gte=filters['since'])
+    if filters.get('until'):
+        queryset = queryset.filter(time_stamp__lt=filters['until'])
+    if before_id is not None:
+        queryset = queryset.filter(audit_id__lt=before_id)
+    records = with_keys(list(queryset.values(*FIELDS)[:limit]))
+
+    # archived rows are all older than the hot ones
+    floor = records[-1]['audit_id'] if records else before_id
+    for index in segments():
+        if len(records) >= limit:
+            break
+        if (floor is not None and index['first_id'] >= floor) or not may_match(index, filters):
+            continue
+        rows = [row for row in read_segment(index['name'])
+                if (floor is None or row['audit_id'] < floor) and matches(row, filters)]
+        records += sorted(rows, key=lambda row: row['audit_id'], reverse=True)[:limit - len(records)]
+    return records
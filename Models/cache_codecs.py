@@ -0,0 +1,229 @@
+"""
+Cache value codecs.
+
+A codec is a serializer (json, msgpack) plus an optional compressor (zlib, zstd, lz4) applied to
+payloads of at least THRESHOLD bytes. CodecClient picks the codec from the key family of every write
+(settings.CACHE_CODECS) and prefixes the payload with a three byte header, so a value is read back
+with the codec it was written with, and values written before codecs existed are still read with the
+client's SERIALIZER.
+
+    CACHE_CODECS = {
+        'DEFAULT': {'SERIALIZER': 'json'},
+        'admin:students:*': {'SERIALIZER': 'msgpack', 'COMPRESSOR': 'zlib', 'THRESHOLD': 1024},
+    }
+
+Only the serializers and compressors named in CACHE_CODECS are read back, a header naming any other
+is a miss: whoever can write to Redis must not choose how this process decodes. There is no pickle
+serializer for the same reason, loading a pickle runs whatever code it names.
+"""
+import json
+import threading
+import zlib
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django_redis.client import DefaultClient
+
+
+MAGIC = 0xfe
+DEFAULT_THRESHOLD = 1024
+
+
+class JSONSerializer:
+    id = 1
+
+    def dumps(self, value):
+        return json.dumps(value, cls=DjangoJSONEncoder, separators=(',', ':')).encode()
+
+    def loads(self, data):
+        return json.loads(data)
+
+
+class MsgpackSerializer:
+    id = 3
+
+    def __init__(self):
+        try:
+            import msgpack
+        except ImportError:
+            raise ImproperlyConfigured('The msgpack cache serializer needs the msgpack package')
+        self._msgpack = msgpack
+        # dates, decimals and UUIDs become the strings JSON would hold
+        self._default = DjangoJSONEncoder().default
+
+    def dumps(self, value):
+        return self._msgpack.packb(value, default=self._default, use_bin_type=True)
+
+    def loads(self, data):
+        return self._msgpack.unpackb(data, raw=False)
+
+
+class ZlibCompressor:
+    id = 1
+
+    def __init__(self, level=None):
+        self.level = 6 if level is None else level
+
+    def compress(self, data):
+        return zlib.compress(data, self.level)
+
+    def decompress(self, data):
+        return zlib.decompress(data)
+
+
+class ZstdCompressor:
+    id = 2
+
+    def __init__(self, level=None):
+        try:
+            import zstandard
+        except ImportError:
+            raise ImproperlyConfigured('The zstd cache compressor needs the zstandard package')
+        self._compressor = zstandard.ZstdCompressor(level=3 if level is None else level)
+        self._decompressor = zstandard.ZstdDecompressor()
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def decompress(self, data):
+        return self._decompressor.decompress(data)
+
+
+class LZ4Compressor:
+    id = 3
+
+    def __init__(self, level=None):
+        try:
+            import lz4.frame
+        except ImportError:
+            raise ImproperlyConfigured('The lz4 cache compressor needs the lz4 package')
+        self._frame = lz4.frame
+        self.level = 0 if level is None else level
+
+    def compress(self, data):
+        return self._frame.compress(data, compression_level=self.level)
+
+    def decompress(self, data):
+        return self._frame.decompress(data)
+
+
+SERIALIZERS = {'json': JSONSerializer, 'msgpack': MsgpackSerializer}
+COMPRESSORS = {'zlib': ZlibCompressor, 'zstd': ZstdCompressor, 'lz4': LZ4Compressor}
+
+_readers = {}
+
+
+def _instance(registry, name, *args):
+    if name not in registry:
+        raise ImproperlyConfigured(f'Unknown cache codec {name!r}, expected one of {", ".join(registry)}')
+    return registry[name](*args)
+
+
+def _reader(registry, id):
+    cls = next(cls for cls in registry.values() if cls.id == id)
+    if cls not in _readers:
+        _readers[cls] = cls()
+    return _readers[cls]
+
+
+class Codec:
+    def __init__(self, serializer='json', compressor=None, threshold=DEFAULT_THRESHOLD, level=None):
+        self.name = f'{serializer}+{compressor}' if compressor else serializer
+        self.serializer = _instance(SERIALIZERS, serializer)
+        self.compressor = _instance(COMPRESSORS, compressor, level) if compressor else None
+        self.threshold = threshold
+
+    @classmethod
+    def from_settings(cls, options):
+        return cls(
+            options.get('SERIALIZER', 'json'), options.get('COMPRESSOR'),
+            options.get('THRESHOLD', DEFAULT_THRESHOLD), options.get('LEVEL'),
+        )
+
+    def encode(self, value):
+        data = self.serializer.dumps(value)
+        compressor = 0
+        if self.compressor and len(data) >= self.threshold:
+            compressed = self.compressor.compress(data)
+            # incompressible payloads are stored as they are
+            if len(compressed) < len(data):
+                data, compressor = compressed, self.compressor.id
+        return bytes((MAGIC, self.serializer.id, compressor)) + data
+
+
+def is_framed(data):
+    return isinstance(data, (bytes, bytearray, memoryview)) and len(data) >= 3 and data[0] == MAGIC
+
+
+def decode(data):
+    # trusted data only (the benchmark's own payloads), values read from Redis go through readable() first
+    payload = bytes(data[3:])
+    if data[2]:
+        payload = _reader(COMPRESSORS, data[2]).decompress(payload)
+    return _reader(SERIALIZERS, data[1]).loads(payload)
+
+
+_codecs = {}
+_readable = {}
+
+
+def readable(data):
+    """Whether the header of a framed value names a serializer and a compressor CACHE_CODECS uses."""
+    if not _readable:
+        configured = [{'SERIALIZER': 'json'}, *getattr(settings, 'CACHE_CODECS', {}).values()]
+        _readable['serializers'] = {SERIALIZERS[options.get('SERIALIZER', 'json')].id for options in configured}
+        _readable['compressors'] = {0} | {COMPRESSORS[options['COMPRESSOR']].id
+                                          for options in configured if options.get('COMPRESSOR')}
+    return data[1] in _readable['serializers'] and data[2] in _readable['compressors']
+
+
+def codec_named(name):
+    if name not in _codecs:
+        _codecs[name] = Codec.from_settings(getattr(settings, 'CACHE_CODECS', {}).get(name, {}))
+    return _codecs[name]
+
+
+def codec_for(key):
+    from .cache_metrics import key_family
+
+    family = key_family(str(key))
+    return codec_named(family if family in getattr(settings, 'CACHE_CODECS', {}) else 'DEFAULT')
+
+
+@receiver(setting_changed)
+def reset_codecs(setting, **kwargs):
+    if setting == 'CACHE_CODECS':
+        _codecs.clear()
+        _readable.clear()
+
+
+class CodecClient(DefaultClient):
+    def __init__(self, server, params, backend):
+        super().__init__(server, params, backend)
+        self._writing = threading.local()
+        # a misconfigured codec fails at startup rather than on the first write
+        for name in getattr(settings, 'CACHE_CODECS', {}):
+            codec_named(name)
+
+    def set(self, key, value, *args, **kwargs):
+        # set_many, add and get_or_set all write through here, the key picks the codec
+        self._writing.key = key
+        try:
+            return super().set(key, value, *args, **kwargs)
+        finally:
+            self._writing.key = None
+
+    def encode(self, value):
+        if isinstance(value, int) and not isinstance(value, bool):
+            # stored as is so INCR keeps working
+            return value
+        return codec_for(getattr(self._writing, 'key', None) or '').encode(value)
+
+    def decode(self, value):
+        if is_framed(value):
+            # a codec this deployment does not write with: a miss, never a decode
+            return decode(value) if readable(value) else None
+        return super().decode(value)
@@ -0,0 +1,317 @@
+"""
+Cache instrumentation.
+
+InstrumentedRedisCache / InstrumentedLocMemCache count, per cache and key family, hits, misses,
+errors, bytes read and written and the latency of every call. Counters are kept per process and
+added to one Redis hash every FLUSH_INTERVAL seconds, so recording costs no round trip.
+inspect_keys() walks the key space of a django-redis cache for the admin inspector.
+"""
+import threading
+import time
+from collections import defaultdict
+from fnmatch import fnmatchcase
+
+from django.conf import settings
+from django.core.cache.backends.locmem import LocMemCache
+from django_redis.cache import RedisCache
+from django_redis.exceptions import ConnectionInterrupted
+from redis.exceptions import RedisError
+
+from .cache_codecs import CodecClient
+
+
+FAMILIES = [
+    'admin:dashboard:*',
+    'admin:faculty:*', 'admin:students:*', 'admin:programs:*', 'admin:courses:*',
+    'admin:semesters:*', 'admin:allocations:*', 'admin:enrollments:*',
+    'admin:*',
+    'faculty:dashboard:*', 'faculty:*:allocations', 'faculty:*:*:assessments', 'faculty:*',
+    'student:dashboard:*', 'student:*',
+    'compiler:result:*', 'compiler:*',
+    'cache:rebuild:*', 'tag:*', 'version:*', 'reference:*',
+]
+
+METRICS_KEY = 'cache:metrics'
+FLUSH_INTERVAL = 5
+# latency histogram upper bounds, in milliseconds
+BUCKETS = [1, 5, 10, 50, 100, 500]
+
+
+def key_family(key):
+    for pattern in getattr(settings, 'CACHE_KEY_FAMILIES', FAMILIES):
+        if fnmatchcase(key, pattern):
+            return pattern
+    return 'other'
+
+
+class MetricsRecorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = defaultdict(float)
+        self._flushed_at = time.monotonic()
+        self._bytes = threading.local()
+
+    def count_bytes(self, direction, size):
+        # called by InstrumentedClient while a recorded call is in flight
+        setattr(self._bytes, direction, getattr(self._bytes, direction, 0) + size)
+
+    def start(self):
+        self._bytes.read = self._bytes.written = 0
+        return time.perf_counter()
+
+    def record(self, cache_name, keys, started, hits=0, misses=0, errors=0, writes=0, deletes=0):
+        milliseconds = (time.perf_counter() - started) * 1000
+        bucket = next((f'le_{bound}ms' for bound in BUCKETS if milliseconds <= bound), 'le_inf')
+        families = {key_family(key) for key in keys} or {'other'}
+        # a multi-key call is charged to every family it touched
+        share = 1 / len(families)
+        values = {
+            'hits': hits, 'misses': misses, 'errors': errors, 'writes': writes, 'deletes': deletes,
+            'bytes_read': getattr(self._bytes, 'read', 0), 'bytes_written': getattr(self._bytes, 'written', 0),
+        }
+        with self._lock:
+            for family in families:
+                prefix = f'{cache_name}|{family}|'
+                self._pending[prefix + 'calls'] += share
+                self._pending[prefix + 'milliseconds'] += milliseconds * share
+                self._pending[prefix + bucket] += share
+                for name, value in values.items():
+                    if value:
+                        self._pending[prefix + name] += value * share
+            due = time.monotonic() - self._flushed_at >= FLUSH_INTERVAL
+        if due:
+            self.flush()
+
+    def pending(self):
+        with self._lock:
+            return dict(self._pending)
+
+    def flush(self):
+        from .caching import redis_client
+
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(float)
+            self._flushed_at = time.monotonic()
+        client = redis_client()
+        if client is None or not pending:
+            # nothing shared to write to: keep counting in this process
+            with self._lock:
+                for field, value in pending.items():
+                    self._pending[field] += value
+            return
+        try:
+            pipeline = client.pipeline(transaction=False)
+            for field, value in pending.items():
+                pipeline.hincrbyfloat(METRICS_KEY, field, value)
+            pipeline.execute()
+        except RedisError:
+            pass
+
+    def snapshot(self):
+        """{cache: {family: counters}}, flushed totals plus what this process has not flushed yet."""
+        from .caching import redis_client
+
+        totals = defaultdict(float)
+        client = redis_client()
+        if client is not None:
+            try:
+                for field, value in client.hgetall(METRICS_KEY).items():
+                    totals[field.decode()] += float(value)
+            except RedisError:
+                pass
+        for field, value in self.pending().items():
+            totals[field] += value
+
+        data = defaultdict(dict)
+        for field, value in totals.items():
+            cache_name, family, name = field.split('|')
+            data[cache_name].setdefault(family, {})[name] = round(value, 3)
+        for families in data.values():
+            for counters in families.values():
+                lookups = counters.get('hits', 0) + counters.get('misses', 0)
+                counters['hit_rate'] = round(counters.get('hits', 0) / lookups, 4) if lookups else None
+                calls = counters.get('calls', 0)
+                counters['average_ms'] = round(counters.get('milliseconds', 0) / calls, 3) if calls else None
+        return dict(data)
+
+    def reset(self):
+        from .caching import redis_client
+
+        with self._lock:
+            self._pending = defaultdict(float)
+        client = redis_client()
+        if client is not None:
+            try:
+                client.delete(METRICS_KEY)
+            except RedisError:
+                pass
+
+
+recorder = MetricsRecorder()
+
+
+class _Ignored(Exception):
+    """A backend error the cache is configured to swallow (IGNORE_EXCEPTIONS)."""
+
+
+_MISSING = object()
+
+
+class InstrumentedCacheMixin:
+    def __init__(self, server, params):
+        super().__init__(server, params)
+        self.metrics_name = params.get('METRICS_NAME') or self.key_prefix or 'default'
+
+    def _raw(self, name, *args, **kwargs):
+        return getattr(super(), name)(*args, **kwargs)
+
+    def _run(self, name, keys, fallback, *args, **kwargs):
+        """(result, failed): swallowed errors come back as fallback, other errors are recorded and raised."""
+        started = recorder.start()
+        try:
+            return self._raw(name, *args, **kwargs), started, False
+        except _Ignored:
+            recorder.record(self.metrics_name, keys, started, errors=1)
+            return fallback, started, True
+        except Exception:
+            recorder.record(self.metrics_name, keys, started, errors=1)
+            raise
+
+    def get(self, key, default=None, version=None):
+        value, started, failed = self._run('get', [key], _MISSING, key, _MISSING, version)
+        if not failed:
+            hit = value is not _MISSING
+            recorder.record(self.metrics_name, [key], started, hits=int(hit), misses=int(not hit))
+        return default if value is _MISSING else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        values, started, failed = self._run('get_many', keys, {}, keys, version)
+        if not failed:
+            recorder.record(self.metrics_name, keys, started, hits=len(values), misses=len(keys) - len(values))
+        return values
+
+    def set(self, key, value, timeout=_MISSING, version=None):
+        kwargs = {} if timeout is _MISSING else {'timeout': timeout}
+        result, started, failed = self._run('set', [key], None, key, value, version=version, **kwargs)
+        if not failed:
+            recorder.record(self.metrics_name, [key], started, writes=1)
+        return result
+
+    def add(self, key, value, timeout=_MISSING, version=None):
+        kwargs = {} if timeout is _MISSING else {'timeout': timeout}
+        result, started, failed = self._run('add', [key], None, key, value, version=version, **kwargs)
+        if not failed:
+            recorder.record(self.metrics_name, [key], started, writes=int(bool(result)))
+        return result
+
+    def set_many(self, data, timeout=_MISSING, version=None):
+        kwargs = {} if timeout is _MISSING else {'timeout': timeout}
+        result, started, failed = self._run('set_many', list(data), [], data, version=version, **kwargs)
+        if not failed:
+            recorder.record(self.metrics_name, list(data), started, writes=len(data))
+        return result
+
+    def delete(self, key, version=None):
+        result, started, failed = self._run('delete', [key], False, key, version=version)
+        if not failed:
+            recorder.record(self.metrics_name, [key], started, deletes=int(bool(result)))
+        return result
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        result, started, failed = self._run('delete_many', keys, None, keys, version=version)
+        if not failed:
+            recorder.record(self.metrics_name, keys, started, deletes=len(keys))
+        return result
+
+
+class InstrumentedLocMemCache(InstrumentedCacheMixin, LocMemCache):
+    pass
+
+
+class InstrumentedRedisCache(InstrumentedCacheMixin, RedisCache):
+    # RedisCache swallows errors inside each method; calling the client directly lets them be counted
+
+    def _raw(self, name, *args, **kwargs):
+        try:
+            return getattr(self.client, name)(*args, **kwargs)
+        except ConnectionInterrupted as error:
+            if self._ignore_exceptions:
+                raise _Ignored from error
+            raise error.__cause__
+
+    def get(self, key, default=None, version=None, client=None):
+        return super().get(key, default, version)
+
+
+class InstrumentedClient(CodecClient):
+    def encode(self, value):
+        data = super().encode(value)
+        if isinstance(data, bytes):
+            recorder.count_bytes('written', len(data))
+        return data
+
+    def decode(self, value):
+        if isinstance(value, bytes):
+            recorder.count_bytes('read', len(value))
+        return super().decode(value)
+
+
+TTL_BUCKETS = [(60, '<1m'), (600, '<10m'), (3600, '<1h'), (86400, '<1d')]
+
+
+def inspect_keys(alias='default', max_keys=10000, batch=500):
+    """
+    Key counts, memory and TTL distribution per family of a django-redis cache, from at most max_keys
+    keys (SCAN, then MEMORY USAGE and TTL pipelined per batch). None for other backends.
+    """
+    from django.core.cache import caches
+
+    backend = caches[alias]
+    if not isinstance(backend, RedisCache):
+        return None
+    client = backend.client.get_client(write=False)
+    pattern = backend.make_key('*')
+    # make_key('x') == '<prefix>:<version>:x'
+    strip = len(backend.make_key(''))
+
+    families = defaultdict(lambda: {'keys': 0, 'bytes': 0, 'ttl': defaultdict(int)})
+    scanned = 0
+    keys = []
+
+    def collect(keys):
+        pipeline = client.pipeline(transaction=False)
+        for key in keys:
+            pipeline.memory_usage(key)
+            pipeline.ttl(key)
+        results = pipeline.execute()
+        for index, key in enumerate(keys):
+            memory, ttl = results[2 * index], results[2 * index + 1]
+            family = families[key_family(key.decode()[strip:])]
+            family['keys'] += 1
+            family['bytes'] += memory or 0
+            if ttl < 0:
+                family['ttl']['none'] += 1
+            else:
+                family['ttl'][next((label for bound, label in TTL_BUCKETS if ttl < bound), '>=1d')] += 1
+
+    try:
+        for key in client.scan_iter(match=pattern, count=batch):
+            keys.append(key)
+            scanned += 1
+            if len(keys) >= batch:
+                collect(keys)
+                keys = []
+            if scanned >= max_keys:
+                break
+        if keys:
+            collect(keys)
+    except RedisError as error:
+        return {'error': str(error)}
+
+    return {
+        'scanned': scanned,
+        'complete': scanned < max_keys,
+        'families': {name: {**values, 'ttl': dict(values['ttl'])} for name, values in sorted(families.items())},
+    }
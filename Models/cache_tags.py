@@ -0,0 +1,133 @@
+"""
+Dependency tags for cached values.
+
+A value is written with the tags of the data it was built from: a table ('Enrollment'), a row
+('Enrollment:12') or the rows sharing a foreign key ('Enrollment:student_id=NUM-BSCS-2023-02').
+Each tag keeps the set of keys that depend on it. Models.signals invalidates instance_tags() on
+every save and delete, which drops exactly the keys tagged with that row, its table or one of its
+foreign keys (old and new values).
+
+A reader that built its value from rows read before a write, and stores it after that write's
+invalidation, still caches stale data until the next invalidation of one of its tags; cached
+views keep short timeouts for that reason.
+"""
+from django.core.cache import cache, caches
+from redis.exceptions import RedisError
+
+from .caching import redis_client
+
+
+TAG_PREFIX = 'tag'
+# a tag outlives every key registered on it
+TAG_TIMEOUT = 60 * 60 * 24
+
+
+def tag(model, pk=None, **lookup):
+    name = model.__name__
+    if lookup:
+        (field, value), = lookup.items()
+        return f'{name}:{field}={value}'
+    if pk is not None:
+        return f'{name}:{pk}'
+    return name
+
+
+def tags_for(model, field, values):
+    return [tag(model, **{field: value}) for value in values]
+
+
+def _tag_key(name):
+    return f'{TAG_PREFIX}:{name}'
+
+
+def _register(member, tags):
+    # False when the key could not be recorded: the value must not be cached then, nothing would invalidate it
+    client = redis_client()
+    if client is None:
+        for name in tags:
+            members = cache.get(_tag_key(name)) or []
+            if member not in members:
+                cache.set(_tag_key(name), members + [member], timeout=TAG_TIMEOUT)
+        return True
+
+    try:
+        pipeline = client.pipeline()
+        for name in tags:
+            pipeline.sadd(cache.make_key(_tag_key(name)), member)
+            pipeline.expire(cache.make_key(_tag_key(name)), TAG_TIMEOUT)
+        pipeline.execute()
+    except RedisError:
+        return False
+    return True
+
+
+def set_tagged(key, value, timeout, tags, alias='default'):
+    # the registry lives in the default cache, its members say which cache holds the key.
+    # The value is written first: an invalidation landing in between leaves it tagged, so the next one drops it
+    caches[alias].set(key, value, timeout=timeout)
+    if not _register(f'{alias}|{key}', set(tags)):
+        caches[alias].delete(key)
+
+
+def _untag(tagged):
+    # removes only the members that were read, a key registered meanwhile stays tagged
+    client = redis_client()
+    if client is None:
+        for name, members in tagged.items():
+            left = [member for member in cache.get(_tag_key(name)) or [] if member not in members]
+            if left:
+                cache.set(_tag_key(name), left, timeout=TAG_TIMEOUT)
+            else:
+                cache.delete(_tag_key(name))
+        return
+    try:
+        pipeline = client.pipeline()
+        for name, members in tagged.items():
+            if members:
+                pipeline.srem(cache.make_key(_tag_key(name)), *members)
+        pipeline.execute()
+    except RedisError:
+        pass
+
+
+def invalidate_tags(tags):
+    tags = sorted(set(tags))
+    client = redis_client()
+    if client is None:
+        found = cache.get_many([_tag_key(name) for name in tags])
+        tagged = {name: set(found.get(_tag_key(name)) or []) for name in tags}
+    else:
+        try:
+            pipeline = client.pipeline()
+            for name in tags:
+                pipeline.smembers(cache.make_key(_tag_key(name)))
+            tagged = {
+                name: {member.decode() for member in each}
+                for name, each in zip(tags, pipeline.execute())
+            }
+        except RedisError:
+            return set()
+    members = set().union(*tagged.values())
+
+    keys = {}
+    for member in members:
+        alias, _, key = member.partition('|')
+        keys.setdefault(alias, []).append(key)
+    for alias, each in keys.items():
+        caches[alias].delete_many(each)
+    _untag(tagged)
+    return members
+
+
+def instance_tags(instance):
+    model = type(instance)
+    tags = {tag(model), tag(model, instance.pk)}
+    old_values = getattr(instance, '_old_values', {})
+    for field in model._meta.concrete_fields:
+        if not field.is_relation:
+            continue
+        tags.add(tag(model, **{field.name: getattr(instance, field.attname)}))
+        old = old_values.get(field.name)
+        if old is not None:
+            tags.add(tag(model, **{field.name: getattr(old, 'pk', old)}))
+    return tags
@@ -0,0 +1,332 @@
+import hashlib
+import json
+import threading
+import time
+from itertools import combinations, groupby, product
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+LIST_CACHE_TIMEOUT = 60 * 10
+# past its timeout a list is stale: still served for this long while one background rebuild refreshes it
+LIST_STALE_TIMEOUT = 60 * 10
+REBUILD_LOCK_TIMEOUT = 60
+REBUILD_WAIT = 2
+# instances serialized and written per batch by the warmers
+WARM_CHUNK_SIZE = 200
+
+
+def redis_client():
+    try:
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+    except (ImportError, NotImplementedError):
+        # not a django-redis backend, entries only expire by TTL
+        return None
+
+
+def list_cache_key(prefix, filters=None):
+    # one key per filter combination, independent of the order of the query parameters; the raw values
+    # are hashed, they may hold ':', spaces or anything else that would break out of the key family
+    if not filters:
+        return f'{prefix}:all'
+    pairs = json.dumps([[field, str(filters[field])] for field in sorted(filters)])
+    return f'{prefix}:f:{hashlib.sha1(pairs.encode()).hexdigest()}'
+
+
+def row_key(prefix, pk):
+    return f'{prefix}:row:{pk}'
+
+
+def chunk_size():
+    return settings.REST_FRAMEWORK.get('PAGE_SIZE') or 10
+
+
+class CacheMiss(Exception):
+    pass
+
+
+class CachedList:
+    """
+    Read side of a list stored by store_list(). The key holds {'count', 'chunk_size', 'rows'}, the
+    ordered ids sit in chunk_size slices under key:ids:<n> and every row once under rows:row:<pk>.
+    A slice fetches the id chunks it covers, then all of its rows with a single MGET.
+    """
+
+    def __init__(self, key, meta):
+        self.key = key
+        self.meta = meta
+
+    def count(self):
+        return self.meta['count']
+
+    @property
+    def is_stale(self):
+        return time.time() > self.meta.get('fresh_until', 0)
+
+    def __len__(self):
+        return self.meta['count']
+
+    def _ids_key(self, index):
+        return f'{self.key}:ids:{index}'
+
+    def ids(self, start, stop):
+        size = self.meta['chunk_size']
+        indexes = range(start // size, (stop - 1) // size + 1)
+        chunks = cache.get_many([self._ids_key(index) for index in indexes])
+        ids = []
+        for index in indexes:
+            chunk = chunks.get(self._ids_key(index))
+            if chunk is None:
+                # evicted independently of the meta key
+                raise CacheMiss(self.key)
+            ids.extend(chunk)
+        offset = indexes[0] * size
+        return ids[start - offset:stop - offset]
+
+    def __getitem__(self, item):
+        if isinstance(item, int):
+            return self[item:item + 1][0]
+
+        start, stop, step = item.indices(len(self))
+        if start >= stop:
+            return []
+        ids = self.ids(start, stop)[::step]
+        keys = [row_key(self.meta['rows'], pk) for pk in ids]
+        rows = cache.get_many(keys)
+        if len(rows) != len(keys):
+            raise CacheMiss(self.key)
+        return [rows[key] for key in keys]
+
+    def __iter__(self):
+        return iter(self[:])
+
+
+def store_rows(prefix, rows, timeout=LIST_CACHE_TIMEOUT + LIST_STALE_TIMEOUT):
+    # rows: {pk: serialized row}
+    cache.set_many({row_key(prefix, pk): row for pk, row in rows.items()}, timeout=timeout)
+
+
+def store_list(key, ids, rows_prefix, timeout=LIST_CACHE_TIMEOUT, stale_timeout=LIST_STALE_TIMEOUT):
+    size = chunk_size()
+    ids = list(ids)
+    chunks = {f'{key}:ids:{index // size}': ids[index:index + size] for index in range(0, len(ids), size)}
+    cache.set_many(chunks, timeout=timeout + stale_timeout)
+    # written last, a reader never sees a count without its ids
+    meta = {'count': len(ids), 'chunk_size': size, 'rows': rows_prefix, 'fresh_until': time.time() + timeout}
+    cache.set(key, meta, timeout=timeout + stale_timeout)
+
+
+def get_list(key):
+    meta = cache.get(key)
+    if not isinstance(meta, dict):
+        return None
+    return CachedList(key, meta)
+
+
+def serialize_rows(queryset, pks, serializer_class, context):
+    instances = list(queryset.filter(pk__in=pks))
+    data = serializer_class(instances, many=True, context=context).data
+    return {instance.pk: row for instance, row in zip(instances, data)}
+
+
+def fill_list_cache(prefix, filters, queryset, serializer_class, context, timeout=LIST_CACHE_TIMEOUT,
+                    refresh_rows=False, filtered=False):
+    """
+    Store the ids of the queryset narrowed by filters under its canonical key, serializing only the
+    rows that are not cached yet (all of them with refresh_rows). Both the warm-up tasks and the list
+    views on a cache miss fill the cache through here. filtered: the queryset is narrowed already (a
+    filterset's qs), filters only name the key.
+    """
+    if filters and not filtered:
+        queryset = queryset.filter(**filters)
+        if any('__' in field for field in filters):
+            queryset = queryset.distinct()
+    pks = list(queryset.values_list('pk', flat=True))
+
+    rows = {}
+    if not refresh_rows:
+        cached = cache.get_many([row_key(prefix, pk) for pk in pks])
+        rows = {pk: cached[row_key(prefix, pk)] for pk in pks if row_key(prefix, pk) in cached}
+    missing = [pk for pk in pks if pk not in rows]
+    if missing:
+        serialized = serialize_rows(queryset, missing, serializer_class, context)
+        store_rows(prefix, serialized, timeout=timeout + LIST_STALE_TIMEOUT)
+        rows.update(serialized)
+
+    store_list(list_cache_key(prefix, filters), pks, prefix, timeout=timeout)
+    return [rows[pk] for pk in pks]
+
+
+def stream_rows(prefix, queryset, serializer_class, context, timeout=LIST_CACHE_TIMEOUT, chunk=None):
+    """
+    Serialize and store every row of the queryset, chunk instances at a time, so memory stays bounded
+    by the chunk rather than the table. Returns the ids in queryset order.
+    """
+    chunk = chunk or WARM_CHUNK_SIZE
+    pks = []
+    batch = []
+    for instance in queryset.iterator(chunk_size=chunk):
+        pks.append(instance.pk)
+        batch.append(instance)
+        if len(batch) == chunk:
+            _store_batch(prefix, batch, serializer_class, context, timeout)
+            batch = []
+    if batch:
+        _store_batch(prefix, batch, serializer_class, context, timeout)
+    return pks
+
+
+def _store_batch(prefix, instances, serializer_class, context, timeout):
+    data = serializer_class(instances, many=True, context=context).data
+    store_rows(prefix, {instance.pk: row for instance, row in zip(instances, data)},
+               timeout=timeout + LIST_STALE_TIMEOUT)
+
+
+def store_partitions(prefix, queryset, fields, timeout=LIST_CACHE_TIMEOUT, chunk=None):
+    """
+    Store the ids of every partition of the queryset by fields in one pass ordered by those fields,
+    each partition written as soon as its group closes. Partitions without rows are left to fill on
+    demand. Returns the number of partitions stored.
+    """
+    ordering = queryset.query.order_by or queryset.model._meta.ordering or ['pk']
+    rows = queryset.order_by(*fields, *ordering).values_list(*fields, 'pk')
+    if any('__' in field for field in fields):
+        rows = rows.distinct()
+
+    stored = 0
+    for values, group in groupby(rows.iterator(chunk_size=chunk or WARM_CHUNK_SIZE), key=lambda row: row[:-1]):
+        if None in values:
+            continue
+        store_list(list_cache_key(prefix, dict(zip(fields, values))), [row[-1] for row in group], prefix,
+                   timeout=timeout)
+        stored += 1
+    return stored
+
+
+def row_state(model, pk, fields):
+    """The values of the partition fields for one row, {field: set of values}, None when it does not exist."""
+    values = list(model.objects.filter(pk=pk).values('pk', *fields))
+    if not values:
+        return None
+    return {field: {each[field] for each in values} for field in fields}
+
+
+def partition_keys(prefix, fields, state, changed):
+    # every cached filter combination the row is a member of that involves a changed field
+    keys = set()
+    for size in range(1, len(fields) + 1):
+        for subset in combinations(fields, size):
+            if not changed.intersection(subset):
+                continue
+            for values in product(*(state[field] for field in subset)):
+                keys.add(list_cache_key(prefix, dict(zip(subset, values))))
+    return keys
+
+
+def update_row(prefix, queryset, pk, serializer_class, context, fields, before=None):
+    """
+    Rewrite the cached row and drop the partitions whose membership changed: on an update those for
+    the fields whose value moved, on a create or delete the full list and every partition of the row.
+    before is row_state() taken ahead of the write, None for a create.
+    """
+    after = row_state(queryset.model, pk, fields)
+    if after is None:
+        cache.delete(row_key(prefix, pk))
+    else:
+        store_rows(prefix, serialize_rows(queryset, [pk], serializer_class, context))
+
+    keys = set()
+    if before is None or after is None:
+        keys.add(list_cache_key(prefix))
+        changed = set(fields)
+    else:
+        changed = {field for field in fields if before[field] != after[field]}
+    for state in (before, after):
+        if state is not None:
+            keys |= partition_keys(prefix, fields, state, changed)
+    cache.delete_many(list(keys))
+    return keys
+
+
+def acquire_rebuild(key, timeout=REBUILD_LOCK_TIMEOUT):
+    # cache.add is atomic in Redis (SET NX). None means the cache is down: nobody can coordinate, go ahead.
+    return cache.add(f'{key}:rebuild', 1, timeout=timeout) is not False
+
+
+def release_rebuild(key):
+    cache.delete(f'{key}:rebuild')
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class Coalescer:
+    """Concurrent run(key, function) calls in this process share the result of the first one."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def run(self, key, function):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = function()
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+
+coalescer = Coalescer()
+
+
+def get_or_fill_list(key, build, refresh=None, wait=REBUILD_WAIT):
+    """
+    Return the cached list under key, building it at most once across workers.
+
+    build() fills the cache and returns the rows. A stale list is returned as is and refresh() is
+    called to rebuild it in the background; it must release_rebuild(key) when done. On a miss only
+    the lock holder builds, the others wait up to `wait` seconds for its result.
+    """
+
+    def load():
+        data = get_list(key)
+        if data is not None:
+            if data.is_stale and refresh is not None and acquire_rebuild(key):
+                refresh()
+            return data
+
+        if not acquire_rebuild(key):
+            deadline = time.monotonic() + wait
+            while time.monotonic() < deadline:
+                time.sleep(0.05)
+                data = get_list(key)
+                if data is not None:
+                    return data
+        try:
+            return build()
+        finally:
+            release_rebuild(key)
+
+    return coalescer.run(key, load)
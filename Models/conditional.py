@@ -0,0 +1,123 @@
+"""
+ETags for GET requests, computed before the view runs.
+
+Every table has a version token in the cache, replaced after each committed write (Models.signals).
+The ETag of a request hashes the tokens of the tables its view reads together with the caller's
+credentials, the path, the query string and the Accept header, so it costs one MGET and no query.
+"""
+import hashlib
+import uuid
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import Resolver404, resolve
+from rest_framework import serializers
+from rest_framework.generics import GenericAPIView
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+
+VERSION_PREFIX = 'version'
+
+_view_models = {}
+
+
+def all_models():
+    return {model.__name__ for model in apps.get_app_config('Models').get_models()} | {'User'}
+
+
+def bump_versions(names):
+    cache.set_many({f'{VERSION_PREFIX}:{name}': uuid.uuid4().hex for name in names}, timeout=None)
+
+
+def get_versions(names):
+    keys = {name: f'{VERSION_PREFIX}:{name}' for name in names}
+    versions = cache.get_many(keys.values())
+    missing = {key: uuid.uuid4().hex for key in keys.values() if key not in versions}
+    for key, token in missing.items():
+        # an unknown version is a fresh one: nobody can hold an ETag built from it
+        if cache.add(key, token, timeout=None) is False:
+            token = cache.get(key) or token
+        versions[key] = token
+    return [versions[keys[name]] for name in sorted(names)]
+
+
+def serializer_models(serializer_class):
+    """The models a serializer renders, None when it runs code that may read anything else."""
+    meta = getattr(serializer_class, 'Meta', None)
+    model = getattr(meta, 'model', None)
+    if model is None or getattr(meta, 'depth', 0):
+        return None
+    if serializer_class.to_representation is not serializers.ModelSerializer.to_representation:
+        return None
+
+    models = {model.__name__}
+    for field in serializer_class._declared_fields.values():
+        if isinstance(field, serializers.ListSerializer):
+            field = field.child
+        if isinstance(field, serializers.BaseSerializer):
+            nested = serializer_models(type(field))
+            if nested is None:
+                return None
+            models |= nested
+        elif isinstance(field, (serializers.SerializerMethodField, serializers.StringRelatedField)) \
+                or not type(field).__module__.startswith('rest_framework'):
+            return None
+    return models
+
+
+def view_models(view_class):
+    """
+    The tables behind a view: its etag_models, else what its serializer renders (every table when that
+    cannot be told). None for plain APIViews without etag_models, they get no ETag.
+    """
+    if view_class not in _view_models:
+        models = getattr(view_class, 'etag_models', None)
+        if models is None and issubclass(view_class, GenericAPIView):
+            serializer_class = getattr(view_class, 'serializer_class', None)
+            models = serializer_models(serializer_class) if serializer_class else None
+            models = models or all_models()
+        _view_models[view_class] = set(models) if models is not None else None
+    return _view_models[view_class]
+
+
+def request_scope(request):
+    # who is asking, without a query: the JWT's user, else a digest of the credentials sent
+    authorization = request.META.get('HTTP_AUTHORIZATION', '')
+    if authorization.startswith('Bearer '):
+        try:
+            token = AccessToken(authorization.split(' ', 1)[1])
+        except TokenError:
+            return None
+        return f'user:{token[api_settings.USER_ID_CLAIM]}'
+    credentials = authorization or request.COOKIES.get(settings.SESSION_COOKIE_NAME, '')
+    return hashlib.sha256(credentials.encode()).hexdigest() if credentials else 'anonymous'
+
+
+def request_etag(request):
+    try:
+        match = resolve(request.path_info)
+    except Resolver404:
+        return None
+    view_class = getattr(match.func, 'cls', None)
+    if view_class is None:
+        return None
+    models = view_models(view_class)
+    scope = request_scope(request)
+    if models is None or scope is None:
+        return None
+
+    query = '&'.join(sorted(f'{key}={value}' for key, values in request.GET.lists() for value in values))
+    parts = [scope, request.path, query, request.META.get('HTTP_ACCEPT', ''), *get_versions(models)]
+    return 'W/"%s"' % hashlib.sha256('|'.join(parts).encode()).hexdigest()[:32]
+
+
+def etag_matches(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    # weak comparison
+    candidates = [each.strip().removeprefix('W/') for each in header.split(',')]
+    return '*' in candidates or etag.removeprefix('W/') in candidates
@@ -0,0 +1,120 @@
+"""
+Denormalized row counts.
+
+Every counter of COUNTERS counts the rows of a model per value of a field path ('' for the whole
+table): the students of a class, the programs of a department... The signals in Models/signals.py
+move them with F() increments in the transaction of the write, so reading one is a primary key lookup
+instead of a COUNT. Bulk writes (update(), bulk_create()) send no signals: reconcile_counters(),
+run periodically, recounts everything and repairs the drift.
+"""
+from django.apps import apps as django_apps
+from django.db.models import Count, F
+from django.utils import timezone
+
+
+# name: (model, field path whose value keys the count, None for the whole table)
+COUNTERS = {
+    'students': ('Student', None),
+    'students.status': ('Student', 'status'),
+    'class.students': ('Student', 'class_id'),
+    'department.students': ('Student', 'program_id__department_id'),
+    'faculty': ('Faculty', None),
+    'department.faculty': ('Faculty', 'department_id'),
+    'programs': ('Program', None),
+    'department.programs': ('Program', 'department_id'),
+    'courses': ('Course', None),
+    'classes': ('Class', None),
+    'allocations': ('CourseAllocation', None),
+    'allocations.status': ('CourseAllocation', 'status'),
+    'enrollments': ('Enrollment', None),
+    'enrollments.status': ('Enrollment', 'status'),
+}
+
+
+def counters_of(model_name):
+    return [(name, path) for name, (model, path) in COUNTERS.items() if model == model_name]
+
+
+def counter_key(model, path, values):
+    """The key of a row in a counter from its field values (serialize_instance), None when it has none."""
+    if path is None:
+        return ''
+    field, _, rest = path.partition('__')
+    value = values.get(field)
+    if value is not None and rest:
+        # a related row's field, one lookup
+        related = model._meta.get_field(field).related_model
+        value = related.objects.filter(pk=value).values_list(rest, flat=True).first()
+    return None if value is None else str(value)
+
+
+def bump(name, key, delta):
+    from .models import Counter
+
+    lookup = {'name': name, 'key': key}
+    changes = {'value': F('value') + delta, 'updated_at': timezone.now()}
+    if not Counter.objects.filter(**lookup).update(**changes):
+        # the first row of this key: created at 0, a concurrent creation wins the unique constraint
+        Counter.objects.get_or_create(**lookup)
+        Counter.objects.filter(**lookup).update(**changes)
+
+
+def count_change(model, old_values, new_values):
+    """Moves the counters of a row written from old_values to new_values ({} for a create or a delete)."""
+    for name, path in counters_of(model.__name__):
+        field = path.partition('__')[0] if path else None
+        # an update that leaves the counted field alone moves nothing
+        if old_values and new_values and (path is None or old_values.get(field) == new_values.get(field)):
+            continue
+        old = counter_key(model, path, old_values) if old_values else None
+        new = counter_key(model, path, new_values) if new_values else None
+        if old == new:
+            continue
+        if old is not None:
+            bump(name, old, -1)
+        if new is not None:
+            bump(name, new, 1)
+
+
+def counts(*names):
+    """{name: {key: value}} of the counters, in one query."""
+    from .models import Counter
+
+    found = {name: {} for name in names}
+    for name, key, value in Counter.objects.filter(name__in=names).values_list('name', 'key', 'value'):
+        found[name][key] = value
+    return found
+
+
+def count(name, key='', lock=False):
+    # lock: hold the counter row until the end of the transaction, for numbering from it
+    from .models import Counter
+
+    queryset = Counter.objects.filter(name=name, key=str(key))
+    if lock:
+        queryset = queryset.select_for_update()
+    return queryset.values_list('value', flat=True).first() or 0
+
+
+def reconcile_counters(registry=django_apps):
+    """Recounts every counter from its table and fixes the ones that drifted, returns how many did."""
+    Counter = registry.get_model('Models', 'Counter')
+    repaired = 0
+    for name, (model_name, path) in COUNTERS.items():
+        queryset = registry.get_model('Models', model_name).objects.all()
+        if path is None:
+            actual = {'': queryset.count()}
+        else:
+            actual = {str(key): value for key, value in
+                      queryset.order_by().values(path).annotate(rows=Count('pk')).values_list(path, 'rows')
+                      if key is not None}
+        stored = dict(Counter.objects.filter(name=name).values_list('key', 'value'))
+        for key in actual.keys() | stored.keys():
+            value = actual.get(key, 0)
+            if stored.get(key) == value:
+                continue
+            # writes landing between the count and this update are caught by the next run
+            Counter.objects.update_or_create(name=name, key=key,
+                                             defaults={'value': value, 'updated_at': timezone.now()})
+            repaired += 1
+    return repaired
@@ -0,0 +1,150 @@
+"""
+Read replica routing.
+
+DATABASE_REPLICAS lists the aliases of DATABASES that replicate 'default'. Reads go to a replica only
+inside replica_reads(): ReplicaRoutingMiddleware opens it for GET, HEAD and OPTIONS requests and the
+cache prewarm for its warmers; everything else reads and writes 'default'. The first write inside the
+block pins the rest of it to the primary. A request that wrote pins the client's later requests for
+REPLICA_ROUTING['PIN_SECONDS'], so users read their own writes: by a cookie, and by a cache key for
+the authenticated user, which also covers token clients that drop cookies. The user is known only
+once the view authenticated it, so the reads made to authenticate may still go to a replica.
+
+A replica more than MAX_LAG_SECONDS behind, or whose lag cannot be read, is skipped until its next
+check, at most every LAG_CHECK_SECONDS per process. Locally any second alias (a SQLite file, a MySQL
+schema without replication) stands in for a replica; it does not replicate, so its lag is 0.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, connections
+
+
+DEFAULTS = {'MAX_LAG_SECONDS': 5, 'LAG_CHECK_SECONDS': 5, 'PIN_SECONDS': 10, 'PIN_COOKIE': 'db_primary'}
+
+_state = threading.local()
+_lag_checks = {}
+
+
+def routing_settings():
+    return {**DEFAULTS, **getattr(settings, 'REPLICA_ROUTING', {})}
+
+
+def replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+@contextmanager
+def replica_reads(enabled=True, request=None):
+    """Reads inside the block may go to a replica, until the first write or if request's user is pinned."""
+    previous = getattr(_state, 'scope', None)
+    _state.scope = scope = {'replica': enabled, 'wrote': False, 'request': request, 'user_id': None,
+                            'user_pinned': False, 'checking': False}
+    try:
+        yield scope
+    finally:
+        _state.scope = previous
+
+
+def _pin_key(user_id):
+    return f"{routing_settings()['PIN_COOKIE']}:{user_id}"
+
+
+def pin_user(user):
+    cache.set(_pin_key(user.pk), 1, timeout=routing_settings()['PIN_SECONDS'])
+
+
+def _user_pinned(scope):
+    request = scope['request']
+    # resolving a session user reads the database, and so comes back through the router
+    if request is None or scope['checking']:
+        return False
+    scope['checking'] = True
+    try:
+        user = getattr(request, 'user', None)
+        user_id = user.pk if user is not None and user.is_authenticated else None
+    finally:
+        scope['checking'] = False
+    if user_id is None:
+        return False
+    if scope['user_id'] != user_id:
+        scope['user_id'] = user_id
+        scope['user_pinned'] = cache.get(_pin_key(user_id)) is not None
+    return scope['user_pinned']
+
+
+def replica_lag(alias):
+    """Seconds the replica is behind its primary: 0 when the alias does not replicate, None when unreadable."""
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'mysql':
+                # SHOW REPLICA STATUS from MySQL 8.0.22, the older name before
+                for statement in ('SHOW REPLICA STATUS', 'SHOW SLAVE STATUS'):
+                    try:
+                        cursor.execute(statement)
+                        break
+                    except DatabaseError:
+                        continue
+                row = cursor.fetchone()
+                # no replication configured on this server
+                if row is None:
+                    return 0.0
+                status = dict(zip([column[0] for column in cursor.description], row))
+                lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+                return None if lag is None else float(lag)
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT pg_is_in_recovery(), '
+                               'EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())')
+                standby, lag = cursor.fetchone()
+                if not standby:
+                    return 0.0
+                return None if lag is None else float(lag)
+    except DatabaseError:
+        return None
+    return 0.0
+
+
+def is_current(alias):
+    options = routing_settings()
+    now = time.monotonic()
+    checked = _lag_checks.get(alias)
+    if checked is None or now - checked[0] >= options['LAG_CHECK_SECONDS']:
+        lag = replica_lag(alias)
+        checked = _lag_checks[alias] = (now, lag is not None and lag <= options['MAX_LAG_SECONDS'])
+    return checked[1]
+
+
+def reset_lag_checks():
+    _lag_checks.clear()
+
+
+class ReplicaRouter:
+    # explicit 'default' everywhere: left to Django, an instance read from a replica would be saved there
+    def db_for_read(self, model, **hints):
+        scope = getattr(_state, 'scope', None)
+        if scope is None or not scope['replica'] or scope['wrote'] or _user_pinned(scope):
+            return 'default'
+        current = [alias for alias in replicas() if is_current(alias)]
+        return random.choice(current) if current else 'default'
+
+    def db_for_write(self, model, **hints):
+        scope = getattr(_state, 'scope', None)
+        if scope is not None:
+            scope['wrote'] = True
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # the replicas hold the same rows as the primary
+        aliases = {'default', *replicas()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replicas():
+            return False
+        return None
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from Models.audit_archive import archive_audit_trail, archive_settings
+
+
+class Command(BaseCommand):
+    help = 'Move the audit trail rows older than the hot window into compressed segments in media storage.'
+
+    def add_arguments(self, parser):
+        options = archive_settings()
+        parser.add_argument('--hot-days', type=int, default=options['HOT_DAYS'],
+                            help='days of audit trail kept in the table')
+        parser.add_argument('--batch-size', type=int, default=options['BATCH_SIZE'], help='rows per batch')
+        parser.add_argument('--limit', type=int, help='stop after about this many rows')
+
+    def handle(self, *args, **options):
+        archived, segments = archive_audit_trail(options['hot_days'], options['batch_size'], options['limit'])
+        self.stdout.write(self.style.SUCCESS(f'{archived} audit rows archived into {segments} segments'))
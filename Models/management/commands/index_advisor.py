@@ -0,0 +1,82 @@
+import argparse
+import json
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from Models.query_shapes import QueryShapeRecorder, explain, suggest_indexes, time_shape
+
+
+class Command(BaseCommand):
+    help = (
+        'Record the query shapes of a test or benchmark run, then EXPLAIN them and propose composite indexes. '
+        '`index_advisor capture shapes.json --pytest AdminModule` or `--command prewarm_caches --workers 1`, '
+        'then `index_advisor advise shapes.json --explain --repeat 20`; run advise again after migrating to '
+        'compare timings.'
+    )
+
+    def add_arguments(self, parser):
+        commands = parser.add_subparsers(dest='action', required=True)
+
+        capture = commands.add_parser('capture', help='run tests or a management command and record its queries')
+        capture.add_argument('path', help='JSON file, shapes already in it are added up')
+        source = capture.add_mutually_exclusive_group(required=True)
+        source.add_argument('--pytest', nargs=argparse.REMAINDER, help='pytest arguments')
+        source.add_argument('--command', nargs=argparse.REMAINDER, help='management command and its arguments')
+
+        advise = commands.add_parser('advise', help='propose indexes for the recorded shapes')
+        advise.add_argument('path')
+        advise.add_argument('--top', type=int, default=15)
+        advise.add_argument('--explain', action='store_true', help='show the plan of the costliest shape per index')
+        advise.add_argument('--repeat', type=int, default=0, help='time that shape, median of this many runs')
+
+    def handle(self, *args, **options):
+        if options['action'] == 'capture':
+            self.capture(options)
+        else:
+            self.advise(options)
+
+    def capture(self, options):
+        recorder = QueryShapeRecorder()
+        if options['pytest'] is not None:
+            import pytest
+
+            class Plugin:
+                # the test database connection only exists once the session is set up
+                def pytest_runtest_setup(self, item):
+                    recorder.install()
+
+            pytest.main(options['pytest'], plugins=[Plugin()])
+        else:
+            if not options['command']:
+                raise CommandError('Name the management command to run')
+            recorder.install()
+            call_command(*options['command'])
+        total = recorder.merge(options['path'])
+        self.stdout.write(f'{len(recorder.shapes)} query shapes recorded, {total} in {options["path"]}')
+
+    def advise(self, options):
+        try:
+            with open(options['path']) as file:
+                shapes = json.load(file)
+        except FileNotFoundError:
+            raise CommandError(f'{options["path"]} does not exist, record it with `index_advisor capture`')
+
+        proposals = suggest_indexes(shapes)[:options['top']]
+        if not proposals:
+            self.stdout.write(self.style.SUCCESS('Every recorded WHERE clause is covered by an existing index'))
+        for proposal in proposals:
+            name = f'{proposal["table"][:12]}_{"_".join(proposal["columns"])[:16]}_idx'.lower()
+            self.stdout.write(self.style.MIGRATE_HEADING(
+                f'{proposal["table"]} ({", ".join(proposal["columns"])}): {proposal["calls"]} calls, '
+                f'{proposal["milliseconds"]:.1f} ms over {len(proposal["shapes"])} shapes'
+            ))
+            self.stdout.write(f'    models.Index(fields={proposal["fields"]}, name={name!r})')
+
+            costliest = max((shapes[key] for key in proposal['shapes']), key=lambda shape: shape['milliseconds'])
+            if options['explain']:
+                self.stdout.write(f'    {costliest["sql"][:300]}')
+                for line in explain(costliest):
+                    self.stdout.write(f'      {line}')
+            if options['repeat']:
+                self.stdout.write(f'    median {time_shape(costliest, options["repeat"]):.3f} ms')
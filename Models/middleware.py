@@ -1,3 +1,8 @@
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+
+from .conditional import etag_matches, request_etag
+from .db_routing import pin_user, replica_reads, routing_settings
 from .signals import set_current_request
 
 class AuditTrailMiddleware:
@@ -6,5 +11,56 @@ class AuditTrailMiddleware:
 
     def __call__(self, request):
         set_current_request(request)
+        try:
+            return self.get_response(request)
+        finally:
+            # the thread serves other requests next
+            set_current_request(None)
+
+
+class ConditionalGetMiddleware:
+    """Answers If-None-Match with 304 before the view runs, see Models/conditional.py."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if request.method not in ('GET', 'HEAD'):
+            return self.get_response(request)
+
+        etag = request_etag(request)
+        if etag is None:
+            return self.get_response(request)
+        if etag_matches(request, etag):
+            response = HttpResponseNotModified()
+            response['ETag'] = etag
+            return response
+
         response = self.get_response(request)
-        return response
\ No newline at end of file
+        if response.status_code == 200 and not response.has_header('ETag'):
+            response['ETag'] = etag
+            # revalidated on every use, never shared between users
+            patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """Safe requests read from a replica unless the client wrote recently, see Models/db_routing.py."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        options = routing_settings()
+        safe = request.method in ('GET', 'HEAD', 'OPTIONS') and options['PIN_COOKIE'] not in request.COOKIES
+        with replica_reads(safe, request) as scope:
+            response = self.get_response(request)
+        if scope['wrote']:
+            # the replicas may not have the write yet: this client reads the primary for a while
+            response.set_cookie(options['PIN_COOKIE'], '1', max_age=options['PIN_SECONDS'],
+                                httponly=True, samesite='Lax')
+            # set by the view's authentication, JWT included
+            user = getattr(request, 'user', None)
+            if user is not None and user.is_authenticated:
+                pin_user(user)
+        return response
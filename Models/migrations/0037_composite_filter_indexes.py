@@ -0,0 +1,47 @@
+# Generated by Django 5.2.4 on 2026-10-18 23:21
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Models', '0036_alter_class_program_id_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendance',
+            index=models.Index(fields=['student_id', 'lecture_id'], name='attendance_student_lecture_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='changerequest',
+            index=models.Index(fields=['target_faculty', 'status'], name='change_faculty_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='changerequest',
+            index=models.Index(fields=['target_student', 'status'], name='change_student_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='changerequest',
+            index=models.Index(fields=['target_allocation', 'status'], name='change_allocation_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='courseallocation',
+            index=models.Index(fields=['teacher_id', 'status'], name='allocation_teacher_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['student_id', 'status'], name='enrollment_student_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='semester',
+            index=models.Index(fields=['status', 'activation_deadline'], name='semester_status_deadline_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='student',
+            index=models.Index(fields=['program_id', 'status'], name='student_program_status_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 23:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Models', '0037_composite_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='audittrail',
+            index=models.Index(fields=['entity_name', 'time_stamp'], name='audit_entity_time_idx'),
+        ),
+    ]
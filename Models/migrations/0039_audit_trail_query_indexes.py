@@ -0,0 +1,71 @@
+# Generated by Django 5.2.4 on 2026-10-18 23:32
+
+import django.core.serializers.json
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Models', '0038_audit_entity_time_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditTrailEntity',
+            fields=[
+                ('audit', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='touched', serialize=False, to='Models.audittrail')),
+                ('entity_name', models.CharField(max_length=50)),
+                ('entity_pk', models.CharField(max_length=64)),
+            ],
+            options={
+                'db_table': 'auditTrailEntity',
+            },
+        ),
+        migrations.CreateModel(
+            name='AuditTrailField',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field_name', models.CharField(max_length=64)),
+            ],
+            options={
+                'db_table': 'auditTrailField',
+            },
+        ),
+        migrations.AlterField(
+            model_name='audittrail',
+            name='new_value',
+            field=models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True),
+        ),
+        migrations.AlterField(
+            model_name='audittrail',
+            name='old_value',
+            field=models.JSONField(blank=True, encoder=django.core.serializers.json.DjangoJSONEncoder, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='audittrail',
+            index=models.Index(fields=['userid', 'time_stamp'], name='audit_user_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='audittrail',
+            index=models.Index(fields=['action_type', 'time_stamp'], name='audit_action_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='audittrail',
+            index=models.Index(fields=['time_stamp'], name='audit_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='audittrailentity',
+            index=models.Index(fields=['entity_name', 'entity_pk'], name='audit_entity_pk_idx'),
+        ),
+        migrations.AddField(
+            model_name='audittrailfield',
+            name='audit',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='changed_fields', to='Models.audittrail'),
+        ),
+        migrations.AddConstraint(
+            model_name='audittrailfield',
+            constraint=models.UniqueConstraint(fields=('field_name', 'audit'), name='audit_field_unique'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.4 on 2026-10-18 23:37
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def count_rows(apps, schema_editor):
+    from Models.counters import reconcile_counters
+
+    reconcile_counters(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Models', '0039_audit_trail_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Counter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=40)),
+                ('key', models.CharField(blank=True, default='', max_length=64)),
+                ('value', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'counter',
+                'constraints': [models.UniqueConstraint(fields=('name', 'key'), name='counter_name_key_unique')],
+            },
+        ),
+        migrations.RunPython(count_rows, migrations.RunPython.noop),
+    ]
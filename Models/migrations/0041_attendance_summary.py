@@ -0,0 +1,36 @@
+# Generated by Django 5.2.4 on 2026-10-18 23:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def summarize_attendance(apps, schema_editor):
+    from Models.attendance import rebuild_attendance_summaries
+
+    rebuild_attendance_summaries(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Models', '0040_counter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceSummary',
+            fields=[
+                ('enrollment', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='attendance_summary', serialize=False, to='Models.enrollment')),
+                ('lectures_held', models.PositiveIntegerField(default=0)),
+                ('lectures_attended', models.PositiveIntegerField(default=0)),
+                ('percentage', models.PositiveSmallIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'attendanceSummary',
+                'indexes': [models.Index(fields=['percentage'], name='attendance_percentage_idx')],
+            },
+        ),
+        migrations.RunPython(summarize_attendance, migrations.RunPython.noop),
+    ]
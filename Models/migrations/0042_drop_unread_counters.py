@@ -0,0 +1,20 @@
+# Generated by Django 5.2.4 on 2026-10-19 00:21
+
+from django.db import migrations
+
+
+def drop_counters(apps, schema_editor):
+    # no longer in Models.counters.COUNTERS, reconcile_counters() would leave their rows behind
+    Counter = apps.get_model('Models', 'Counter')
+    Counter.objects.filter(name__in=['allocation.enrollments', 'allocation.lectures']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Models', '0041_attendance_summary'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_counters, migrations.RunPython.noop),
+    ]
@@ -2,6 +2,7 @@ import uuid
 
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
 from datetime import  datetime
 from django.utils import timezone
 from django.db.models import CheckConstraint, Q
@@ -66,12 +67,16 @@ class Semester(models.Model):
 
     class Meta:
         db_table = 'semester'
+        indexes = [
+            models.Index(fields=['status', 'activation_deadline'], name='semester_status_deadline_idx'),
+        ]
 
     def __str__(self):
-        class_id = self.semesterdetails_set.values_list('class_id', flat=True).first()
-        if class_id:
-            class_object = Class.objects.get(class_id=class_id)
-            class_name = f'{class_object.program_id.program_id} {class_object.batch_year}'
+        from .reference import reference_data
+
+        class_object = reference_data.semester_class(self.semester_id)
+        if class_object:
+            class_name = f"{class_object['program_id']} {class_object['batch_year']}"
             return f"{class_name}-0{self.semester_no}-{self.session}"
         else:
             return f"None-0{self.semester_no}-{self.session}"
@@ -124,6 +129,9 @@ class CourseAllocation(models.Model):
 
     class Meta:
         db_table = 'courseAllocation'
+        indexes = [
+            models.Index(fields=['teacher_id', 'status'], name='allocation_teacher_status_idx'),
+        ]
 
     def __str__(self):
         return f"[{self.course_code}_{self.teacher_id}_{self.session}]"
@@ -233,6 +241,25 @@ class Attendance(models.Model):
     class Meta:
         db_table = 'attendance'
         unique_together = (('attendance_date', 'student_id','lecture_id'),)
+        indexes = [
+            models.Index(fields=['student_id', 'lecture_id'], name='attendance_student_lecture_idx'),
+        ]
+
+class AttendanceSummary(models.Model):
+    # per enrollment, moved by every Attendance write, see Models/attendance.py
+    enrollment = models.OneToOneField('Enrollment', on_delete=models.CASCADE, primary_key=True,
+                                      related_name='attendance_summary')
+    lectures_held = models.PositiveIntegerField(default=0)
+    lectures_attended = models.PositiveIntegerField(default=0)
+    percentage = models.PositiveSmallIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'attendanceSummary'
+        indexes = [
+            models.Index(fields=['percentage'], name='attendance_percentage_idx'),
+        ]
+
 
 class Enrollment(models.Model):
     STATUS_CHOICES = [
@@ -250,6 +277,9 @@ class Enrollment(models.Model):
     class Meta:
         db_table = 'enrollment'
         unique_together = (('student_id', 'allocation_id'),)
+        indexes = [
+            models.Index(fields=['student_id', 'status'], name='enrollment_student_status_idx'),
+        ]
 
     def __str__(self):
         return f"{self.student_id}--{self.allocation_id}"
@@ -428,6 +458,9 @@ class Student(models.Model):
 
     class Meta:
         db_table = 'Student'
+        indexes = [
+            models.Index(fields=['program_id', 'status'], name='student_program_status_idx'),
+        ]
 
     def __str__(self):
         return f'{self.student_id.person_id}'
@@ -477,11 +510,56 @@ class AuditTrail(models.Model):
     time_stamp = models.DateTimeField(default=datetime.now)
     ip_address = models.CharField( max_length=45)
     user_agent = models.CharField(max_length=255)
-    old_value = models.JSONField(blank=True, null=True)
-    new_value = models.JSONField(blank=True, null=True)
+    old_value = models.JSONField(blank=True, null=True, encoder=DjangoJSONEncoder)
+    new_value = models.JSONField(blank=True, null=True, encoder=DjangoJSONEncoder)
 
     class Meta:
         db_table = 'auditTrail'
+        indexes = [
+            models.Index(fields=['entity_name', 'time_stamp'], name='audit_entity_time_idx'),
+            models.Index(fields=['userid', 'time_stamp'], name='audit_user_time_idx'),
+            models.Index(fields=['action_type', 'time_stamp'], name='audit_action_time_idx'),
+            models.Index(fields=['time_stamp'], name='audit_time_idx'),
+        ]
+
+
+class Counter(models.Model):
+    # denormalized row counts, see Models/counters.py
+    name = models.CharField(max_length=40)
+    key = models.CharField(max_length=64, blank=True, default='')
+    value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'counter'
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'key'], name='counter_name_key_unique'),
+        ]
+
+
+class AuditTrailEntity(models.Model):
+    # the record an audit row touched, its history is an index lookup instead of a scan of the JSON values
+    audit = models.OneToOneField(AuditTrail, on_delete=models.CASCADE, primary_key=True, related_name='touched')
+    entity_name = models.CharField(max_length=50)
+    entity_pk = models.CharField(max_length=64)
+
+    class Meta:
+        db_table = 'auditTrailEntity'
+        indexes = [
+            models.Index(fields=['entity_name', 'entity_pk'], name='audit_entity_pk_idx'),
+        ]
+
+
+class AuditTrailField(models.Model):
+    # one row per field an update changed
+    audit = models.ForeignKey(AuditTrail, on_delete=models.CASCADE, related_name='changed_fields')
+    field_name = models.CharField(max_length=64)
+
+    class Meta:
+        db_table = 'auditTrailField'
+        constraints = [
+            models.UniqueConstraint(fields=['field_name', 'audit'], name='audit_field_unique'),
+        ]
 
 
 
@@ -528,3 +606,8 @@ class ChangeRequest(models.Model):
 
     class Meta:
         db_table = 'change_request'
+        indexes = [
+            models.Index(fields=['target_faculty', 'status'], name='change_faculty_status_idx'),
+            models.Index(fields=['target_student', 'status'], name='change_student_status_idx'),
+            models.Index(fields=['target_allocation', 'status'], name='change_allocation_status_idx'),
+        ]
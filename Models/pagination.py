@@ -0,0 +1,188 @@
+"""
+Keyset pagination for large, append-heavy lists.
+
+Opt-in per view (pagination_class = KeysetPagination) and per request: a request with ?cursor= (empty
+for the first page) is paged on (ordering field, pk) with WHERE instead of OFFSET and without COUNT(*),
+so page N costs what page 1 does; the next/previous links carry opaque cursors. Requests without it
+keep the page number responses. ?count=approximate adds the row count from the table statistics.
+
+The ordering field is the view's keyset_ordering ('-pk' by default, '-requested_at' style for one field)
+or the request's ?ordering= when the view has an OrderingFilter; either must be a single non-null field
+of the model, other orderings are rejected with 400 rather than silently replaced. Cursors carry their
+ordering and only continue it. An index on (field, pk) keeps every page an index range scan.
+"""
+import base64
+import binascii
+import json
+from collections import OrderedDict
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DatabaseError, connections
+from django.db.models import Q
+from rest_framework import exceptions
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+def approximate_count(model, using='default'):
+    """Rows in the model's table according to the database statistics, None when it keeps none."""
+    connection = connections[using]
+    table = model._meta.db_table
+    queries = {
+        'mysql': ('SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() '
+                  'AND TABLE_NAME = %s', [table]),
+        'postgresql': ('SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(%s)', [table]),
+        # filled by ANALYZE: the first number of the table's stat is its row count
+        'sqlite': ('SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1', [table]),
+    }
+    if connection.vendor not in queries:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(*queries[connection.vendor])
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    if row is None or row[0] is None:
+        return None
+    count = int(str(row[0]).split()[0])
+    return count if count >= 0 else None
+
+
+class KeysetPagination(PageNumberPagination):
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Invalid cursor'
+    invalid_ordering_message = 'Paging by cursor orders by a single non-null field of the list.'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param not in request.query_params:
+            self.keyset = False
+            return super().paginate_queryset(queryset, request, view)
+
+        self.keyset = True
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.model = queryset.model
+        self.ordering = ordering = self.get_keyset_ordering(request, queryset, view)
+        self.descending = ordering.startswith('-')
+        self.field = ordering.lstrip('-')
+        self.queryset_is_filtered = bool(queryset.query.where)
+
+        cursor = self.decode_cursor(request.query_params[self.cursor_query_param])
+        backwards = cursor is not None and cursor['previous']
+        # walking backwards is the forward walk of the opposite ordering
+        descending = self.descending != backwards
+        prefix = '-' if descending else ''
+        queryset = queryset.order_by(f'{prefix}{self.field}', f'{prefix}pk')
+        if cursor is not None:
+            comparison = 'lt' if descending else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{self.field}__{comparison}': cursor['value']})
+                | Q(**{self.field: cursor['value'], f'pk__{comparison}': cursor['pk']})
+            )
+
+        rows = list(queryset[:self.page_size + 1])
+        more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if backwards:
+            rows.reverse()
+        self.has_next = more if not backwards else True
+        self.has_previous = cursor is not None and (more if backwards else True)
+        self.rows = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return super().get_paginated_response(data)
+
+        response = OrderedDict([('next', self.get_next_link()), ('previous', self.get_previous_link())])
+        if self.request.query_params.get(self.count_query_param) == 'approximate':
+            # statistics cover the table, not a filtered subset of it
+            response['approximate_count'] = None if self.queryset_is_filtered else approximate_count(self.model)
+        response['results'] = data
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema):
+        response = super().get_paginated_response_schema(schema)
+        response['properties']['approximate_count'] = {'type': 'integer', 'nullable': True}
+        return response
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters += [
+            {'name': self.cursor_query_param, 'required': False, 'in': 'query', 'schema': {'type': 'string'},
+             'description': 'Keyset cursor from a next/previous link, empty for the first page.'},
+            {'name': self.count_query_param, 'required': False, 'in': 'query', 'schema': {'type': 'string'},
+             'description': "'approximate' adds the row count from the table statistics."},
+        ]
+        return parameters
+
+    def get_keyset_ordering(self, request, queryset, view):
+        default = getattr(view, 'keyset_ordering', '-pk')
+        backend = next((backend() for backend in getattr(view, 'filter_backends', [])
+                        if issubclass(backend, OrderingFilter)), None)
+        param = request.query_params.get(backend.ordering_param, '') if backend else ''
+        requested = [field.strip() for field in param.split(',') if field.strip()]
+        if not requested:
+            return default
+        # OrderingFilter drops the fields it does not allow, paging by the rest would be another order
+        if len(requested) != 1 or backend.remove_invalid_fields(queryset, requested, view, request) != requested:
+            raise exceptions.ValidationError({backend.ordering_param: [self.invalid_ordering_message]})
+        name = requested[0].lstrip('-')
+        if name != 'pk':
+            try:
+                field = self.model._meta.get_field(name)
+            except FieldDoesNotExist:
+                field = None
+            # a NULL never compares, its rows would fall out of every page
+            if field is None or not field.concrete or field.null:
+                raise exceptions.ValidationError({backend.ordering_param: [self.invalid_ordering_message]})
+            # a foreign key by its column, not by the ordering of the related model
+            return requested[0].replace(name, field.attname)
+        return requested[0]
+
+    def encode_cursor(self, instance, previous):
+        value = getattr(instance, self.field)
+        value = getattr(value, 'pk', value)
+        payload = json.dumps({'v': value, 'pk': instance.pk, 'p': previous, 'o': self.ordering},
+                             cls=DjangoJSONEncoder)
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, encoded):
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded + '=' * (-len(encoded) % 4)))
+            # a cursor continues the ordering it was taken in
+            if payload['o'] != self.ordering:
+                raise ValueError(payload['o'])
+            field = self.model._meta.pk if self.field == 'pk' else self.model._meta.get_field(self.field)
+            if field.is_relation:
+                field = field.target_field
+            value = field.to_python(payload['v'])
+            return {'value': value, 'pk': self.model._meta.pk.to_python(payload['pk']), 'previous': bool(payload['p'])}
+        except (binascii.Error, ValueError, TypeError, KeyError, ValidationError) as error:
+            raise NotFound(self.invalid_cursor_message) from error
+
+    def _link(self, instance, previous):
+        url = remove_query_param(self.request.build_absolute_uri(), self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(instance, previous))
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if not self.has_next or not self.rows:
+            return None
+        return self._link(self.rows[-1], previous=False)
+
+    def get_previous_link(self):
+        if not self.keyset:
+            return super().get_previous_link()
+        if not self.has_previous or not self.rows:
+            return None
+        return self._link(self.rows[0], previous=True)
@@ -0,0 +1,188 @@
+"""
+Query shapes for the index advisor (manage.py index_advisor).
+
+QueryShapeRecorder is a database execute wrapper: it groups every SELECT by its SQL text with the
+parameters left out, counting calls and time and keeping one sample to EXPLAIN. suggest_indexes()
+reads the WHERE clauses of the recorded shapes and proposes, per table, a composite index of the
+columns compared for equality followed by at most one range column, unless an existing index
+already starts with them.
+"""
+import json
+import re
+import time
+from collections import defaultdict
+
+from django.apps import apps
+from django.db import connections
+
+
+# "table"."column" or `table`.`column`, then the comparison
+PREDICATE = re.compile(
+    r'["`](?P<table>\w+)["`]\.["`](?P<column>\w+)["`]\s*'
+    r'(?P<op>=|IN\s*\(|IS\s+NULL|IS\s+NOT\s+NULL|>=|<=|>|<|BETWEEN|LIKE)',
+    re.IGNORECASE,
+)
+IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+CLAUSE_END = re.compile(r'\b(GROUP BY|ORDER BY|LIMIT|HAVING)\b')
+EQUALITY = {'=', 'IN', 'IS NULL'}
+
+
+def normalize(sql):
+    # IN lists of any length are one shape
+    return IN_LIST.sub('IN (%s...)', sql)
+
+
+class QueryShapeRecorder:
+    def __init__(self):
+        self.shapes = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        if many or not sql.lstrip().upper().startswith('SELECT'):
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            shape = self.shapes.setdefault(normalize(sql), {
+                'count': 0, 'milliseconds': 0.0, 'sql': sql, 'params': list(params or ()),
+            })
+            shape['count'] += 1
+            shape['milliseconds'] += (time.perf_counter() - started) * 1000
+
+    def install(self, alias='default'):
+        # on the connection object of this thread, for every query from now on
+        wrappers = connections[alias].execute_wrappers
+        if self not in wrappers:
+            wrappers.append(self)
+
+    def merge(self, path):
+        try:
+            with open(path) as file:
+                saved = json.load(file)
+        except FileNotFoundError:
+            saved = {}
+        for key, shape in self.shapes.items():
+            if key in saved:
+                saved[key]['count'] += shape['count']
+                saved[key]['milliseconds'] += shape['milliseconds']
+            else:
+                saved[key] = shape
+        with open(path, 'w') as file:
+            # dates, decimals and UUIDs are kept as strings, the database compares them the same way
+            json.dump(saved, file, indent=1, default=str)
+        return len(saved)
+
+
+def where_clause(sql):
+    upper = sql.upper()
+    start = upper.find(' WHERE ')
+    if start == -1:
+        return ''
+    end = CLAUSE_END.search(upper, start)
+    return sql[start:end.start() if end else len(sql)]
+
+
+def predicates(sql):
+    """{table: [(column, 'equality' | 'range')]} in the order they appear in the WHERE clause."""
+    found = defaultdict(list)
+    for match in PREDICATE.finditer(where_clause(sql)):
+        op = ' '.join(match['op'].upper().rstrip('( ').split())
+        # IS NOT NULL and LIKE '%...%' (search) do not narrow an index scan
+        kind = 'equality' if op in EQUALITY else None if op in ('IS NOT NULL', 'LIKE') else 'range'
+        if kind and (match['column'], kind) not in found[match['table']]:
+            found[match['table']].append((match['column'], kind))
+    return found
+
+
+def candidate(columns, primary_key):
+    """(equality columns, range column or None) for an index serving these predicates."""
+    # equality columns in any order serve the same lookups: foreign keys first, they are the selective ones
+    equality = tuple(sorted({column for column, kind in columns if kind == 'equality'},
+                            key=lambda column: (not column.endswith('_id'), column)))
+    # every index entry already ends with the primary key
+    ranges = [column for column, kind in columns
+              if kind == 'range' and column not in equality and column != primary_key]
+    return equality, ranges[0] if ranges else None
+
+
+def existing_indexes(table, alias='default'):
+    """[(columns, unique)] of the indexes, unique constraints and primary key of the table."""
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+    return [(tuple(each['columns']), bool(each['unique'] or each['primary_key'])) for each in constraints.values()
+            if each['columns'] and (each['index'] or each['unique'] or each['primary_key'])]
+
+
+def is_covered(equality, range_column, existing):
+    for columns, unique in existing:
+        # equality on every column of a unique index already pins a single row
+        if unique and equality and set(columns) <= set(equality):
+            return True
+        if set(columns[:len(equality)]) != set(equality):
+            continue
+        if range_column is None or columns[len(equality):len(equality) + 1] == (range_column,):
+            return True
+    return False
+
+
+def model_for_table(table):
+    return next((model for model in apps.get_models() if model._meta.db_table == table), None)
+
+
+def field_names(model, columns):
+    by_column = {field.column: field.name for field in model._meta.concrete_fields}
+    return [by_column.get(column, column) for column in columns]
+
+
+def suggest_indexes(shapes, alias='default'):
+    """
+    Proposed indexes, most expensive first: [{'table', 'columns', 'fields', 'milliseconds', 'calls',
+    'shapes'}], where milliseconds and calls add up the recorded shapes that would use the index.
+    """
+    proposals = {}
+    covered = {}
+    for key, shape in shapes.items():
+        for table, columns in predicates(shape['sql']).items():
+            model = model_for_table(table)
+            # tables repeated in a join are aliased T2, T3...: their predicates are not attributed
+            if model is None:
+                continue
+            equality, range_column = candidate(columns, model._meta.pk.column)
+            index = equality + ((range_column,) if range_column else ())
+            if not index:
+                continue
+            if table not in covered:
+                covered[table] = existing_indexes(table, alias)
+            if is_covered(equality, range_column, covered[table]):
+                continue
+            proposal = proposals.setdefault((table, index), {
+                'table': table, 'columns': list(index), 'milliseconds': 0.0, 'calls': 0, 'shapes': [],
+            })
+            proposal['milliseconds'] += shape['milliseconds']
+            proposal['calls'] += shape['count']
+            proposal['shapes'].append(key)
+
+    for proposal in proposals.values():
+        proposal['fields'] = field_names(model_for_table(proposal['table']), proposal['columns'])
+    return sorted(proposals.values(), key=lambda each: each['milliseconds'], reverse=True)
+
+
+def explain(shape, alias='default'):
+    connection = connections[alias]
+    prefix = connection.ops.explain_query_prefix()
+    with connection.cursor() as cursor:
+        cursor.execute(f'{prefix} {shape["sql"]}', shape['params'])
+        return [' '.join(str(column) for column in row) for row in cursor.fetchall()]
+
+
+def time_shape(shape, repeat, alias='default'):
+    # median milliseconds of the sample query
+    samples = []
+    with connections[alias].cursor() as cursor:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            cursor.execute(shape['sql'], shape['params'])
+            cursor.fetchall()
+            samples.append((time.perf_counter() - started) * 1000)
+    return sorted(samples)[len(samples) // 2]
@@ -0,0 +1,101 @@
+"""
+Per-process copy of the small reference tables: departments, programs, courses, classes, semesters and
+the semester -> class mapping.
+
+Lookups are served from memory. Every process checks a version stamp in the shared cache at most once per
+CHECK_INTERVAL and reloads everything when it moved; Models.signals replaces the stamp on any write to
+these tables.
+"""
+import threading
+import time
+import uuid
+
+from django.core.cache import cache
+
+
+VERSION_KEY = 'reference:version'
+CHECK_INTERVAL = 1
+
+REFERENCE_MODELS = ('Department', 'Program', 'Course', 'Class', 'Semester', 'SemesterDetails')
+
+
+class ReferenceTables:
+    def __init__(self, departments, programs, courses, classes, semesters, semester_details):
+        self.departments = {each['department_id']: each for each in departments}
+        self.programs = {each['program_id']: each for each in programs}
+        self.courses = {each['course_code']: each for each in courses}
+        self.classes = {each['class_id']: each for each in classes}
+        self.semesters = {each['semester_id']: each for each in semesters}
+
+        self.course_prefixes = sorted({code.split('-')[0] for code in self.courses})
+        # the class a semester belongs to, its first details row like semesterdetails_set.first()
+        self.semester_classes = {}
+        for each in semester_details:
+            self.semester_classes.setdefault(each['semester_id'], each['class_id'])
+
+
+class ReferenceData:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._tables = None
+        self._version = None
+        self._checked_at = 0
+
+    def _current_version(self):
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            cache.add(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+            version = cache.get(VERSION_KEY)
+        return version
+
+    def _load(self):
+        from .models import Department, Program, Course, Class, Semester, SemesterDetails
+
+        return ReferenceTables(
+            departments=Department.objects.values('department_id', 'department_name', 'HOD'),
+            programs=Program.objects.values('program_id', 'program_name', 'department_id', 'total_semesters',
+                                            'fee_per_semester'),
+            courses=Course.objects.values('course_code', 'course_name', 'credit_hours', 'lab', 'pre_requisite'),
+            classes=Class.objects.values('class_id', 'program_id', 'batch_year'),
+            semesters=Semester.objects.values('semester_id', 'semester_no', 'status', 'session',
+                                              'activation_deadline', 'closing_deadline'),
+            semester_details=SemesterDetails.objects.order_by('id').values('semester_id', 'class_id'),
+        )
+
+    @property
+    def tables(self):
+        if self._tables is not None and time.monotonic() - self._checked_at < CHECK_INTERVAL:
+            return self._tables
+
+        with self._lock:
+            if self._tables is None or time.monotonic() - self._checked_at >= CHECK_INTERVAL:
+                version = self._current_version()
+                # no stamp means the cache is down: reload every interval rather than trust the copy
+                if self._tables is None or version is None or version != self._version:
+                    self._tables = self._load()
+                    self._version = version
+                self._checked_at = time.monotonic()
+        return self._tables
+
+    def invalidate(self):
+        cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        with self._lock:
+            self._tables = None
+
+    def course_prefixes(self):
+        return self.tables.course_prefixes
+
+    def semester_class(self, semester_id):
+        tables = self.tables
+        class_id = tables.semester_classes.get(semester_id)
+        return tables.classes.get(class_id)
+
+    def has_schedulable_semester(self):
+        # an inactive semester with a session and an activation deadline can still receive allocations
+        return any(
+            each['status'] == 'Inactive' and each['session'] is not None and each['activation_deadline'] is not None
+            for each in self.tables.semesters.values()
+        )
+
+
+reference_data = ReferenceData()
@@ -1,10 +1,17 @@
 import threading
+from django.db import transaction
+from django.db.models import FileField
 from django.db.models.signals import post_save, post_delete, pre_save
 from django.contrib.auth.signals import user_logged_in, user_logged_out
 from django.dispatch import receiver
 from django.utils import timezone
 from rest_framework.generics import get_object_or_404
 from .models import *
+from .cache_tags import instance_tags, invalidate_tags
+from .reference import REFERENCE_MODELS, reference_data
+from .conditional import bump_versions
+from .counters import count_change, counters_of
+from .attendance import attendance_change
 
 
 _thread_locals = threading.local()
@@ -27,18 +34,19 @@ def get_client_ip(request):
 
 
 def get_current_user_person(request):
-    if not request or not request.user.is_authenticated:
-        return None
-    try:
-        return get_object_or_404(Person, employee_id__user=request.user)
-    except Person.DoesNotExist:
+    # the Django request: DRF sets its user when it authenticates (JWT, token), before the view writes
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
         return None
+    return Person.objects.filter(user=user).first()
 
 def serialize_instance(instance):
 
     data = {}
     for field in instance._meta.fields:
-        data[field.name] = getattr(instance, field.name)
+        # foreign keys as their ids and files as their names, the values are stored as JSON
+        value = field.value_from_object(instance)
+        data[field.name] = value.name if isinstance(field, FileField) else value
     return data
 
 def get_changed_fields(old_values, new_values):
@@ -50,7 +58,7 @@ def get_changed_fields(old_values, new_values):
             changed[key] = {"old": old_val, "new": new_val}
     return changed
 
-def log_audit_trail(request, entity_name, action_type, old_values, new_values):
+def log_audit_trail(request, entity_name, action_type, old_values, new_values, entity_pk=None):
     user_person = get_current_user_person(request)
     if not user_person:
         return
@@ -58,7 +66,7 @@ def log_audit_trail(request, entity_name, action_type, old_values, new_values):
     ip_address = get_client_ip(request)
     user_agent = request.META.get('HTTP_USER_AGENT', '') if request else ''
 
-    AuditTrail.objects.create(
+    audit = AuditTrail.objects.create(
         userid=user_person,
         action_type=action_type,
         entity_name=entity_name,
@@ -68,6 +76,13 @@ def log_audit_trail(request, entity_name, action_type, old_values, new_values):
         old_value=old_values,
         new_value=new_values
     )
+    # bulk_create: the query index rows are neither audited nor cached themselves
+    if entity_pk is not None:
+        AuditTrailEntity.objects.bulk_create([
+            AuditTrailEntity(audit=audit, entity_name=entity_name, entity_pk=str(entity_pk))
+        ])
+    if action_type == "UPDATE":
+        AuditTrailField.objects.bulk_create([AuditTrailField(audit=audit, field_name=name) for name in new_values])
 
 
 @receiver(pre_save)
@@ -111,7 +126,8 @@ def log_create_update(sender, instance, created, **kwargs):
             entity_name=sender.__name__,
             action_type="CREATE",
             old_values={},
-            new_values=new_values
+            new_values=new_values,
+            entity_pk=instance.pk
         )
     else:
         old_values = getattr(instance, "_old_values", {})
@@ -122,7 +138,8 @@ def log_create_update(sender, instance, created, **kwargs):
                 entity_name=sender.__name__,
                 action_type="UPDATE",
                 old_values={k: v["old"] for k, v in changed_fields.items()},
-                new_values={k: v["new"] for k, v in changed_fields.items()}
+                new_values={k: v["new"] for k, v in changed_fields.items()},
+                entity_pk=instance.pk
             )
 
 
@@ -145,10 +162,55 @@ def log_delete(sender, instance, **kwargs):
         entity_name=sender.__name__,
         action_type="DELETE",
         old_values=old_values,
-        new_values={}
+        new_values={},
+        entity_pk=instance.pk
     )
 
 
 
+@receiver(post_save)
+@receiver(post_delete)
+def invalidate_dependent_caches(sender, instance, **kwargs):
+    if sender is User and kwargs.get('update_fields') != frozenset({'last_login'}):
+        transaction.on_commit(lambda: bump_versions(['User']))
+    if sender._meta.app_label != 'Models':
+        return
+    transaction.on_commit(lambda: bump_versions([sender.__name__]))
+    if sender in (AuditTrail, Counter):
+        return
+    # tags are taken now (a deleted instance loses its pk) and dropped after commit; a reader still holding the old
+    # rows can cache them again until the key times out or the tag is invalidated once more
+    tags = instance_tags(instance)
+    transaction.on_commit(lambda: invalidate_tags(tags))
+    if sender.__name__ in REFERENCE_MODELS:
+        transaction.on_commit(reference_data.invalidate)
+
+
+@receiver(post_save)
+def count_saved_rows(sender, instance, created, **kwargs):
+    # in the transaction of the write, see Models/counters.py
+    if sender._meta.app_label != 'Models' or not counters_of(sender.__name__):
+        return
+    if not created and not hasattr(instance, '_old_values'):
+        return
+    count_change(sender, {} if created else instance._old_values, serialize_instance(instance))
+
+
+@receiver(post_delete)
+def count_deleted_rows(sender, instance, **kwargs):
+    if sender._meta.app_label != 'Models' or not counters_of(sender.__name__):
+        return
+    count_change(sender, serialize_instance(instance), {})
+
+
+@receiver(post_save, sender=Attendance)
+def summarize_saved_attendance(sender, instance, created, **kwargs):
+    # the attendance summary of the enrollment, see Models/attendance.py
+    if not created and not hasattr(instance, '_old_values'):
+        return
+    attendance_change({} if created else instance._old_values, serialize_instance(instance))
 
 
+@receiver(post_delete, sender=Attendance)
+def summarize_deleted_attendance(sender, instance, **kwargs):
+    attendance_change(serialize_instance(instance), {})
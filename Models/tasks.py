@@ -0,0 +1,21 @@
+from celery import shared_task
+
+from .attendance import rebuild_attendance_summaries
+from .audit_archive import archive_audit_trail
+from .counters import reconcile_counters
+
+
+@shared_task
+def archive_audit_trail_task():
+    archived, segments = archive_audit_trail()
+    return f'{archived} audit rows archived into {segments} segments'
+
+
+@shared_task
+def reconcile_counters_task():
+    return f'{reconcile_counters()} counters repaired'
+
+
+@shared_task
+def rebuild_attendance_summaries_task():
+    return f'{rebuild_attendance_summaries()} attendance summaries rebuilt'
@@ -1,3 +1,279 @@
-from django.test import TestCase
+import pickle
 
-# Create your tests here.
+import pytest
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from Models.cache_codecs import CodecClient
+from Models.models import Course, Semester
+from Models.reference import reference_data
+
+
+@pytest.mark.django_db
+def test_reference_data_is_served_from_memory_until_a_write(locmem_caches, django_capture_on_commit_callbacks):
+    reference_data.invalidate()
+
+    semester = Semester.objects.filter(semesterdetails__isnull=False).first()
+    label = str(semester)
+    with CaptureQueriesContext(connection) as queries:
+        assert str(semester) == label
+        assert 'CSC' in reference_data.course_prefixes()
+    assert len(queries) == 0
+
+    assert 'ZZZ' not in reference_data.course_prefixes()
+    with django_capture_on_commit_callbacks(execute=True):
+        Course.objects.create(course_code='ZZZ-101', course_name='Test', credit_hours=3)
+    assert 'ZZZ' in reference_data.course_prefixes()
+    reference_data.invalidate()
+
+
+@pytest.mark.django_db
+def test_unchanged_lists_are_answered_with_304_without_queries(locmem_caches, django_capture_on_commit_callbacks):
+    from rest_framework.test import APIClient
+
+    client = APIClient()
+    assert client.login(username='rhays056@gmail.com', password='admin12345678')
+
+    first = client.get('/api/admin/courses/?page=2')
+    assert first.status_code == 200
+    etag = first['ETag']
+    with CaptureQueriesContext(connection) as queries:
+        second = client.get('/api/admin/courses/?page=2', HTTP_IF_NONE_MATCH=etag)
+    assert second.status_code == 304
+    assert len(queries) == 0
+
+    assert client.get('/api/admin/courses/?page=3', HTTP_IF_NONE_MATCH=etag).status_code == 200
+    with django_capture_on_commit_callbacks(execute=True):
+        Course.objects.create(course_code='ZZZ-101', course_name='Test', credit_hours=3)
+    assert client.get('/api/admin/courses/?page=2', HTTP_IF_NONE_MATCH=etag).status_code == 200
+    reference_data.invalidate()
+
+
+def test_cache_codec_is_chosen_per_key_family_and_read_back_from_the_header(settings):
+    settings.CACHE_CODECS = {
+        'DEFAULT': {'SERIALIZER': 'json'},
+        'admin:students:*': {'SERIALIZER': 'json', 'COMPRESSOR': 'zlib', 'THRESHOLD': 100},
+    }
+    options = {'SERIALIZER': 'django_redis.serializers.json.JSONSerializer'}
+    client = CodecClient('redis://127.0.0.1:1/0', {'OPTIONS': options}, None)
+    rows = [{'student_id': f'BSCS-{n}', 'status': 'Active'} for n in range(50)]
+
+    client._writing.key = 'admin:students:all'
+    compressed = client.encode(rows)
+    client._writing.key = 'admin:dashboard:someone'
+    plain = client.encode(rows)
+    client._writing.key = None
+
+    assert compressed[1:3] == bytes((1, 1)) and plain[1:3] == bytes((1, 0))
+    assert len(compressed) < len(plain)
+    assert client.decode(compressed) == client.decode(plain) == rows
+    # counters and values written before codecs are left to the client's serializer
+    assert client.encode(7) == 7 and client.decode(b'7') == 7
+    assert client.decode(b'{"count": 1}') == {'count': 1}
+    # a header naming a codec CACHE_CODECS does not use is a miss, whatever the payload
+    pickled = bytes((0xfe, 2, 0)) + pickle.dumps(rows)
+    lz4_framed = bytes((0xfe, 1, 3)) + b'{}'
+    assert client.decode(pickled) is None and client.decode(lz4_framed) is None
+
+
+@pytest.mark.django_db
+def test_index_advisor_proposes_composite_indexes_for_uncovered_filters():
+    from Models.models import Enrollment, Person
+    from Models.query_shapes import QueryShapeRecorder, suggest_indexes
+
+    recorder = QueryShapeRecorder()
+    with connection.execute_wrapper(recorder):
+        Person.objects.filter(last_name='Khan', first_name='Ali', dob__gte='2000-01-01').count()
+        Person.objects.filter(first_name='Sara', last_name='Ahmed', dob__gte='1990-01-01').count()
+        # pinned to one row by unique_together (student_id, allocation_id)
+        Enrollment.objects.filter(allocation_id=1, student_id=1, status='Active').count()
+
+    assert len(recorder.shapes) == 2
+    proposals = suggest_indexes(recorder.shapes)
+    assert [(each['table'], each['fields'], each['calls']) for each in proposals] == \
+        [('person', ['first_name', 'last_name', 'dob'], 2)]
+
+
+@pytest.mark.django_db
+def test_archived_audit_rows_are_read_back_with_the_hot_ones(settings, tmp_path, monkeypatch):
+    from datetime import timedelta
+    from django.core.files.storage import default_storage
+    from django.utils import timezone
+    from Models import audit_archive
+    from Models.audit_archive import archive_audit_trail, audit_records, manifest_name, segments
+    from Models.models import AuditTrail, Person
+
+    settings.MEDIA_ROOT = str(tmp_path)
+    person = Person.objects.first()
+    now = timezone.now()
+    for days, entity in [(400, 'Course'), (380, 'Student'), (200, 'Course'), (10, 'Course'), (1, 'Student')]:
+        AuditTrail.objects.create(userid=person, action_type='UPDATE', entity_name=entity,
+                                  time_stamp=now - timedelta(days=days), ip_address='127.0.0.1', user_agent='',
+                                  old_value={'name': 'old'}, new_value={'name': str(days)})
+    expected = list(AuditTrail.objects.order_by('-audit_id').values_list('audit_id', flat=True))
+
+    assert archive_audit_trail(hot_days=90, batch_size=2) == (3, 3)
+    assert AuditTrail.objects.count() == 2
+    assert [each['rows'] for each in segments()] == [1, 1, 1]
+    # readers open the manifest alone, once until it changes
+    opened = []
+    open_file = default_storage.open
+    monkeypatch.setattr(audit_archive, '_scan', lambda: pytest.fail('listed the sidecars'))
+    monkeypatch.setattr(default_storage, 'open', lambda name, *args: opened.append(name) or open_file(name, *args))
+    assert segments() == segments() and opened == []
+    monkeypatch.undo()
+    default_storage.delete(manifest_name())
+    assert [each['rows'] for each in segments()] == [1, 1, 1]
+    # run again after the rows are gone: nothing to do, nothing rewritten
+    assert archive_audit_trail(hot_days=90) == (0, 0)
+
+    assert [row['audit_id'] for row in audit_records()] == expected
+    courses = audit_records(entity_name='Course')
+    assert [row['new_value'] for row in courses] == [{'name': '10'}, {'name': '200'}, {'name': '400'}]
+    page = audit_records(limit=2)
+    assert [row['audit_id'] for row in page + audit_records(limit=3, before_id=page[-1]['audit_id'])] == expected
+    assert [row['entity_name'] for row in audit_records(since=now - timedelta(days=390), until=now - timedelta(days=5))] == \
+        ['Course', 'Course', 'Student']
+
+
+@pytest.mark.django_db
+def test_an_orphaned_segment_is_replaced_when_its_batch_is_archived_again(settings, tmp_path):
+    import os
+    from datetime import timedelta
+    from django.utils import timezone
+    from Models.audit_archive import FIELDS, archive_audit_trail, audit_records, segment_name, with_keys
+    from Models.models import AuditTrail, Person
+
+    settings.MEDIA_ROOT = str(tmp_path)
+    person = Person.objects.first()
+    for days in (400, 399):
+        AuditTrail.objects.create(userid=person, action_type='UPDATE', entity_name='Course',
+                                  time_stamp=timezone.now() - timedelta(days=days), ip_address='127.0.0.1',
+                                  user_agent='', old_value={}, new_value={'name': str(days)})
+    rows = with_keys(list(AuditTrail.objects.order_by('audit_id').values(*FIELDS)))
+    # a crash after a partial segment, before its sidecar
+    orphan = tmp_path / f'{segment_name(rows)}.jsonl.gz'
+    orphan.parent.mkdir(parents=True)
+    orphan.write_bytes(b'truncated')
+
+    assert archive_audit_trail(hot_days=90) == (2, 1)
+    # replaced under its own name, not saved next to it under a random suffix
+    assert sorted(os.listdir(orphan.parent)) == [orphan.name.replace('.jsonl.gz', '.index.json'), orphan.name]
+    assert [row['new_value'] for row in audit_records(entity_name='Course')] == [{'name': '399'}, {'name': '400'}]
+
+
+@pytest.mark.django_db(databases=['default', 'replica'])
+def test_safe_requests_read_a_current_replica_until_the_client_writes(locmem_caches, settings, monkeypatch):
+    from django.contrib.auth.models import User
+    from django.db import connections
+    from rest_framework.test import APIClient
+    from Models import db_routing
+
+    settings.DATABASE_REPLICAS = ['replica']
+    db_routing.reset_lag_checks()
+    router = db_routing.ReplicaRouter()
+    assert router.db_for_read(Course) == 'default'
+    with db_routing.replica_reads():
+        assert router.db_for_read(Course) == 'replica'
+        assert router.db_for_write(Course) == 'default'
+        # read your writes
+        assert router.db_for_read(Course) == 'default'
+
+    client = APIClient()
+    token = client.post('/api/token/', {'username': 'rhays056@gmail.com', 'password': 'admin12345678'}).data['access']
+    client.cookies.clear()
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+    with CaptureQueriesContext(connections['replica']) as replica, CaptureQueriesContext(connection) as primary:
+        assert client.get('/api/admin/dashboard/').status_code == 200
+    assert len(replica) > 0 and len(primary) == 0
+
+    response = client.patch('/api/admin/courses/ACC-140/', {'course_name': 'Accounting', 'lab': False},
+                            format='json')
+    assert response.status_code == 200 and response.cookies['db_primary']['max-age'] == 10
+    with CaptureQueriesContext(connections['replica']) as replica:
+        assert client.get('/api/admin/dashboard/').status_code == 200
+    assert len(replica) == 0
+
+    # without the cookie the token's user is still pinned, only its authentication read the replica
+    client.cookies.clear()
+    cache.delete('admin:dashboard:rhays056@gmail.com')
+    with CaptureQueriesContext(connections['replica']) as replica, CaptureQueriesContext(connection) as primary:
+        assert client.get('/api/admin/dashboard/').status_code == 200
+    assert all('auth_user' in query['sql'] for query in replica) and len(primary) > 0
+    cache.delete(f'db_primary:{User.objects.get(username="rhays056@gmail.com").pk}')
+
+    # a replica too far behind is skipped until its next check
+    client.cookies.clear()
+    monkeypatch.setattr(db_routing, 'replica_lag', lambda alias: 60.0)
+    db_routing.reset_lag_checks()
+    with CaptureQueriesContext(connections['replica']) as replica:
+        assert client.get('/api/admin/dashboard/').status_code == 200
+    assert len(replica) == 0
+    db_routing.reset_lag_checks()
+
+
+@pytest.mark.django_db
+def test_counters_follow_writes_and_reconciliation_repairs_bulk_updates():
+    from Models import counters
+    from Models.models import Enrollment, Student
+
+    counters.reconcile_counters()
+    assert counters.count('students') == Student.objects.count()
+    student = Student.objects.exclude(status='Frozen').first()
+    student.status = 'Frozen'
+    student.save()
+    enrollment = Enrollment.objects.first()
+    enrollments = counters.count('enrollments.status', enrollment.status)
+    enrollment.delete()
+    assert counters.count('enrollments.status', enrollment.status) == enrollments - 1
+    assert counters.count('students.status', 'Frozen') == Student.objects.filter(status='Frozen').count()
+    # nothing drifted
+    assert counters.reconcile_counters() == 0
+
+    Student.objects.filter(pk=student.pk).update(status='Graduated')
+    assert counters.reconcile_counters() == 2
+    assert counters.count('students.status', 'Graduated') == Student.objects.filter(status='Graduated').count()
+
+
+@pytest.mark.django_db
+def test_attendance_summaries_follow_attendance_writes():
+    from Models.attendance import at_risk, rebuild_attendance_summaries
+    from Models.models import Attendance, AttendanceSummary, Enrollment
+
+    rebuild_attendance_summaries()
+    attendance = next(each for each in Attendance.objects.select_related('lecture_id')
+                      if Enrollment.objects.filter(student_id=each.student_id_id,
+                                                   allocation_id=each.lecture_id.allocation_id_id).exists())
+    enrollment = Enrollment.objects.get(student_id=attendance.student_id_id,
+                                        allocation_id=attendance.lecture_id.allocation_id_id)
+
+    def figures():
+        summary = AttendanceSummary.objects.get(enrollment=enrollment)
+        return summary.lectures_held, summary.lectures_attended, summary.percentage
+
+    held, attended, _ = figures()
+    attendance.is_present = not attendance.is_present
+    attendance.save()
+    attended += 1 if attendance.is_present else -1
+    assert figures() == (held, attended, round(attended * 100 / held))
+
+    attendance.delete()
+    attended -= int(attendance.is_present)
+    assert figures()[:2] == (held - 1, attended)
+    Attendance.objects.create(student_id_id=attendance.student_id_id, lecture_id=attendance.lecture_id,
+                              attendance_date=attendance.attendance_date, is_present=False)
+    assert figures() == (held, attended, round(attended * 100 / held))
+    # nothing drifted
+    assert rebuild_attendance_summaries() == 0
+
+    summary = AttendanceSummary.objects.filter(enrollment=enrollment)
+    Attendance.objects.filter(student_id=enrollment.student_id_id,
+                              lecture_id__allocation_id=enrollment.allocation_id_id).update(is_present=False)
+    rebuild_attendance_summaries()
+    assert at_risk(summary).exists()
+    Attendance.objects.filter(student_id=enrollment.student_id_id,
+                              lecture_id__allocation_id=enrollment.allocation_id_id).update(is_present=True)
+    assert rebuild_attendance_summaries() == 1
+    assert figures() == (held, held, 100)
+    assert not at_risk(summary).exists()
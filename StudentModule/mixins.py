@@ -1,4 +1,10 @@
+import hashlib
+
+from django.core.cache import caches
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+
+from Models.cache_tags import set_tagged, tag
 
 from .permissions import *
 
@@ -17,4 +23,32 @@ class StudentAssessmentUploadPermissionMixin:
     permission_classes = [IsAuthenticated, StudentAssessmentUploadPermission]
 
 class StudentEnrollmentCreatePermissionMixin:
-    permission_classes = [IsAuthenticated, StudentEnrollmentCreatePermission]
\ No newline at end of file
+    permission_classes = [IsAuthenticated, StudentEnrollmentCreatePermission]
+
+
+
+class CachedPageMixin:
+    """
+    Caches the whole list response in the 'pages' cache per user, path and query string.
+    get_page_cache_tags() names the rows it depends on, a write to any of them drops it.
+    """
+    page_cache_timeout = 60 * 15
+
+    def get_page_cache_key(self):
+        query = '&'.join(sorted(f'{key}={value}' for key, values in self.request.query_params.lists() for value in values))
+        return f'{self.request.user.pk}:{self.request.path}:{hashlib.sha256(query.encode()).hexdigest()[:16]}'
+
+    def get_page_cache_tags(self):
+        # any write to the listed table; views narrow it to the rows they read
+        return [tag(self.get_queryset().model)]
+
+    def list(self, request, *args, **kwargs):
+        cache_key = self.get_page_cache_key()
+        data = caches['pages'].get(cache_key)
+        if data is not None:
+            return Response(data)
+
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == 200:
+            set_tagged(cache_key, response.data, self.page_cache_timeout, self.get_page_cache_tags(), alias='pages')
+        return response
@@ -1,3 +1,4 @@
+from django.db.models import F
 from drf_spectacular.utils import extend_schema_field, inline_serializer
 from rest_framework import  serializers
 from rest_framework.generics import get_object_or_404
@@ -266,6 +267,7 @@ class StudentAttendanceSerializer(serializers.ModelSerializer):
     course_details = serializers.SerializerMethodField(read_only=True)
     attendance_details = serializers.SerializerMethodField(read_only=True)
     percentage = serializers.SerializerMethodField(read_only=True)
+    attendance_summary = serializers.SerializerMethodField(read_only=True)
     url = serializers.HyperlinkedIdentityField(
         view_name='Student:attendance-detail',
         lookup_field='enrollment_id',
@@ -277,9 +279,29 @@ class StudentAttendanceSerializer(serializers.ModelSerializer):
             'faculty_details',
             'course_details',
             'attendance_details',
-            'percentage'
+            'percentage',
+            'attendance_summary',
         ]
 
+    def _summary(self, obj):
+        try:
+            return obj.attendance_summary
+        except AttendanceSummary.DoesNotExist:
+            return None
+
+    def _attendance_of(self, obj):
+        # the attendance of every enrollment being listed, in one query
+        if not hasattr(self, '_attendance'):
+            enrollments = self.parent.instance if isinstance(self.parent, serializers.ListSerializer) else [obj]
+            rows = Attendance.objects.filter(
+                student_id__in={each.student_id_id for each in enrollments},
+                lecture_id__allocation_id__in={each.allocation_id_id for each in enrollments},
+            ).annotate(allocation=F('lecture_id__allocation_id')).order_by('pk')
+            self._attendance = {}
+            for row in rows:
+                self._attendance.setdefault((row.student_id_id, row.allocation), []).append(row)
+        return self._attendance.get((obj.student_id_id, obj.allocation_id_id), [])
+
     @extend_schema_field(
         inline_serializer(
             name='FacultyData',
@@ -321,20 +343,38 @@ class StudentAttendanceSerializer(serializers.ModelSerializer):
     @extend_schema_field(AttendanceSerializer(many=True))
     def get_attendance_details(self, obj):
         if obj:
-            attendance = Attendance.objects.filter(student_id=obj.student_id, lecture_id__allocation_id=obj.allocation_id)
-            return AttendanceSerializer(attendance, many=True).data
+            return AttendanceSerializer(self._attendance_of(obj), many=True).data
         return None
 
 
     def get_percentage(self, obj) -> float:
-        print(obj)
         if obj:
-            attendance = Attendance.objects.filter(student_id=obj.student_id, lecture_id__allocation_id=obj.allocation_id)
-            total = attendance.count()
-            attended = attendance.filter(is_present=True).count()
-            return round((attended / total) * 100) if total else 0
+            summary = self._summary(obj)
+            return summary.percentage if summary else 0
         return None
 
+    @extend_schema_field(
+        inline_serializer(
+            name='AttendanceSummaryData',
+            fields={
+                'lectures_held': serializers.IntegerField(),
+                'lectures_attended': serializers.IntegerField(),
+                'percentage': serializers.IntegerField(),
+                'updated_at': serializers.DateTimeField(allow_null=True),
+            }
+        )
+    )
+    def get_attendance_summary(self, obj):
+        summary = self._summary(obj)
+        if summary is None:
+            return {'lectures_held': 0, 'lectures_attended': 0, 'percentage': 0, 'updated_at': None}
+        return {
+            'lectures_held': summary.lectures_held,
+            'lectures_attended': summary.lectures_attended,
+            'percentage': summary.percentage,
+            'updated_at': serializers.DateTimeField().to_representation(summary.updated_at),
+        }
+
 
 class StudentEnrollmentCreateSerializerA(serializers.ModelSerializer):
     faculty_data = serializers.SerializerMethodField(read_only=True)
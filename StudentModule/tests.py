@@ -1,3 +1,31 @@
-from django.test import TestCase
+import pytest
+from django.core.cache import caches
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from Models.models import Enrollment, Student
+from StudentModule.mixins import CachedPageMixin
+
+
+@pytest.mark.django_db
+def test_cached_pages_are_dropped_only_for_the_student_whose_rows_changed(locmem_caches, django_capture_on_commit_callbacks):
+    client = APIClient()
+    assert client.login(username='bscs23f02@gmail.com', password='mylms123')
+
+    first = client.get('/api/student/attendance/?page=1')
+    assert first.status_code == 200
+    view = first.renderer_context['view']
+    cache_key = view.get_page_cache_key()
+    assert caches['pages'].get(cache_key) == first.data
+    assert client.get('/api/student/attendance/?page=1').data == first.data
+
+    student = Student.objects.get(student_id__user__username='bscs23f02@gmail.com')
+    with django_capture_on_commit_callbacks(execute=True):
+        Enrollment.objects.filter(student_id__in=Student.objects.exclude(pk=student.pk)).first().save()
+    assert caches['pages'].get(cache_key) is not None
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Enrollment.objects.filter(student_id=student).first().save()
+    assert caches['pages'].get(cache_key) is None
+
+    # without tags of its own a cached page depends on its whole table
+    assert CachedPageMixin.get_page_cache_tags(view) == [view.get_queryset().model.__name__]
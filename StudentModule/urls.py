@@ -19,4 +19,5 @@ urlpatterns = [
 
     path ('enrollments/create/', StudentEnrollmentCreateAPIView.as_view()),
     path ('compilers/', StudentCompilerAPIView.as_view()),
+    path ('compilers/queue/', StudentCompilerQueueAPIView.as_view()),
 ]
\ No newline at end of file
@@ -12,6 +12,8 @@ from AdminModule.serializers import StudentSerializer
 from drf_spectacular.utils import extend_schema, OpenApiResponse, OpenApiExample
 
 from Compilers.serializers import CompilerSerializer
+from Compilers.throttling import CompilerRateThrottle, admission
+from Models.cache_tags import set_tagged, tag, tags_for
 from StudentModule.serializers import *
 from .mixins import *
 
@@ -63,6 +65,9 @@ class StudentDashboardView(
     StudentPermissionMixin,
     APIView
 ):
+    # tables read by get(), for the ETag (Models/conditional.py)
+    etag_models = ['Student', 'Person', 'Class', 'Program', 'Department', 'Enrollment']
+
     def get(self,request,*args,**kwargs):
         cache_key = f'student:dashboard:{request.user.username}'
         data = cache.get(cache_key)
@@ -83,7 +88,10 @@ class StudentDashboardView(
         student_data['active_enrollments'] = student.enrollment_set.filter(status='Active').count()
         student_data['completed_enrollments'] = student.enrollment_set.filter(status='Completed').count()
 
-        cache.set(cache_key, student_data, timeout=60*5)
+        tags = [tag(Student, student.pk), tag(Person, student.student_id_id), tag(Class, student.class_id_id),
+                tag(Program, student.program_id_id), tag(Department, student.program_id.department_id_id),
+                tag(Enrollment, student_id=student.pk)]
+        set_tagged(cache_key, student_data, 60*5, tags)
         return Response(data=student_data, status=status.HTTP_200_OK)
 
 
@@ -114,12 +122,25 @@ class StudentProfileView(
 
 class StudentEnrollmentsListView(
     StudentEnrollmentPermissionMixin,
+    CachedPageMixin,
     generics.ListAPIView
 ):
     serializer_class = StudentEnrollmentSerializer
     filter_backends = [DjangoFilterBackend, SearchFilter]
     filterset_fields = ['status', 'allocation_id__course_code']
 
+    def get_page_cache_tags(self):
+        # the student's enrollments, their allocations, assessments and the student's marks
+        enrollments = list(Enrollment.objects.filter(student_id__student_id__user=self.request.user).values_list(
+            'enrollment_id', 'student_id', 'allocation_id', 'allocation_id__semester_id'))
+        allocations = {each[2] for each in enrollments}
+        tags = tags_for(Enrollment, 'student_id', {each[1] for each in enrollments})
+        tags += [tag(CourseAllocation, each) for each in allocations] + tags_for(Assessment, 'allocation_id', allocations)
+        # the list only shows enrollments of active and completed semesters
+        tags += [tag(Semester, each) for each in {each[3] for each in enrollments}]
+        tags += tags_for(AssessmentChecked, 'enrollment_id', [each[0] for each in enrollments])
+        return tags or [tag(Enrollment)]
+
     def get_queryset(self):
         queryset = Enrollment.objects.filter(student_id__student_id__user=self.request.user).filter(allocation_id__semester_id__status__in=['Active','Completed'])
         if queryset.exists():
@@ -151,12 +172,21 @@ class StudentAssessmentUploadView(
 
 
 class StudentAttendanceListAPIView(
+    CachedPageMixin,
     generics.ListAPIView
 ):
 
     serializer_class = StudentAttendanceSerializer
+
+    def get_page_cache_tags(self):
+        students = Student.objects.filter(student_id__user=self.request.user).values_list('pk', flat=True)
+        allocations = Enrollment.objects.filter(student_id__in=students).values_list('allocation_id', flat=True)
+        tags = tags_for(Enrollment, 'student_id', students) + tags_for(Attendance, 'student_id', students)
+        return tags + [tag(CourseAllocation, each) for each in allocations] or [tag(Enrollment)]
     def get_queryset(self):
-        queryset = Enrollment.objects.filter(student_id__student_id__user=self.request.user)
+        queryset = Enrollment.objects.filter(student_id__student_id__user=self.request.user).select_related(
+            'attendance_summary', 'allocation_id__teacher_id__employee_id', 'allocation_id__course_code',
+        )
         if queryset.exists():
             return queryset
         return Enrollment.objects.none()
@@ -168,7 +198,9 @@ class StudentAttendanceRetrieveAPIView(
     serializer_class = StudentAttendanceSerializer
     lookup_field = 'enrollment_id'
     def get_queryset(self):
-        queryset = Enrollment.objects.filter(student_id__student_id__user=self.request.user)
+        queryset = Enrollment.objects.filter(student_id__student_id__user=self.request.user).select_related(
+            'attendance_summary', 'allocation_id__teacher_id__employee_id', 'allocation_id__course_code',
+        )
         if queryset.exists():
             return queryset
         return Enrollment.objects.none()
@@ -200,10 +232,16 @@ class StudentEnrollmentCreateAPIView(
 
 class ReviewListAPIView(
     ReviewsPermissionMixin,
+    CachedPageMixin,
     generics.ListAPIView
 ):
     serializer_class = ReviewsSerializer
 
+    def get_page_cache_tags(self):
+        students = Student.objects.filter(student_id=self.kwargs.get('student_id')).values_list('pk', flat=True)
+        enrollments = Enrollment.objects.filter(student_id__in=students).values_list('enrollment_id', flat=True)
+        return tags_for(Enrollment, 'student_id', students) + tags_for(Reviews, 'enrollment_id', enrollments) or [tag(Reviews)]
+
     def get_queryset(self):
         student_id = self.kwargs.get('student_id')
         queryset = Reviews.objects.filter(enrollment_id__student_id__student_id=student_id)
@@ -243,6 +281,7 @@ class ReviewRetrieveUpdateDestroyAPIView(
 
 class StudentCompilerAPIView(APIView):
     permission_classes = [IsAuthenticated]
+    throttle_classes = [CompilerRateThrottle]
     serializer_class = CompilerSerializer
     def get(self, request, *args, **kwargs):
         data = {
@@ -258,9 +297,16 @@ class StudentCompilerAPIView(APIView):
 
         data = request.data.copy()
         data['input_list'] = request.data.get('input_list')
-        serializer = self.serializer_class(data=request.data)
+        serializer = self.serializer_class(data=request.data, context={'request': request})
         if serializer.is_valid():
             instance = serializer.save()
-            return Response(instance.data)
+            return Response(instance.data, status=instance.status_code)
         else:
-            return Response(serializer.errors, status=400)
\ No newline at end of file
+            return Response(serializer.errors, status=400)
+
+
+class StudentCompilerQueueAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        return Response(admission.snapshot(request.user.pk))
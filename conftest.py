@@ -0,0 +1,19 @@
+import pytest
+from django.core.cache import caches
+
+
+LOCMEM_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'pages': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'pages'},
+}
+
+
+@pytest.fixture
+def locmem_caches(settings):
+    # the caches in process memory instead of Redis, empty before and after the test
+    settings.CACHES = LOCMEM_CACHES
+    for alias in LOCMEM_CACHES:
+        caches[alias].clear()
+    yield
+    for alias in LOCMEM_CACHES:
+        caches[alias].clear()